@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+App factory for the Voice Agent API server.
+
+create_app() builds the FastAPI application used by every server entry point
+(fastapi_server.py, fastapi_server_new.py, api_server.py, direct_server.py,
+run_server.py and serve.py). Heavy dependencies (openai, pydub, numpy) are
+imported on first use rather than at module load, and the storage
+directories are created when the app starts, not when it is imported.
+"""
+
+import os
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.staticfiles import StaticFiles
+
+from routes import router
+from upstream import OpenAIUpstream, SimulatedUpstream
+from profiler import install_profiler
+from loop_monitor import start_loop_monitor
+from audio_store import create_audio_store
+from conversation_log import ConversationLog
+from logging_setup import configure_logging
+from transcript_cache import TranscriptCache, TRANSCRIPT_CACHE_SIZE
+from warmup import Warmup
+from audio_pool import configure_io_threads, get_audio_pool
+from degradation import DegradationController, DegradationMiddleware, DEGRADATION
+from rate_limit import RateLimiter, RateLimitMiddleware, RATE_LIMIT
+
+logger = logging.getLogger(__name__)
+
+# Modules the production launcher can import before forking workers
+HEAVY_MODULES = ("openai", "numpy", "pydub", "audio_utils")
+
+
+@asynccontextmanager
+async def _lifespan(app):
+    """Create the storage directories and start the background workers."""
+    app.state.temp_dir.mkdir(parents=True, exist_ok=True)
+    app.state.audio_dir.mkdir(parents=True, exist_ok=True)
+    configure_io_threads()
+    monitor = start_loop_monitor()
+    if app.state.conversation_log is not None:
+        app.state.conversation_log.start()
+    if app.state.faq is not None:
+        app.state.faq.start()
+    if app.state.degradation is not None:
+        app.state.degradation.start()
+
+    # Runs in the background; each worker warms up its own connections after
+    # the fork, and reports ready at /ready when done
+    app.state.warmup_task = asyncio.create_task(asyncio.to_thread(app.state.warmup.run))
+    yield
+    if monitor is not None:
+        await monitor.stop()
+    if app.state.faq is not None:
+        app.state.faq.stop()
+    if app.state.degradation is not None:
+        await app.state.degradation.stop()
+    if app.state.conversation_log is not None:
+        await asyncio.to_thread(app.state.conversation_log.close)
+    await asyncio.to_thread(get_audio_pool().shutdown)
+
+
+def create_app(simulate=None, temp_dir=None, cors_origins=None, profiling=None, audio_store=None):
+    """
+    Build the Voice Agent API application.
+
+    Args:
+        simulate: Return canned responses instead of calling OpenAI.
+            Defaults to the SIMULATE environment variable.
+        temp_dir: Directory for temporary and synthesized audio files.
+            Defaults to TEMP_DIR or ./temp.
+        cors_origins: Allowed CORS origins. Defaults to CORS_ORIGINS
+            (comma-separated) or "*".
+        profiling: Install the per-request profiler (see profiler.py).
+            Defaults to the PROFILE_ENABLED environment variable.
+        audio_store: Where synthesized replies are kept (see audio_store.py).
+            Defaults to the store configured by AUDIO_STORE.
+
+    Returns:
+        The FastAPI application
+    """
+    # Load environment variables
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+    except ImportError:
+        pass
+
+    configure_logging()
+
+    if simulate is None:
+        simulate = os.getenv("SIMULATE", "").lower() in ("1", "true", "yes")
+    if cors_origins is None:
+        cors_origins = [origin.strip() for origin in os.getenv("CORS_ORIGINS", "*").split(",")]
+    if profiling is None:
+        profiling = os.getenv("PROFILE_ENABLED", "").lower() in ("1", "true", "yes")
+
+    app = FastAPI(
+        title="Voice Agent API",
+        description="API for processing audio and generating responses",
+        lifespan=_lifespan
+    )
+
+    app.state.temp_dir = Path(temp_dir or os.getenv("TEMP_DIR", "./temp"))
+    app.state.audio_dir = app.state.temp_dir / "audio"
+    app.state.upstream = SimulatedUpstream() if simulate else OpenAIUpstream()
+    app.state.audio_store = audio_store or create_audio_store(app.state.audio_dir)
+    app.state.warmup = Warmup(app)
+
+    # Transcripts and replies for analytics; CONVERSATION_DB="" disables it
+    conversation_db = os.getenv("CONVERSATION_DB", str(app.state.temp_dir / "conversations.db"))
+    app.state.conversation_log = ConversationLog(conversation_db) if conversation_db else None
+
+    # Transcripts of recently seen uploads; TRANSCRIPT_CACHE_SIZE=0 disables it
+    app.state.transcript_cache = TranscriptCache() if TRANSCRIPT_CACHE_SIZE > 0 else None
+
+    # Canned answers for common questions, when FAQ_PATH is set
+    app.state.faq = None
+    if os.getenv("FAQ_PATH"):
+        from faq_index import FAQService
+
+        app.state.faq = FAQService(os.getenv("FAQ_PATH"), app.state.upstream, app.state.temp_dir / "faq")
+
+    # Lower reply quality in steps under overload; added first so that CORS
+    # headers still go on the 503s it sends
+    app.state.degradation = DegradationController() if DEGRADATION else None
+    if app.state.degradation is not None:
+        app.add_middleware(DegradationMiddleware, controller=app.state.degradation)
+
+    # Token buckets per client; outside the degradation middleware so that
+    # rejected requests are not counted as load
+    app.state.rate_limiter = RateLimiter() if RATE_LIMIT else None
+    if app.state.rate_limiter is not None:
+        app.add_middleware(RateLimitMiddleware, limiter=app.state.rate_limiter)
+
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=cors_origins,
+        allow_credentials=True,
+        allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+        allow_headers=["*"],
+        expose_headers=["Content-Type", "X-Audio-Bytes-Saved", "X-STT-Time-Ms", "X-Profile-Id"],
+        max_age=600,  # Cache preflight requests for 10 minutes
+    )
+
+    app.include_router(router)
+
+    if profiling:
+        install_profiler(app, os.getenv("PROFILE_DIR", app.state.temp_dir / "profiles"))
+
+    # Static access to synthesized audio; the directory is created at startup
+    app.mount("/audio", StaticFiles(directory=str(app.state.audio_dir), check_dir=False), name="audio")
+
+    return app
+
+
+def preload_heavy_modules():
+    """Import the heavy dependencies now, e.g. in a parent process before fork."""
+    import importlib
+
+    for name in HEAVY_MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            logger.warning("Could not preload %s: %s", name, e)
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Output audio formats for synthesized replies
+
+Clients choose a format with a `format` request field or through the
+Accept header. Each format is requested from TTS directly; the media type
+here is what the reply is labelled with. pcm is raw 16-bit little-endian
+mono at 24kHz, with no header.
+"""
+
+import os
+
+# format: (media type, pydub export format, pydub codec)
+FORMATS = {
+    "mp3": ("audio/mpeg", "mp3", None),
+    "opus": ("audio/ogg", "ogg", "libopus"),
+    "aac": ("audio/aac", "adts", "aac"),
+    "flac": ("audio/flac", "flac", None),
+    "wav": ("audio/wav", "wav", None),
+    "pcm": ("audio/pcm", "s16le", None),
+}
+
+DEFAULT_FORMAT = os.getenv("TTS_FORMAT", "mp3")
+
+# Extra parameters on the Content-Type of formats that need them
+_TYPE_PARAMS = {
+    "opus": "; codecs=opus",
+    "pcm": "; rate=24000; channels=1",
+}
+
+
+def media_type(fmt):
+    """The Content-Type to label audio in `fmt` with."""
+    return FORMATS[fmt][0] + _TYPE_PARAMS.get(fmt, "")
+
+
+def preferred_type(accept, offers):
+    """
+    Pick the media type from `offers` that the Accept header ranks highest.
+
+    Ties go to the earlier offer, and the first offer is the default when
+    nothing matches or there is no Accept header.
+    """
+    ranked = accepted_types(accept, offers)
+    return ranked[0] if ranked else offers[0]
+
+
+def accepted_types(accept, offers):
+    """
+    Return the `offers` the Accept header allows, most preferred first.
+
+    Without an Accept header every offer is allowed, in the given order.
+    """
+    if not accept:
+        return list(offers)
+    ranges = []
+    for item in accept.split(","):
+        media_range, *params = [part.strip() for part in item.split(";")]
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        ranges.append((media_range.lower(), q))
+
+    scored = []
+    for order, offer in enumerate(offers):
+        main_type = offer.split("/")[0]
+        # The most specific matching range decides the offer's quality
+        matches = [(media_range.count("*"), q) for media_range, q in ranges
+                   if media_range in (offer, f"{main_type}/*", "*/*")]
+        if matches:
+            q = min(matches)[1]
+            if q > 0:
+                scored.append((-q, order, offer))
+    return [offer for _, _, offer in sorted(scored)]
+
+
+def accepted_formats(accept=None, requested=None):
+    """
+    Return the output formats a client accepts, most preferred first.
+
+    Args:
+        accept: The request's Accept header
+        requested: A format named in the request, which takes precedence
+
+    Returns:
+        Keys of FORMATS; DEFAULT_FORMAT wins ties. Empty when the client
+        accepts none of them or requested an unknown format.
+    """
+    if requested:
+        requested = requested.lower()
+        return [requested] if requested in FORMATS else []
+    by_type = {FORMATS[DEFAULT_FORMAT][0]: DEFAULT_FORMAT}
+    for fmt, info in FORMATS.items():
+        by_type.setdefault(info[0], fmt)
+    return [by_type[offer] for offer in accepted_types(accept, list(by_type))]
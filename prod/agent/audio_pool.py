@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Process pool for CPU-bound audio work
+
+Decoding uploads, resampling, silence trimming and encoding replies are
+numpy and pydub work that holds the GIL for most of its run, so on threads
+every session in a process shares one core. AudioPool runs these transforms
+in AUDIO_PROCESSES worker processes instead.
+
+PCM and encoded audio do not go through pickle. For each task the caller's
+bytes are copied once into a shared memory segment; the worker attaches to
+it by name, transforms the audio and writes its output back into the same
+segment, and the caller copies the result out. Only the segment name, sizes
+and small results (stats dicts, file names) are pickled.
+
+Transforms are module-level functions of the form
+
+    fn(buf, size, *args) -> (output bytes written, info)
+
+where `buf` is a writable memoryview whose first `size` bytes are the
+input, so a transform can work in place.
+
+The pool is sized with AUDIO_PROCESSES (0 runs the transforms in the
+calling thread) independently of IO_THREADS, the thread pool that blocking
+upstream calls run on. Each API worker process has its own pool, so the
+default divides the CPUs between the API_WORKERS that serve.py starts:
+one per CPU for a single process, one each with serve.py's default of one
+API worker per CPU.
+
+PCM inputs under AUDIO_POOL_MIN_BYTES are transformed in the calling
+thread; run() moves that off the event loop with asyncio.to_thread.
+Uploads always go to a worker: they are compressed, so their size says
+little about the cost of decoding them. Workers are started on first use,
+from a fork server that has numpy and audio_utils already imported.
+"""
+
+import os
+import time
+import asyncio
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# Unset: the CPUs divided between the API worker processes (see default_processes)
+AUDIO_PROCESSES = os.getenv("AUDIO_PROCESSES")
+# Smaller inputs are transformed in the calling thread: a round trip to a
+# worker costs about a millisecond, more than the work itself
+AUDIO_POOL_MIN_BYTES = int(os.getenv("AUDIO_POOL_MIN_BYTES", 64 * 1024))
+# 0 keeps Python's default size for the event loop's thread pool
+IO_THREADS = int(os.getenv("IO_THREADS", 0))
+
+# Room for file headers when encoding: no supported format is larger than
+# the raw PCM plus its headers
+ENCODE_HEADROOM = 64 * 1024
+
+# Imported by the fork server, so each worker starts with them loaded. As
+# with any non-fork start method, the main module is imported too (once, in
+# the fork server): entry scripts keep their startup under a __main__ guard.
+WORKER_PRELOAD = ["__main__", "audio_utils", "audio_pool"]
+
+
+class AudioWorkerError(Exception):
+    """A transform failed in a worker process."""
+
+
+def default_processes():
+    """AUDIO_PROCESSES, or this process's share of the CPUs among API_WORKERS."""
+    if AUDIO_PROCESSES is not None:
+        return int(AUDIO_PROCESSES)
+    # Read now rather than at import: serve.py sets it before forking workers
+    api_workers = max(1, int(os.getenv("API_WORKERS", 1)))
+    return max(1, (os.cpu_count() or 1) // api_workers)
+
+
+def configure_io_threads(loop=None):
+    """Size the event loop's default thread pool (used by asyncio.to_thread) to IO_THREADS."""
+    if IO_THREADS > 0:
+        loop = loop or asyncio.get_running_loop()
+        loop.set_default_executor(ThreadPoolExecutor(IO_THREADS, thread_name_prefix="io"))
+
+
+# Transforms. They run in the worker processes, or inline with AUDIO_PROCESSES=0.
+
+def prepare_upload(buf, size):
+    """prepare_upload_for_stt() on an uploaded file; the payload is never larger."""
+    from audio_utils import prepare_upload_for_stt
+
+    filename, payload, stats = prepare_upload_for_stt(bytes(buf[:size]))
+    buf[:len(payload)] = payload
+    return len(payload), (filename, stats)
+
+
+def preprocess(buf, size, sample_rate):
+    """preprocess_for_stt() on 16-bit PCM, in place."""
+    import numpy as np
+    from audio_utils import preprocess_for_stt
+
+    pcm = np.frombuffer(buf, dtype=np.int16, count=size // 2)
+    processed, stats = preprocess_for_stt(pcm, sample_rate, out=pcm)
+    return processed.nbytes, stats
+
+
+def encode(buf, size, sample_rate, fmt):
+    """encode_pcm() on 16-bit PCM; reserve ENCODE_HEADROOM bytes beyond the input."""
+    import numpy as np
+    from audio_utils import encode_pcm
+
+    encoded = encode_pcm(np.frombuffer(buf, dtype=np.int16, count=size // 2), sample_rate, fmt)
+    if len(encoded) > len(buf):
+        raise ValueError(f"{len(encoded)} encoded bytes do not fit in {len(buf)}")
+    buf[:len(encoded)] = encoded
+    return len(encoded), None
+
+
+# Transforms whose input is compressed: always worth a worker, whatever its size
+_COMPRESSED_INPUT = {prepare_upload}
+
+
+def _worker_pid(_):
+    return os.getpid()
+
+
+def _run_shared(fn, name, size, args):
+    """Worker side: attach to the segment and run `fn` on it."""
+    shm = SharedMemory(name)
+    error = None
+    try:
+        result = fn(shm.buf, size, *args)
+    except Exception as e:
+        # Not raised from here: the traceback would keep views of the segment alive
+        error = f"{fn.__name__}: {type(e).__name__}: {e}"
+    shm.close()
+    if error is not None:
+        raise AudioWorkerError(error)
+    return result
+
+
+class AudioPool:
+    """Worker processes for audio transforms, with inputs and outputs in shared memory."""
+
+    def __init__(self, processes=None, min_bytes=AUDIO_POOL_MIN_BYTES, registry=REGISTRY):
+        self.processes = default_processes() if processes is None else processes
+        self.min_bytes = min_bytes
+        self._executor = None
+        self._lock = threading.Lock()
+        self.tasks = registry.counter("audio_pool_tasks_total", "Audio transforms run in a worker process")
+        self.inline_tasks = registry.counter("audio_pool_inline_tasks_total", "Audio transforms run in the caller")
+        self.task_ms = registry.summary("audio_pool_task_ms", "Audio transform time, copies included")
+        registry.gauge("audio_pool_processes", "Audio worker processes configured", fn=lambda: self.processes)
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # Not fork: the server process has threads running
+                context = multiprocessing.get_context("forkserver")
+                context.set_forkserver_preload(WORKER_PRELOAD)
+                self._executor = ProcessPoolExecutor(self.processes, mp_context=context)
+            return self._executor
+
+    def start(self):
+        """Start every worker process now rather than on first use. Blocking."""
+        if self.processes > 0:
+            # Submitted together, so no worker is idle to take a second one
+            pids = set(self._get_executor().map(_worker_pid, range(self.processes)))
+            logger.info("Audio process pool ready, %d workers running", len(pids))
+
+    def _prepare(self, data, capacity):
+        data = memoryview(data).cast("B")
+        shm = SharedMemory(create=True, size=max(len(data), capacity, 1))
+        shm.buf[:len(data)] = data
+        return shm, len(data)
+
+    def _collect(self, shm, result, out):
+        written, info = result
+        try:
+            if out is None:
+                return bytes(shm.buf[:written]), info
+            memoryview(out).cast("B")[:written] = shm.buf[:written]
+            return written, info
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def _inline(self, fn, data):
+        if self.processes <= 0:
+            return True
+        return fn not in _COMPRESSED_INPUT and memoryview(data).nbytes < self.min_bytes
+
+    def _run_inline(self, fn, data, capacity, args, out):
+        self.inline_tasks.inc()
+        data = memoryview(data).cast("B")
+        if out is not None and capacity <= out.nbytes:
+            # Transform the caller's buffer directly
+            buf = memoryview(out).cast("B")
+            buf[:len(data)] = data
+            return fn(buf, len(data), *args)
+        buf = bytearray(max(len(data), capacity))
+        buf[:len(data)] = data
+        written, info = fn(memoryview(buf), len(data), *args)
+        if out is None:
+            return bytes(buf[:written]), info
+        memoryview(out).cast("B")[:written] = buf[:written]
+        return written, info
+
+    def call(self, fn, data, *args, capacity=0, out=None):
+        """
+        Run the transform `fn` on `data` and wait for it. Blocking.
+
+        Args:
+            fn: A transform from this module
+            data: Input bytes, or a contiguous array
+            args: Further arguments for `fn`
+            capacity: Bytes to reserve for the output, if it can outgrow the input
+            out: Optional writable buffer (e.g. the input array) to copy the output into
+
+        Returns:
+            (output bytes, info), or (bytes written, info) when `out` is given
+        """
+        if self._inline(fn, data):
+            return self._run_inline(fn, data, capacity, args, out)
+
+        start = time.perf_counter()
+        try:
+            shm, size = self._prepare(data, capacity)
+            try:
+                result = self._get_executor().submit(_run_shared, fn, shm.name, size, args).result()
+            except BaseException:
+                shm.close()
+                shm.unlink()
+                raise
+            return self._collect(shm, result, out)
+        finally:
+            self.tasks.inc()
+            self.task_ms.observe((time.perf_counter() - start) * 1000)
+
+    async def run(self, fn, data, *args, capacity=0, out=None):
+        """Like call(), without blocking the event loop."""
+        if self._inline(fn, data):
+            # Still CPU work: keep it off the event loop
+            return await asyncio.to_thread(self._run_inline, fn, data, capacity, args, out)
+
+        if self._executor is None:
+            # Starting the fork server and workers takes a while
+            await asyncio.to_thread(self.start)
+
+        start = time.perf_counter()
+        shm, size = self._prepare(data, capacity)
+        try:
+            future = self._get_executor().submit(_run_shared, fn, shm.name, size, args)
+            result = await asyncio.wrap_future(future)
+        except BaseException:
+            shm.close()
+            shm.unlink()
+            raise
+        try:
+            return self._collect(shm, result, out)
+        finally:
+            self.tasks.inc()
+            self.task_ms.observe((time.perf_counter() - start) * 1000)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(cancel_futures=True)
+                self._executor = None
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_audio_pool():
+    """Return the process-wide AudioPool, creating it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = AudioPool()
+        return _pool
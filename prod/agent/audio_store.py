@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Storage for synthesized reply audio
+
+Replies are written under an audio ID and later fetched by
+GET /api/audio/{id}, possibly on a different replica. Each reply is kept
+under one key per audio format, "{id}.{format}", plus "{id}.json" holding
+its text and original format so that other formats can be synthesized on
+request. The backend is chosen with AUDIO_STORE:
+
+    dir     files in AUDIO_STORE_DIR, e.g. a shared mount. Without
+            AUDIO_STORE_DIR, the local audio directory (single replica).
+            Files older than AUDIO_TTL_S are treated as gone and deleted
+            by a sweep every AUDIO_SWEEP_S.
+    redis   a key-value service at AUDIO_STORE_URL (needs the redis package)
+    memory  an in-process key-value stand-in, for tests
+
+Shared backends are wrapped in a read-through cache in the local audio
+directory: replies this replica wrote, or fetched once, are served from
+local disk. The cache keeps at most AUDIO_CACHE_MAX_MB, evicting the least
+recently served files. Files served in the last AUDIO_CACHE_MIN_AGE_S are
+never evicted, so a file is not deleted between being looked up and being
+opened for the response (once open, it can be unlinked safely).
+
+All methods block and are called from worker threads.
+"""
+
+import os
+import re
+import time
+import logging
+import threading
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+AUDIO_STORE = os.getenv("AUDIO_STORE", "dir")
+AUDIO_STORE_DIR = os.getenv("AUDIO_STORE_DIR")
+AUDIO_STORE_URL = os.getenv("AUDIO_STORE_URL", "redis://localhost:6379/0")
+# 0 keeps replies forever
+AUDIO_TTL_S = int(os.getenv("AUDIO_TTL_S", 3600))
+AUDIO_SWEEP_S = float(os.getenv("AUDIO_SWEEP_S", 300))
+AUDIO_CACHE_MAX_BYTES = int(float(os.getenv("AUDIO_CACHE_MAX_MB", 256)) * 1024 * 1024)
+AUDIO_CACHE_MIN_AGE_S = float(os.getenv("AUDIO_CACHE_MIN_AGE_S", 60))
+
+_AUDIO_ID = re.compile(r"^[A-Za-z0-9-]{1,64}$")
+
+
+def valid_audio_id(audio_id):
+    """Return True if `audio_id` is safe to use as a file name or key."""
+    return bool(_AUDIO_ID.match(audio_id))
+
+
+def audio_key(audio_id, fmt):
+    """Store key for one format of a reply; "json" for its metadata."""
+    return f"{audio_id}.{fmt}"
+
+
+def _write_atomic(path, data):
+    """Write to a temporary name and rename, so readers never see partial files."""
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+class DirectoryStore:
+    """One file per key in a (possibly shared) directory, expiring after `ttl` seconds when set."""
+
+    def __init__(self, directory, ttl=None, sweep_s=AUDIO_SWEEP_S):
+        self.directory = Path(directory)
+        self.ttl = ttl or None
+        self.sweep_s = sweep_s
+        self._next_sweep = time.monotonic() + sweep_s
+        self._sweep_lock = threading.Lock()
+
+    def _path(self, key):
+        return self.directory / key
+
+    def _expired(self, stat):
+        return self.ttl is not None and time.time() - stat.st_mtime > self.ttl
+
+    def put(self, key, data):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        _write_atomic(self._path(key), data)
+        if self.ttl is not None and time.monotonic() >= self._next_sweep:
+            self.sweep()
+
+    def get(self, key):
+        path = self.local_path(key)
+        if path is None:
+            return None
+        try:
+            return path.read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def local_path(self, key):
+        """Return a local file to serve for `key`, or None."""
+        path = self._path(key)
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return None
+        return None if self._expired(stat) else path
+
+    def sweep(self):
+        """Delete expired files. Skipped while another thread is sweeping."""
+        if not self._sweep_lock.acquire(blocking=False):
+            return
+        try:
+            self._next_sweep = time.monotonic() + self.sweep_s
+            removed = 0
+            for path in self.files():
+                try:
+                    if self._expired(path.stat()):
+                        path.unlink()
+                        removed += 1
+                except FileNotFoundError:
+                    # Another replica sharing the directory got there first
+                    continue
+            if removed:
+                logger.info("Deleted %d expired files from %s", removed, self.directory)
+        finally:
+            self._sweep_lock.release()
+
+    def files(self):
+        """Stored files, without temporary ones still being written."""
+        return [path for path in self.directory.glob("*") if not path.name.startswith(".")]
+
+
+class LocalKV:
+    """In-process stand-in for the part of the redis client API used here."""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def set(self, key, value, ex=None):
+        expires = time.monotonic() + ex if ex else None
+        with self._lock:
+            self._data[key] = (bytes(value), expires)
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires is not None and time.monotonic() > expires:
+                del self._data[key]
+                return None
+            return value
+
+
+class KeyValueStore:
+    """Replies as values with a TTL in a key-value service."""
+
+    def __init__(self, client, ttl=AUDIO_TTL_S, prefix="audio:"):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def put(self, key, data):
+        self.client.set(self.prefix + key, data, ex=self.ttl)
+
+    def get(self, key):
+        return self.client.get(self.prefix + key)
+
+    def local_path(self, key):
+        return None
+
+
+class CachedStore:
+    """Read-through, write-through local file cache in front of a shared store."""
+
+    def __init__(self, backend, cache_dir, max_bytes=AUDIO_CACHE_MAX_BYTES, min_age_s=AUDIO_CACHE_MIN_AGE_S):
+        self.backend = backend
+        self.cache = DirectoryStore(cache_dir)
+        self.max_bytes = max_bytes
+        self.min_age_s = min_age_s
+        self.hits = 0
+        self.misses = 0
+        self._size = None
+        self._lock = threading.Lock()
+
+    def put(self, key, data):
+        self.backend.put(key, data)
+        self._add_to_cache(key, data)
+
+    def get(self, key):
+        path = self.local_path(key)
+        return path.read_bytes() if path is not None else None
+
+    def local_path(self, key):
+        """Return the cached file for `key`, fetching it on a miss."""
+        path = self.cache.local_path(key)
+        if path is not None:
+            self.hits += 1
+            # Mark as recently used for eviction
+            os.utime(path)
+            return path
+
+        self.misses += 1
+        data = self.backend.get(key)
+        if data is None:
+            return None
+        self._add_to_cache(key, data)
+        return self.cache.local_path(key)
+
+    def _add_to_cache(self, key, data):
+        self.cache.put(key, data)
+        with self._lock:
+            if self._size is None:
+                self._size = sum(p.stat().st_size for p in self.cache.files())
+            else:
+                self._size += len(data)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """
+        Delete least recently used files until the cache is at 90% of its limit.
+
+        Files used in the last `min_age_s` are kept even if that leaves the
+        cache over its limit for now.
+        """
+        files = []
+        for path in self.cache.files():
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        files.sort()
+
+        size = sum(size for _, size, _ in files)
+        target = self.max_bytes * 0.9
+        cutoff = time.time() - self.min_age_s
+        for mtime, file_size, path in files:
+            if size <= target or mtime > cutoff:
+                break
+            path.unlink(missing_ok=True)
+            size -= file_size
+        self._size = size
+
+
+def create_audio_store(local_dir):
+    """
+    Build the store configured by AUDIO_STORE.
+
+    Args:
+        local_dir: This replica's audio directory, used as the cache
+    """
+    if AUDIO_STORE == "dir":
+        if not AUDIO_STORE_DIR:
+            return DirectoryStore(local_dir, ttl=AUDIO_TTL_S)
+        backend = DirectoryStore(AUDIO_STORE_DIR, ttl=AUDIO_TTL_S)
+    elif AUDIO_STORE == "redis":
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("AUDIO_STORE=redis needs the redis package (pip install redis)")
+        backend = KeyValueStore(redis.Redis.from_url(AUDIO_STORE_URL))
+    elif AUDIO_STORE == "memory":
+        backend = KeyValueStore(LocalKV())
+    else:
+        raise ValueError(f"Unknown AUDIO_STORE: {AUDIO_STORE}")
+
+    logger.info("Audio store: %s, cached in %s", AUDIO_STORE, local_dir)
+    return CachedStore(backend, local_dir)
@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+Audio helpers for the Voice Agent
+
+PCM is handled as mono 16-bit NumPy arrays at the LiveKit sample rate so that
+clips can be mixed and sliced without going back through pydub.
+"""
+
+import io
+import os
+import ctypes
+import functools
+
+import numpy as np
+
+# LiveKit default output format
+SAMPLE_RATE = 48000
+NUM_CHANNELS = 1
+FRAME_MS = 20
+SAMPLES_PER_FRAME = SAMPLE_RATE * FRAME_MS // 1000
+
+# OpenAI TTS returns raw PCM as 24kHz 16-bit mono
+TTS_PCM_RATE = 24000
+
+# Speech preprocessing before STT (Whisper works at 16kHz internally)
+STT_SAMPLE_RATE = 16000
+ANALYSIS_FRAME_MS = 10
+SILENCE_THRESHOLD_DB = float(os.getenv("SILENCE_THRESHOLD_DB", -45))
+SPEECH_PAD_MS = int(os.getenv("SPEECH_PAD_MS", 150))
+MAX_PAUSE_MS = int(os.getenv("MAX_PAUSE_MS", 400))
+TARGET_LEVEL_DB = float(os.getenv("TARGET_LEVEL_DB", -20))
+MAX_GAIN_DB = float(os.getenv("MAX_GAIN_DB", 20))
+
+# Settings that change what prepare_upload_for_stt() sends to Whisper
+PREPROCESS_SETTINGS = (
+    f"prep:{STT_SAMPLE_RATE}:{SILENCE_THRESHOLD_DB}:{SPEECH_PAD_MS}:{MAX_PAUSE_MS}:{TARGET_LEVEL_DB}:{MAX_GAIN_DB}"
+)
+
+
+def crossfade(tail, head, fade_samples):
+    """
+    Blend the start of `head` over the end of a clip that is still playing.
+
+    Args:
+        tail: The unplayed remainder of the previous clip
+        head: The clip that takes over
+        fade_samples: Length of the equal-power fade
+
+    Returns:
+        `head` with its first samples mixed with `tail`
+    """
+    n = min(len(tail), fade_samples)
+    if n == 0:
+        return head
+
+    # Pad short replies so the previous clip still fades out cleanly
+    if len(head) < n:
+        head = np.concatenate([head, np.zeros(n - len(head), dtype=np.int16)])
+
+    t = np.linspace(0.0, np.pi / 2, n, dtype=np.float32)
+    mixed = tail[:n] * np.cos(t) + head[:n] * np.sin(t)
+
+    out = head.copy()
+    out[:n] = np.clip(mixed, -32768, 32767).astype(np.int16)
+    return out
+
+
+def iter_frames(pcm, samples_per_frame=SAMPLES_PER_FRAME):
+    """Yield fixed-size frames of `pcm`, zero-padding the last one."""
+    for start in range(0, len(pcm), samples_per_frame):
+        frame = pcm[start:start + samples_per_frame]
+        if len(frame) < samples_per_frame:
+            frame = np.concatenate([frame, np.zeros(samples_per_frame - len(frame), dtype=np.int16)])
+        yield frame
+
+
+def resample(pcm, from_rate, to_rate, out=None):
+    """
+    Resample 16-bit PCM between rates.
+
+    Integer downsampling ratios use a box filter over each group of samples,
+    anything else falls back to linear interpolation.
+
+    Args:
+        pcm: Mono 16-bit samples
+        from_rate: Sample rate of `pcm`
+        to_rate: Target sample rate
+        out: Optional int16 array to write the result into
+
+    Returns:
+        The resampled samples (a prefix of `out` when given)
+    """
+    out_len = resampled_length(len(pcm), from_rate, to_rate)
+    if from_rate == to_rate or not len(pcm):
+        if out is None:
+            return pcm
+        out[:out_len] = pcm
+        return out[:out_len]
+
+    if from_rate % to_rate == 0:
+        factor = from_rate // to_rate
+        groups = pcm[:out_len * factor].reshape(-1, factor)
+        # Summed as int32: int16 would wrap on loud audio
+        means = np.add.reduce(groups, axis=1, dtype=np.int32) // factor
+        if out is None:
+            return means.astype(np.int16)
+        out[:out_len] = means
+        return out[:out_len]
+
+    positions = np.arange(out_len, dtype=np.float64) * (from_rate / to_rate)
+    resampled = np.interp(positions, np.arange(len(pcm)), pcm)
+    if out is None:
+        return resampled.astype(np.int16)
+    out[:out_len] = resampled
+    return out[:out_len]
+
+
+def resampled_length(num_samples, from_rate, to_rate):
+    """Number of samples resample() produces for `num_samples` input samples."""
+    if from_rate % to_rate == 0:
+        return num_samples // (from_rate // to_rate)
+    return int(num_samples * to_rate / from_rate)
+
+
+def preprocess_for_stt(pcm, sample_rate, threshold_db=SILENCE_THRESHOLD_DB, pad_ms=SPEECH_PAD_MS,
+                       max_pause_ms=MAX_PAUSE_MS, target_db=TARGET_LEVEL_DB, max_gain_db=MAX_GAIN_DB,
+                       out=None):
+    """
+    Trim edge silence, shorten long pauses and normalize level.
+
+    The signal is analysed in 10ms frames; every step is a vectorized
+    operation over the frame energies, so the cost is linear in the
+    utterance length with no Python-level loop over samples.
+
+    Args:
+        pcm: Mono 16-bit samples
+        sample_rate: Sample rate of `pcm`
+        threshold_db: Frame level (dBFS) above which a frame counts as speech
+        pad_ms: Silence kept around each speech region
+        max_pause_ms: Longest pause kept inside the utterance
+        target_db: RMS level (dBFS) the speech is normalized to
+        max_gain_db: Upper bound on the gain applied to quiet speakers
+        out: Optional int16 array to write the result into. It may be `pcm`
+            itself, in which case the utterance is processed in place.
+
+    Returns:
+        Tuple of (processed samples, stats dict). The samples are empty when
+        no speech was found.
+    """
+    frame_len = sample_rate * ANALYSIS_FRAME_MS // 1000
+    n_frames = len(pcm) // frame_len
+    stats = {
+        "input_ms": len(pcm) * 1000 // sample_rate,
+        "output_ms": 0,
+        "gain_db": 0.0,
+    }
+    if n_frames == 0:
+        return pcm[:0], stats
+
+    frames = pcm[:n_frames * frame_len].reshape(n_frames, frame_len)
+    energy = np.mean(np.square(frames, dtype=np.float32), axis=1)
+    level_db = 10 * np.log10(energy / (32768.0 ** 2) + 1e-12)
+
+    speech = level_db > threshold_db
+    if not speech.any():
+        return pcm[:0], stats
+
+    # Widen speech regions so word onsets and tails are not clipped
+    pad = pad_ms // ANALYSIS_FRAME_MS
+    if pad:
+        speech = np.convolve(speech.astype(np.int16), np.ones(2 * pad + 1, dtype=np.int16), mode="same") > 0
+
+    # Trim the edges, then keep at most `max_pause` frames of every pause
+    voiced = np.flatnonzero(speech)
+    first, last = voiced[0], voiced[-1] + 1
+    speech = speech[first:last]
+    index = np.arange(len(speech))
+    last_speech = np.maximum.accumulate(np.where(speech, index, -1))
+    keep = speech | (index - last_speech <= max_pause_ms // ANALYSIS_FRAME_MS)
+
+    # Speech level is measured before anything is moved
+    speech_rms = np.sqrt(np.mean(energy[first:last][speech])) / 32768.0
+    span = frames[first:last]
+    peak = max(int(span.max()), -int(span.min())) / 32768.0
+
+    if out is not None:
+        kept = _compact_frames(span, keep, out)
+    elif keep.all():
+        kept = span.reshape(-1)
+    else:
+        kept = span[keep].reshape(-1)
+
+    # Normalize speech RMS to the target, without clipping peaks
+    gain_db = target_db - 20 * np.log10(speech_rms + 1e-12)
+    gain_db = min(gain_db, max_gain_db, -20 * np.log10(peak + 1e-12) - 1.0)
+    if abs(gain_db) > 0.5:
+        gain = np.float32(10 ** (gain_db / 20))
+        if out is not None:
+            # The peak guard keeps every scaled sample inside int16
+            np.multiply(kept, gain, out=kept, casting="unsafe")
+        else:
+            kept = np.clip(kept * gain, -32768, 32767).astype(np.int16)
+        stats["gain_db"] = round(float(gain_db), 1)
+
+    stats["output_ms"] = len(kept) * 1000 // sample_rate
+    return kept, stats
+
+
+def _compact_frames(frames, keep, out):
+    """
+    Copy the kept runs of `frames` to the front of `out`.
+
+    Runs are moved with memmove, so `out` may share memory with `frames`
+    (compaction only ever moves data towards the start).
+    """
+    frame_bytes = frames.shape[1] * frames.itemsize
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], keep.view(np.int8), [0]))))
+    src = frames.ctypes.data
+    dst = out.ctypes.data
+    written = 0
+    for start, end in zip(edges[0::2], edges[1::2]):
+        size = int(end - start) * frame_bytes
+        ctypes.memmove(dst + written, src + int(start) * frame_bytes, size)
+        written += size
+    return out[:written // out.itemsize]
+
+
+class StreamUpsampler:
+    """
+    Upsample a PCM byte stream by an integer factor, chunk by chunk.
+
+    Linear interpolation runs across chunk boundaries (the last sample of
+    each chunk is carried over), and odd trailing bytes are held until the
+    next chunk, so arbitrary network chunks join without clicks.
+    """
+
+    def __init__(self, from_rate, to_rate):
+        self.factor = to_rate // from_rate
+        self._steps = np.arange(1, self.factor + 1, dtype=np.float32) / self.factor
+        self._last = np.float32(0)
+        self._pending = b""
+
+    def feed(self, chunk):
+        """Return the upsampled samples for the next chunk of raw bytes."""
+        data = self._pending + chunk if self._pending else chunk
+        usable = len(data) - len(data) % 2
+        self._pending = data[usable:]
+        if not usable:
+            return np.zeros(0, dtype=np.int16)
+
+        samples = np.frombuffer(data, dtype=np.int16, count=usable // 2).astype(np.float32)
+        previous = np.concatenate(([self._last], samples[:-1]))
+        self._last = samples[-1]
+        if self.factor == 1:
+            return samples.astype(np.int16)
+
+        out = previous[:, None] + (samples - previous)[:, None] * self._steps[None, :]
+        return out.reshape(-1).astype(np.int16)
+
+
+@functools.lru_cache(maxsize=None)
+def can_encode():
+    """Whether pydub has an ffmpeg binary to encode with."""
+    from pydub.utils import get_encoder_name, which
+
+    return which(get_encoder_name()) is not None
+
+
+def encode_pcm(pcm, sample_rate, fmt="mp3"):
+    """
+    Encode mono 16-bit samples as an audio file (needs pydub and ffmpeg).
+
+    Args:
+        fmt: Output format, a key of audio_formats.FORMATS
+    """
+    from pydub import AudioSegment
+    from audio_formats import FORMATS
+
+    _, export_format, codec = FORMATS[fmt]
+    encoded = io.BytesIO()
+    AudioSegment(pcm.tobytes(), frame_rate=sample_rate, sample_width=2, channels=1).export(
+        encoded, format=export_format, codec=codec
+    )
+    return encoded.getvalue()
+
+
+def prepare_upload_for_stt(content):
+    """
+    Preprocess an uploaded recording before sending it to Whisper.
+
+    The upload is decoded, resampled to STT_SAMPLE_RATE, run through
+    preprocess_for_stt and re-encoded as Opus. The original bytes are kept if
+    the upload cannot be decoded or the result would not be smaller.
+
+    Args:
+        content: Raw bytes of the uploaded audio file
+
+    Returns:
+        Tuple of (filename, payload bytes, stats dict)
+    """
+    from pydub import AudioSegment
+
+    stats = {"bytes_in": len(content), "bytes_out": len(content)}
+    try:
+        segment = AudioSegment.from_file(io.BytesIO(content))
+    except Exception:
+        return "speech.wav", content, stats
+
+    segment = segment.set_channels(1).set_sample_width(2).set_frame_rate(STT_SAMPLE_RATE)
+    pcm = np.frombuffer(segment.raw_data, dtype=np.int16)
+    processed, trim_stats = preprocess_for_stt(pcm, STT_SAMPLE_RATE)
+    stats.update(trim_stats)
+    if not len(processed):
+        return "speech.wav", content, stats
+
+    encoded = io.BytesIO()
+    AudioSegment(
+        processed.tobytes(),
+        frame_rate=STT_SAMPLE_RATE,
+        sample_width=2,
+        channels=1
+    ).export(encoded, format="ogg", codec="libopus")
+    payload = encoded.getvalue()
+    if len(payload) >= len(content):
+        return "speech.wav", content, stats
+
+    stats["bytes_out"] = len(payload)
+    return "speech.ogg", payload, stats
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Benchmark the audio process pool (audio_pool.py) against threads.
+
+Runs --tasks audio transforms, all submitted at once as concurrent sessions
+would, and reports throughput for:
+
+    inline     one after another in the calling thread
+    threads    a thread pool of N threads (GIL-bound)
+    pickle     a process pool of N, arrays passed through pickle
+    shared     AudioPool with N processes, PCM in shared memory
+
+for each N in --workers (default 1, 2, 4 ... up to the CPU count). The
+transform is preprocess_for_stt() on --seconds of synthetic 16 kHz speech,
+or with --op prepare, the whole upload path (decode, resample, preprocess,
+encode; needs ffmpeg to do more than decode WAV).
+"""
+
+import os
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from metrics import Registry
+from audio_utils import STT_SAMPLE_RATE, preprocess_for_stt, prepare_upload_for_stt
+from audio_pool import AudioPool, preprocess, prepare_upload
+from warmup import synthetic_pcm, synthetic_recording
+
+
+def _direct(op, data):
+    """The transform without the pool, as a thread or pickled task runs it."""
+    if op == "preprocess":
+        return preprocess_for_stt(data.copy(), STT_SAMPLE_RATE)[0]
+    return prepare_upload_for_stt(data)[1]
+
+
+def run_inline(op, items):
+    for data in items:
+        _direct(op, data)
+
+
+def run_executor(executor, op, items):
+    list(executor.map(_direct, [op] * len(items), items))
+
+
+def run_shared(pool, op, items):
+    with ThreadPoolExecutor(len(items)) as callers:
+        if op == "preprocess":
+            futures = [callers.submit(pool.call, preprocess, data, STT_SAMPLE_RATE) for data in items]
+        else:
+            futures = [callers.submit(pool.call, prepare_upload, data) for data in items]
+        for future in futures:
+            future.result()
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    cpus = os.cpu_count() or 1
+    default_workers = sorted({1, cpus} | {2 ** i for i in range(1, 8) if 2 ** i < cpus})
+    parser = argparse.ArgumentParser(description="Benchmark the audio process pool")
+    parser.add_argument("--op", choices=("preprocess", "prepare"), default="preprocess")
+    parser.add_argument("--seconds", type=float, default=30, help="Length of each clip")
+    parser.add_argument("--tasks", type=int, default=64)
+    parser.add_argument("--workers", type=int, nargs="+", default=default_workers)
+    args = parser.parse_args()
+
+    if args.op == "preprocess":
+        items = [synthetic_pcm(args.seconds, STT_SAMPLE_RATE) for _ in range(args.tasks)]
+    else:
+        items = [synthetic_recording(args.seconds) for _ in range(args.tasks)]
+    print(f"{args.tasks} x {args.op} of {args.seconds:g}s clips, {cpus} CPUs")
+
+    run_inline(args.op, items[:2])
+    inline = timed(run_inline, args.op, items)
+    print(f"{'mode':>8} {'workers':>7} {'tasks/s':>9} {'speedup':>8}")
+    print(f"{'inline':>8} {1:>7} {args.tasks / inline:>9.1f} {1.0:>7.2f}x")
+
+    for workers in args.workers:
+        results = {}
+        with ThreadPoolExecutor(workers) as executor:
+            results["threads"] = timed(run_executor, executor, args.op, items)
+        with ProcessPoolExecutor(workers) as executor:
+            run_executor(executor, args.op, items[:workers])
+            results["pickle"] = timed(run_executor, executor, args.op, items)
+        pool = AudioPool(workers, min_bytes=0, registry=Registry())
+        pool.start()
+        results["shared"] = timed(run_shared, pool, args.op, items)
+        pool.shutdown()
+        for mode, seconds in results.items():
+            print(f"{mode:>8} {workers:>7} {args.tasks / seconds:>9.1f} {inline / seconds:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
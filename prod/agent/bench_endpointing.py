@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Benchmark end-of-turn detection accuracy and decision latency.
+
+Runs the adaptive Endpointer and the fixed-threshold baseline over a
+labelled corpus and reports, per condition:
+
+    detected   labelled turns with an end decision within 2s of their end
+    cut        end decisions inside a labelled turn (the turn was clipped)
+    false      end decisions outside any turn (noise taken for speech)
+    latency    time from the labelled end of a turn to the end decision
+    us/frame   CPU time per 20ms frame
+
+The corpus is a directory of 16-bit mono WAV files, each with a JSON file
+of the same name holding {"turns": [[start_s, end_s], ...]}. Without
+--corpus, a synthetic corpus is generated: syllable-like noise bursts with
+short pauses inside turns, in a quiet room, with a soft speaker, in a noisy
+room, and with a noise level that jumps halfway through.
+"""
+
+import json
+import time
+import wave
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+from audio_utils import SAMPLE_RATE, SAMPLES_PER_FRAME, FRAME_MS, resample
+from endpointing import Endpointer, SPEECH_END
+
+# An end decision later than this after a turn ends counts as a miss
+MAX_DECISION_S = 2.0
+
+# name: (speech level dBFS, noise level dBFS, noise level after halfway)
+CONDITIONS = {
+    "quiet": (-26, -70, None),
+    "soft": (-46, -70, None),
+    "noisy": (-24, -42, None),
+    "soft_noisy": (-36, -52, None),
+    "noise_step": (-26, -65, -45),
+}
+
+
+def _db_to_amplitude(db):
+    return 32768.0 * 10 ** (db / 20)
+
+
+def synthetic_recording(speech_db, noise_db, noise_db_after, seconds, rng):
+    """Return (48kHz int16 audio, labelled turns) for one condition."""
+    total = int(seconds * SAMPLE_RATE)
+    noise = rng.normal(0, 1, total)
+    noise_level = np.full(total, _db_to_amplitude(noise_db))
+    if noise_db_after is not None:
+        noise_level[total // 2:] = _db_to_amplitude(noise_db_after)
+    audio = noise * noise_level
+
+    turns = []
+    t = rng.uniform(1.5, 2.5)
+    while True:
+        turn_len = rng.uniform(1.0, 4.0)
+        if t + turn_len + 1.0 > seconds:
+            break
+        start, pos = t, t
+        while pos < start + turn_len:
+            # A syllable: low-passed noise under a smooth envelope
+            syllable = rng.uniform(0.15, 0.4)
+            n = int(syllable * SAMPLE_RATE)
+            i = int(pos * SAMPLE_RATE)
+            burst = np.convolve(rng.normal(0, 1, n), np.ones(8) / 8, mode="same")
+            burst *= np.hanning(n) * _db_to_amplitude(speech_db + rng.uniform(-4, 4)) / (burst.std() + 1e-9)
+            audio[i:i + n] += burst
+            last_end = pos + syllable
+            pos = last_end + rng.uniform(0.03, 0.25)
+        turns.append((start, last_end))
+        t = last_end + rng.uniform(1.2, 2.5)
+
+    return np.clip(audio, -32768, 32767).astype(np.int16), turns
+
+
+def synthetic_corpus(seconds, seed):
+    rng = np.random.default_rng(seed)
+    return [(name, *synthetic_recording(*levels, seconds, rng)) for name, levels in CONDITIONS.items()]
+
+
+def load_corpus(directory):
+    corpus = []
+    for wav_path in sorted(Path(directory).glob("*.wav")):
+        with wave.open(str(wav_path), "rb") as f:
+            if f.getsampwidth() != 2 or f.getnchannels() != 1:
+                raise ValueError(f"{wav_path}: expected 16-bit mono audio")
+            pcm = np.frombuffer(f.readframes(f.getnframes()), dtype=np.int16)
+            pcm = resample(pcm, f.getframerate(), SAMPLE_RATE)
+        with open(wav_path.with_suffix(".json")) as f:
+            turns = [tuple(turn) for turn in json.load(f)["turns"]]
+        corpus.append((wav_path.stem, pcm, turns))
+    return corpus
+
+
+def run_endpointer(pcm, adaptive):
+    """Return (end decision times in seconds, CPU seconds per frame)."""
+    endpointer = Endpointer(adaptive=adaptive)
+    n_frames = len(pcm) // SAMPLES_PER_FRAME
+    frames = pcm[:n_frames * SAMPLES_PER_FRAME].reshape(n_frames, SAMPLES_PER_FRAME)
+    ends = []
+    start = time.perf_counter()
+    for i in range(n_frames):
+        if endpointer.feed(frames[i]) == SPEECH_END:
+            ends.append((i + 1) * FRAME_MS / 1000)
+    return ends, (time.perf_counter() - start) / max(1, n_frames)
+
+
+def score(ends, turns):
+    detected, cut, latencies = 0, 0, []
+    matched = set()
+    for start, end in turns:
+        cut += sum(1 for t in ends if start < t < end)
+        decision = next((t for t in ends if end <= t <= end + MAX_DECISION_S), None)
+        if decision is not None:
+            detected += 1
+            latencies.append((decision - end) * 1000)
+            matched.add(decision)
+    inside = {t for t in ends for start, end in turns if start < t < end}
+    false = len([t for t in ends if t not in matched and t not in inside])
+    return detected, cut, false, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark end-of-turn detection")
+    parser.add_argument("--corpus", help="Directory of labelled WAV files (default: synthetic)")
+    parser.add_argument("--seconds", type=float, default=120,
+                        help="Length of each synthetic recording")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus) if args.corpus else synthetic_corpus(args.seconds, args.seed)
+
+    print(f"{'recording':>12} {'mode':>9} {'detected':>9} {'cut':>5} {'false':>6} "
+          f"{'latency p50':>12} {'p95':>7} {'us/frame':>9}")
+    for name, pcm, turns in corpus:
+        for mode, adaptive in (("fixed", False), ("adaptive", True)):
+            ends, per_frame = run_endpointer(pcm, adaptive)
+            detected, cut, false, latencies = score(ends, turns)
+            p50, p95 = np.percentile(latencies, [50, 95]) if latencies else (float("nan"),) * 2
+            print(f"{name:>12} {mode:>9} {detected:>4}/{len(turns):<4} {cut:>5} {false:>6} "
+                  f"{p50:>10.0f}ms {p95:>5.0f}ms {per_frame * 1e6:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
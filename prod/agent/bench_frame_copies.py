@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Measure the bytes copied between incoming frames and the STT upload.
+
+Runs one synthetic utterance through the previous path (list of frames,
+np.concatenate, resample, preprocess, tobytes, pydub WAV export) and through
+the PCMBuffer path used by main.py, and reports the audio bytes each path
+materializes, the peak traced allocation, the total CPU time per utterance
+and the part of it left after the last frame arrives (the turn latency).
+The PCMBuffer path moves the resampling into per-frame ingest, which runs
+while the user is still speaking.
+"""
+
+import io
+import time
+import argparse
+import tracemalloc
+
+import numpy as np
+
+from audio_utils import SAMPLE_RATE, STT_SAMPLE_RATE, SAMPLES_PER_FRAME, resample, preprocess_for_stt
+from pcm_buffer import PCMBuffer
+
+
+def make_frames(seconds, rng):
+    """Synthetic 20ms frames: 1s of silence around a speech-like burst."""
+    total = int(seconds * SAMPLE_RATE)
+    t = np.arange(total) / SAMPLE_RATE
+    pcm = rng.normal(0, 30, total)
+    speech = slice(SAMPLE_RATE, total - SAMPLE_RATE)
+    pcm[speech] += np.sin(2 * np.pi * 220 * t[speech]) * 4000
+    pcm = pcm.astype(np.int16)
+    return [memoryview(pcm[i:i + SAMPLES_PER_FRAME]) for i in range(0, total, SAMPLES_PER_FRAME)]
+
+
+def legacy_path(frames):
+    """The pre-PCMBuffer path; returns (upload bytes, bytes copied, turn start)."""
+    from pydub import AudioSegment
+
+    copied = 0
+    frame_list = []
+    for frame in frames:
+        frame_list.append(frame)
+    turn_start = time.perf_counter()
+    audio_data = np.concatenate(frame_list)
+    copied += audio_data.nbytes
+    resampled = resample(audio_data, SAMPLE_RATE, STT_SAMPLE_RATE)
+    copied += resampled.nbytes
+    speech, _ = preprocess_for_stt(resampled, STT_SAMPLE_RATE)
+    copied += speech.nbytes
+    raw = speech.tobytes()
+    copied += len(raw)
+    audio_file = io.BytesIO()
+    AudioSegment(raw, frame_rate=STT_SAMPLE_RATE, sample_width=2, channels=1).export(audio_file, format="wav")
+    copied += audio_file.getbuffer().nbytes
+    return audio_file.getvalue(), copied, turn_start
+
+
+def buffer_path(frames):
+    """The PCMBuffer path from main.py; returns (upload view, bytes copied, turn start)."""
+    utterance = PCMBuffer(STT_SAMPLE_RATE, input_rate=SAMPLE_RATE)
+    for frame in frames:
+        utterance.append(frame)
+
+    turn_start = time.perf_counter()
+    speech = utterance.samples()
+    speech, _ = preprocess_for_stt(speech, STT_SAMPLE_RATE, out=speech)
+    utterance.truncate(len(speech))
+
+    # Downsampled frame writes (plus any growth) and the in-place compaction
+    copied = utterance.bytes_copied + speech.nbytes
+    return utterance.wav_view(), copied, turn_start
+
+
+def measure(path, frames, iterations):
+    tracemalloc.start()
+    payload, copied, _ = path(frames)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    total = turn = 0.0
+    for _ in range(iterations):
+        start = time.perf_counter()
+        _, _, turn_start = path(frames)
+        end = time.perf_counter()
+        total += end - start
+        turn += end - turn_start
+    return len(payload), copied, peak, total / iterations * 1000, turn / iterations * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark bytes copied per utterance")
+    parser.add_argument("--seconds", type=float, nargs="+", default=[2, 5, 15],
+                        help="Utterance lengths")
+    parser.add_argument("--iterations", type=int, default=20,
+                        help="Timed runs per length")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'audio':>6} {'path':>8} {'upload':>10} {'copied':>10} {'peak alloc':>11} {'total':>9} {'turn':>9}")
+    for seconds in args.seconds:
+        frames = make_frames(seconds, rng)
+        for name, path in (("legacy", legacy_path), ("buffer", buffer_path)):
+            size, copied, peak, total, turn = measure(path, frames, args.iterations)
+            print(f"{seconds:>5.0f}s {name:>8} {size:>10} {copied:>10} {peak:>11} {total:>7.2f}ms {turn:>7.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
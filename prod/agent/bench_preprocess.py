@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark for the STT preprocessing stage.
+
+Builds synthetic utterances (speech-like bursts separated by pauses, with
+leading and trailing silence) and times resampling plus preprocess_for_stt.
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from audio_utils import SAMPLE_RATE, STT_SAMPLE_RATE, resample, preprocess_for_stt
+
+
+def make_utterance(seconds, rng):
+    """Return `seconds` of 48kHz audio: 1s silence, bursts and pauses, 1s silence."""
+    parts = [rng.normal(0, 30, SAMPLE_RATE)]
+    remaining = seconds - 2
+    while remaining > 0:
+        burst = min(rng.uniform(0.4, 1.5), remaining)
+        t = np.arange(int(burst * SAMPLE_RATE)) / SAMPLE_RATE
+        parts.append(np.sin(2 * np.pi * 220 * t) * 4000 + rng.normal(0, 400, len(t)))
+        pause = rng.uniform(0.1, 1.2)
+        parts.append(rng.normal(0, 30, int(pause * SAMPLE_RATE)))
+        remaining -= burst + pause
+    parts.append(rng.normal(0, 30, SAMPLE_RATE))
+    return np.concatenate(parts).astype(np.int16)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark STT preprocessing")
+    parser.add_argument("--seconds", type=float, nargs="+", default=[3, 5, 15, 30],
+                        help="Utterance lengths to benchmark")
+    parser.add_argument("--iterations", type=int, default=50,
+                        help="Timed runs per length")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'audio':>8} {'in bytes':>10} {'out bytes':>10} {'saved':>7} {'mean':>9} {'p95':>9} {'x realtime':>11}")
+    for seconds in args.seconds:
+        pcm = make_utterance(seconds, rng)
+        timings = []
+        for _ in range(args.iterations):
+            start = time.perf_counter()
+            out, _ = preprocess_for_stt(resample(pcm, SAMPLE_RATE, STT_SAMPLE_RATE), STT_SAMPLE_RATE)
+            timings.append(time.perf_counter() - start)
+
+        timings = np.array(timings) * 1000
+        saved = 1 - out.nbytes / pcm.nbytes
+        print(
+            f"{len(pcm) / SAMPLE_RATE:>7.1f}s {pcm.nbytes:>10} {out.nbytes:>10} {saved:>6.0%} "
+            f"{timings.mean():>7.2f}ms {np.percentile(timings, 95):>7.2f}ms "
+            f"{len(pcm) / SAMPLE_RATE * 1000 / timings.mean():>10.0f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
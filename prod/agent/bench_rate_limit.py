@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Benchmark the per-client rate limiter (rate_limit.py).
+
+Fills the table with --keys clients, then measures:
+
+- the time per acquire() for random clients, against a table of one client
+- the time per request through RateLimitMiddleware, against no middleware
+- the time per request through the whole app (simulated upstream), for scale
+- the memory the table takes, and the time a sweep takes
+- fairness: with RATE_LIMIT_WORKER_RPS set, clients sending at very
+  different rates on a simulated clock, and the share each one is admitted
+"""
+
+import os
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+import tempfile
+import tracemalloc
+
+# The whole-app measurement needs the limiter installed
+os.environ.setdefault("RATE_LIMIT", "1")
+
+from metrics import Registry
+from rate_limit import RateLimiter, RateLimitMiddleware
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def ip_keys(count):
+    return [b"ip:10.%d.%d.%d" % (i >> 16 & 255, i >> 8 & 255, i & 255) for i in range(count)]
+
+
+def time_acquire(limiter, keys, calls):
+    """Nanoseconds per acquire() for `calls` random choices of `keys`."""
+    sample = [random.choice(keys) for _ in range(calls)]
+    acquire = limiter.acquire
+    start = time.perf_counter_ns()
+    for key in sample:
+        acquire(key)
+    return (time.perf_counter_ns() - start) / calls
+
+
+def time_middleware(limiter, keys, calls):
+    """Nanoseconds per request through the middleware, and without it."""
+
+    async def endpoint(scope, receive, send):
+        pass
+
+    scopes = [{"type": "http", "method": "POST", "path": "/api/process-audio",
+               "headers": [(b"host", b"localhost"), (b"content-type", b"multipart/form-data")],
+               "client": (random.choice(keys)[3:].decode(), 50000)} for _ in range(calls)]
+
+    async def run(app):
+        start = time.perf_counter_ns()
+        for scope in scopes:
+            await app(scope, None, None)
+        return (time.perf_counter_ns() - start) / calls
+
+    bare = asyncio.run(run(endpoint))
+    limited = asyncio.run(run(RateLimitMiddleware(endpoint, limiter)))
+    return bare, limited
+
+
+def time_app(keys, calls):
+    """Microseconds per POST /api/generate-response through the whole app."""
+    from fastapi.testclient import TestClient
+    from app_factory import create_app
+
+    app = create_app(simulate=True, temp_dir=tempfile.mkdtemp())
+    fill(app.state.rate_limiter, keys)
+    body = json.dumps({"text": "What time is it?"}).encode()
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        pass
+
+    async def run():
+        scope = {"type": "http", "http_version": "1.1", "method": "POST", "scheme": "http",
+                 "path": "/api/generate-response", "raw_path": b"/api/generate-response",
+                 "query_string": b"", "root_path": "", "server": ("localhost", 8000),
+                 "headers": [(b"host", b"localhost"), (b"content-type", b"application/json"),
+                             (b"content-length", str(len(body)).encode())]}
+        start = time.perf_counter()
+        for _ in range(calls):
+            scope["client"] = (random.choice(keys)[3:].decode(), 50000)
+            await app(scope, receive, send)
+        return (time.perf_counter() - start) / calls * 1e6
+
+    logging.disable(logging.INFO)
+    with TestClient(app) as client:
+        return client.portal.call(run)
+
+
+def fill(limiter, keys):
+    for key in keys:
+        limiter.acquire(key)
+
+
+def fairness(clients, worker_rps, seconds):
+    """
+    Simulate `clients` sending at rates from 1 to 10x the fair share.
+
+    Returns (requests sent, requests admitted) per client.
+    """
+    clock = FakeClock()
+    limiter = RateLimiter(rate=10, burst=5, worker_rate=worker_rps, sweep_s=5, registry=Registry(), clock=clock)
+    fair = worker_rps / clients
+    rates = [fair * (1 + 9 * i / max(clients - 1, 1)) for i in range(clients)]
+
+    # Each client sends at its own fixed rate; process arrivals in time order
+    arrivals = []
+    for client, rate in enumerate(rates):
+        t = random.random() / rate
+        while t < seconds:
+            arrivals.append((t, client))
+            t += 1 / rate
+    arrivals.sort()
+
+    sent = [0] * clients
+    admitted = [0] * clients
+    warmup = 10.0  # Until the first sweeps have measured the number of clients
+    for t, client in arrivals:
+        clock.now = t
+        ok = limiter.acquire(b"token:%d" % client) == 0
+        if t >= warmup:
+            sent[client] += 1
+            admitted[client] += ok
+    return sent, admitted
+
+
+def jain(values):
+    """Jain's fairness index: 1.0 when all values are equal, 1/n at worst."""
+    return sum(values) ** 2 / (len(values) * sum(v * v for v in values))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the per-client rate limiter")
+    parser.add_argument("--keys", type=int, default=1_000_000)
+    parser.add_argument("--calls", type=int, default=200_000)
+    parser.add_argument("--clients", type=int, default=20, help="Clients in the fairness simulation")
+    parser.add_argument("--worker-rps", type=float, default=20, help="Shared budget in the fairness simulation")
+    parser.add_argument("--seconds", type=float, default=120, help="Simulated time for fairness")
+    args = parser.parse_args()
+    random.seed(0)
+
+    # A rate high enough that every timed request is allowed
+    one = RateLimiter(rate=1e9, registry=Registry())
+    print(f"acquire, 1 client:        {time_acquire(one, [b'ip:10.0.0.1'], args.calls):7.0f} ns")
+    over = RateLimiter(registry=Registry())
+    print(f"acquire, over its rate:   {time_acquire(over, [b'ip:10.0.0.1'], args.calls):7.0f} ns")
+
+    keys = ip_keys(args.keys)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    limiter = RateLimiter(rate=1e9, registry=Registry())
+    start = time.perf_counter()
+    fill(limiter, keys)
+    fill_s = time.perf_counter() - start
+    table_bytes = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    print(f"fill {len(limiter):,} clients:   {fill_s:7.2f} s, table {table_bytes / 2**20:.0f} MiB "
+          f"({table_bytes / len(limiter):.0f} bytes/client)")
+    print(f"acquire, {args.keys:,} clients: {time_acquire(limiter, keys, args.calls):7.0f} ns")
+
+    bare, limited = time_middleware(limiter, keys, args.calls)
+    print(f"request, no limiter:      {bare:7.0f} ns")
+    print(f"request, limiter:         {limited:7.0f} ns (+{limited - bare:.0f} ns)")
+    app_us = time_app(keys, args.calls // 100)
+    print(f"request, whole app:       {app_us * 1000:7.0f} ns (limiter {(limited - bare) / 10 / app_us:.1f}%)")
+
+    start = time.perf_counter()
+    limiter.sweep()
+    limiter.sweep()
+    # The dropped generation is freed in a background thread
+    print(f"sweep (two generations):  {(time.perf_counter() - start) * 1000:7.1f} ms, {len(limiter):,} clients left")
+
+    sent, admitted = fairness(args.clients, args.worker_rps, args.seconds)
+    window = args.seconds - 10
+    print(f"\nfairness: {args.clients} clients sharing {args.worker_rps:g} req/s "
+          f"(fair share {args.worker_rps / args.clients:.2f} req/s)")
+    print(f"{'client':>6} {'sent/s':>8} {'admitted/s':>11}")
+    for client in (0, args.clients // 2, args.clients - 1):
+        print(f"{client:>6} {sent[client] / window:>8.2f} {admitted[client] / window:>11.2f}")
+    print(f"total admitted {sum(admitted) / window:.2f} req/s, Jain's index {jain(admitted):.3f} "
+          f"(by demand {jain(sent):.3f})")
+
+
+if __name__ == "__main__":
+    main()
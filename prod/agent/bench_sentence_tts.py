@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Benchmark sentence-level TTS against a single request per reply.
+
+For replies of 1, 5 and 20 sentences, measures the wall-clock time until
+the first audio and until the whole reply has been synthesized, either as
+one TTS request or split into sentences synthesized in parallel
+(sentence_tts.py).
+
+By default TTS is simulated by LocalOpenAI, with a fixed latency per
+request plus a latency per character of input. With --openai, requests go
+to the OpenAI API (needs OPENAI_API_KEY).
+"""
+
+import os
+import time
+import argparse
+
+import numpy as np
+
+from audio_utils import TTS_PCM_RATE
+from local_upstream import LocalOpenAI
+from sentence_tts import (
+    SENTENCE_TTS_CONCURRENCY, SeamJoiner, open_speech, split_sentences, stream_in_order
+)
+
+SENTENCES = [
+    "The weather tomorrow looks mostly sunny with a light breeze.",
+    "Temperatures should reach about twenty degrees in the afternoon.",
+    "There is a small chance of showers late in the evening.",
+    "If you are heading out, a light jacket should be enough.",
+    "The weekend forecast is a little less certain at this point.",
+]
+
+
+def reply_text(sentences):
+    return " ".join(SENTENCES[i % len(SENTENCES)] for i in range(sentences))
+
+
+def run_whole(client, text):
+    """Return (first audio seconds, total seconds, PCM bytes) for one request."""
+    start = time.perf_counter()
+    first = None
+    received = 0
+    for chunk in open_speech(client, text):
+        if first is None:
+            first = time.perf_counter() - start
+        received += len(chunk)
+    return first, time.perf_counter() - start, received
+
+
+def run_sentences(client, text, concurrency):
+    """Return (first audio seconds, total seconds, PCM bytes) split into sentences."""
+    start = time.perf_counter()
+    first = None
+    received = 0
+    joiner = SeamJoiner(TTS_PCM_RATE)
+    current = None
+    chunks = stream_in_order(lambda sentence: open_speech(client, sentence), split_sentences(text), concurrency)
+    for index, chunk in chunks:
+        if index != current:
+            current = index
+            joiner.start_sentence()
+        samples = joiner.feed(np.frombuffer(chunk, dtype=np.int16, count=len(chunk) // 2))
+        if first is None and len(samples):
+            first = time.perf_counter() - start
+        received += samples.nbytes
+    return first, time.perf_counter() - start, received
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sentence-level TTS")
+    parser.add_argument("--sentences", type=int, nargs="+", default=[1, 5, 20])
+    parser.add_argument("--concurrency", type=int, default=SENTENCE_TTS_CONCURRENCY)
+    parser.add_argument("--tts-ms", type=float, default=300, help="Simulated latency per request")
+    parser.add_argument("--ms-per-char", type=float, default=12, help="Simulated latency per character")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--openai", action="store_true", help="Use the OpenAI API instead of a simulation")
+    args = parser.parse_args()
+
+    if args.openai:
+        from http_pool import get_pool
+
+        client = get_pool().openai_client(os.getenv("OPENAI_API_KEY"))
+    else:
+        client = LocalOpenAI(latency_ms={"tts": args.tts_ms}, tts_ms_per_char=args.ms_per_char)
+
+    print(f"{'sentences':>9} {'chars':>6} {'mode':>9} {'first audio':>12} {'total':>9} {'audio':>8}")
+    for count in args.sentences:
+        text = reply_text(count)
+        for mode in ("whole", "sentences"):
+            runs = []
+            for _ in range(args.repeat):
+                if mode == "whole":
+                    runs.append(run_whole(client, text))
+                else:
+                    runs.append(run_sentences(client, text, args.concurrency))
+            first = np.median([run[0] for run in runs]) * 1000
+            total = np.median([run[1] for run in runs]) * 1000
+            audio_s = runs[-1][2] / 2 / TTS_PCM_RATE
+            print(f"{count:>9} {len(text):>6} {mode:>9} {first:>10.0f}ms {total:>7.0f}ms {audio_s:>7.1f}s")
+
+
+if __name__ == "__main__":
+    main()
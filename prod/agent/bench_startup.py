@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark for the Voice Agent API.
+
+Launches the server in several configurations, measures time-to-ready
+(process start until /health answers) and reports resident and private
+memory per serving process. Linux only (reads /proc).
+
+Configurations:
+    eager    single process that imports openai/numpy/pydub up front,
+             like the old server modules did
+    lazy     serve.py --no-preload with N workers, heavy modules imported
+             on first use
+    preload  serve.py with N workers, heavy modules imported before fork
+             (the default)
+"""
+
+import os
+import sys
+import time
+import socket
+import signal
+import argparse
+import subprocess
+import urllib.request
+from pathlib import Path
+
+AGENT_DIR = Path(__file__).resolve().parent
+
+EAGER_SERVER = """
+import openai, numpy, pydub, uvicorn, sys
+from app_factory import create_app
+uvicorn.run(create_app(simulate=True), host="127.0.0.1", port=int(sys.argv[1]), log_level="warning")
+"""
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_ready(port, timeout):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=0.5) as response:
+                if response.status == 200:
+                    return True
+        except OSError:
+            time.sleep(0.01)
+    return False
+
+
+def _children(pid):
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(child) for child in f.read().split()]
+    except OSError:
+        return []
+
+
+def _memory_kib(pid):
+    """Return (RSS, private) memory of `pid` in KiB."""
+    rss = private = 0
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            key, _, rest = line.partition(":")
+            if key == "Rss":
+                rss = int(rest.split()[0])
+            elif key in ("Private_Clean", "Private_Dirty"):
+                private += int(rest.split()[0])
+    return rss, private
+
+
+def run_config(name, workers, timeout):
+    port = _free_port()
+    env = dict(os.environ, SIMULATE="1", TEMP_DIR=str(AGENT_DIR / "temp" / "bench"))
+    if name == "eager":
+        cmd = [sys.executable, "-c", EAGER_SERVER, str(port)]
+    else:
+        cmd = [sys.executable, "serve.py", "--host", "127.0.0.1", "--port", str(port),
+               "--workers", str(workers), "--simulate", "--log-level", "warning"]
+        cmd.append("--preload" if name == "preload" else "--no-preload")
+
+    start = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=AGENT_DIR, env=env, stderr=subprocess.DEVNULL)
+    try:
+        ready = _wait_ready(port, timeout)
+        ready_ms = (time.perf_counter() - start) * 1000
+
+        # Let every worker accept a request so lazily loaded code is counted
+        for _ in range(workers * 4):
+            _wait_ready(port, 1)
+
+        serving = _children(proc.pid) or [proc.pid]
+        memory = [_memory_kib(pid) for pid in serving]
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        proc.wait(timeout=10)
+
+    if not ready:
+        print(f"{name:>8}: not ready after {timeout}s")
+        return
+
+    rss = sum(m[0] for m in memory) / len(memory) / 1024
+    private = sum(m[1] for m in memory) / len(memory) / 1024
+    print(f"{name:>8} {len(serving):>8} {ready_ms:>12.0f}ms {rss:>12.1f}MiB {private:>14.1f}MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark API server startup")
+    parser.add_argument("--workers", type=int, default=4,
+                        help="Workers for the serve.py configurations")
+    parser.add_argument("--configs", nargs="+", default=["eager", "lazy", "preload"],
+                        help="Configurations to run")
+    parser.add_argument("--timeout", type=float, default=30,
+                        help="Seconds to wait for readiness")
+    args = parser.parse_args()
+
+    print(f"{'config':>8} {'procs':>8} {'time-to-ready':>14} {'RSS/proc':>14} {'private/proc':>16}")
+    for name in args.configs:
+        run_config(name, args.workers, args.timeout)
+
+
+if __name__ == "__main__":
+    main()
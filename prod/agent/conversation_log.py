@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Conversation log for analytics
+
+Every completed turn (transcript, reply and stage timings) is recorded in a
+SQLite database. log_turn() only puts the row on a bounded in-memory queue,
+so it costs the same on the event loop whether or not the disk is keeping
+up. A background thread drains the queue and writes rows in batched
+transactions to the database in WAL mode. If the queue is full because the
+disk has stalled, new rows are dropped and counted rather than held in
+memory.
+
+Queue depth, flush latency, batch size, written rows and dropped rows are
+exported through the metrics registry.
+"""
+
+import os
+import time
+import queue
+import sqlite3
+import logging
+import threading
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+CONVERSATION_LOG_BATCH = int(os.getenv("CONVERSATION_LOG_BATCH", 200))
+CONVERSATION_LOG_FLUSH_MS = float(os.getenv("CONVERSATION_LOG_FLUSH_MS", 500))
+CONVERSATION_LOG_MAX_QUEUE = int(os.getenv("CONVERSATION_LOG_MAX_QUEUE", 10000))
+# Longest close() waits for queued rows to be written
+CONVERSATION_LOG_CLOSE_S = float(os.getenv("CONVERSATION_LOG_CLOSE_S", 10))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS turns (
+    id INTEGER PRIMARY KEY,
+    created_at REAL NOT NULL,
+    session TEXT NOT NULL,
+    participant TEXT,
+    source TEXT,
+    user_text TEXT,
+    response_text TEXT,
+    stt_ms REAL,
+    llm_ms REAL,
+    tts_ms REAL
+);
+CREATE INDEX IF NOT EXISTS turns_session_time ON turns (session, created_at);
+CREATE INDEX IF NOT EXISTS turns_time ON turns (created_at);
+"""
+
+INSERT = """
+INSERT INTO turns (created_at, session, participant, source, user_text, response_text, stt_ms, llm_ms, tts_ms)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+_STOP = object()
+
+
+class ConversationLog:
+    """Bounded queue of turns with a background batch writer."""
+
+    def __init__(self, path, batch_size=CONVERSATION_LOG_BATCH, flush_ms=CONVERSATION_LOG_FLUSH_MS,
+                 max_queue=CONVERSATION_LOG_MAX_QUEUE, registry=REGISTRY):
+        """
+        Args:
+            path: SQLite database file
+            batch_size: Most rows written per transaction
+            flush_ms: Longest a row waits before its batch is written
+            max_queue: Rows held in memory before new ones are dropped
+        """
+        self.path = str(path)
+        self.batch_size = batch_size
+        self.flush_interval = flush_ms / 1000
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stopping = threading.Event()
+        self._thread = None
+
+        self.rows = registry.counter("conversation_log_rows_total", "Turns written to the conversation log")
+        self.dropped = registry.counter("conversation_log_dropped_total",
+                                        "Turns dropped because the conversation log queue was full")
+        self.flush_ms = registry.summary("conversation_log_flush_ms", "Time to write one batch of turns")
+        self.batch = registry.summary("conversation_log_batch_size", "Turns per written batch")
+        registry.gauge("conversation_log_queue_depth", "Turns waiting to be written", fn=self._queue.qsize)
+
+    def start(self):
+        """Start the writer thread. Call in the process that will log (after any fork)."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="conversation-log", daemon=True)
+            self._thread.start()
+
+    def log_turn(self, session, user_text, response_text, participant=None, source=None,
+                 stt_ms=None, llm_ms=None, tts_ms=None):
+        """Queue one turn for writing. Never blocks; drops the turn if the queue is full."""
+        row = (time.time(), session, participant, source, user_text, response_text, stt_ms, llm_ms, tts_ms)
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self.dropped.inc()
+
+    def close(self, timeout=CONVERSATION_LOG_CLOSE_S):
+        """Write everything still queued and stop the writer. Blocks for at most `timeout` seconds."""
+        if self._thread is None:
+            return
+        self._stopping.set()
+        try:
+            # Wakes the writer if it is waiting for rows
+            self._queue.put_nowait(_STOP)
+        except queue.Full:
+            # It is not waiting, and checks _stopping once the queue is empty
+            pass
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger.warning("Conversation log writer still busy after %.0fs, up to %d queued turns may be lost",
+                           timeout, self._queue.qsize())
+        self._thread = None
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=5)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.executescript(SCHEMA)
+        return db
+
+    def _run(self):
+        try:
+            db = self._connect()
+        except sqlite3.Error as e:
+            logger.error("Conversation log disabled, cannot open %s: %s", self.path, e)
+            return
+
+        stopping = False
+        while not stopping:
+            # Wait for the first row, then gather more until the batch is full or due
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                if self._stopping.is_set():
+                    break
+                continue
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            self._write(db, batch)
+
+        # Drain whatever arrived before the stop marker was seen
+        remaining = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                remaining.append(item)
+        if remaining:
+            self._write(db, remaining)
+        db.close()
+
+    def _write(self, db, batch):
+        """Write one batch in a single transaction, retrying while the database is busy."""
+        start = time.perf_counter()
+        for attempt in range(5):
+            try:
+                with db:
+                    db.executemany(INSERT, batch)
+                break
+            except sqlite3.OperationalError as e:
+                logger.warning("Conversation log write failed (%s), retrying", e)
+                time.sleep(0.1 * 2 ** attempt)
+        else:
+            logger.error("Dropping %d conversation log rows after repeated write failures", len(batch))
+            self.dropped.inc(len(batch))
+            return
+
+        self.flush_ms.observe((time.perf_counter() - start) * 1000)
+        self.batch.observe(len(batch))
+        self.rows.inc(len(batch))
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Graceful degradation under overload
+
+The controller watches the latency of pipeline requests (process-audio,
+generate-response, text-to-speech, transcribe) and how many are in flight.
+Every DEGRADE_INTERVAL_S it computes a pressure: the p95 latency over the
+latency target, or the in-flight count over DEGRADE_MAX_INFLIGHT, whichever
+is higher. The level then moves one step at a time:
+
+    0 normal         full pipeline
+    1 short_replies  max_tokens lowered to DEGRADE_MAX_TOKENS
+    2 fast_model     also DEGRADE_FAST_MODEL instead of MODEL_NAME
+    3 text_only      also no TTS: replies carry text and no audio
+    4 shed           also requests beyond DEGRADE_MAX_INFLIGHT get a 503
+
+It steps down after DEGRADE_DOWN_INTERVALS intervals with pressure above 1,
+and back up only after DEGRADE_UP_INTERVALS intervals below
+DEGRADE_RECOVER_RATIO, so it does not flap around the SLO. The level,
+pressure and transitions are exported as degradation_* metrics.
+
+The latency target is DEGRADE_LATENCY_SLO_MS when set. Otherwise it is
+measured: DEGRADE_BASELINE_FACTOR times the p95 latency of the first
+DEGRADE_BASELINE_REQUESTS requests that completed while the worker was
+lightly loaded. Until then only the in-flight count applies.
+
+The controller is opt-in (DEGRADATION=1): what counts as overload depends
+on the upstream models and the deployment.
+"""
+
+import os
+import time
+import asyncio
+import logging
+from collections import namedtuple
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+DEGRADATION = os.getenv("DEGRADATION", "0").lower() in ("1", "true", "yes")
+DEGRADE_INTERVAL_S = float(os.getenv("DEGRADE_INTERVAL_S", 2))
+# 0 measures the target from a baseline instead
+DEGRADE_LATENCY_SLO_MS = float(os.getenv("DEGRADE_LATENCY_SLO_MS", 0))
+DEGRADE_BASELINE_REQUESTS = int(os.getenv("DEGRADE_BASELINE_REQUESTS", 200))
+DEGRADE_BASELINE_FACTOR = float(os.getenv("DEGRADE_BASELINE_FACTOR", 2))
+DEGRADE_MAX_INFLIGHT = int(os.getenv("DEGRADE_MAX_INFLIGHT", 32))
+DEGRADE_DOWN_INTERVALS = int(os.getenv("DEGRADE_DOWN_INTERVALS", 2))
+DEGRADE_UP_INTERVALS = int(os.getenv("DEGRADE_UP_INTERVALS", 5))
+DEGRADE_RECOVER_RATIO = float(os.getenv("DEGRADE_RECOVER_RATIO", 0.6))
+DEGRADE_MAX_TOKENS = int(os.getenv("DEGRADE_MAX_TOKENS", 60))
+DEGRADE_FAST_MODEL = os.getenv("DEGRADE_FAST_MODEL", "gpt-4.1-nano")
+
+# Paths whose requests run the upstream pipeline. Batch endpoints are left
+# out: their latency grows with the batch, not with overload.
+PIPELINE_PATHS = ("/api/process-audio", "/api/generate-response", "/api/text-to-speech", "/api/transcribe")
+
+# max_tokens and model are None for "as configured"
+Level = namedtuple("Level", "name max_tokens model tts shed")
+
+LEVELS = (
+    Level("normal", None, None, True, False),
+    Level("short_replies", DEGRADE_MAX_TOKENS, None, True, False),
+    Level("fast_model", DEGRADE_MAX_TOKENS, DEGRADE_FAST_MODEL, True, False),
+    Level("text_only", DEGRADE_MAX_TOKENS, DEGRADE_FAST_MODEL, False, False),
+    Level("shed", DEGRADE_MAX_TOKENS, DEGRADE_FAST_MODEL, False, True),
+)
+
+NORMAL = LEVELS[0]
+
+
+def _p95(values):
+    return sorted(values)[int(0.95 * (len(values) - 1))]
+
+
+class DegradationController:
+    """Chooses the degradation level from recent latency and load."""
+
+    def __init__(self, slo_ms=DEGRADE_LATENCY_SLO_MS, max_inflight=DEGRADE_MAX_INFLIGHT,
+                 interval_s=DEGRADE_INTERVAL_S, baseline_requests=DEGRADE_BASELINE_REQUESTS,
+                 baseline_factor=DEGRADE_BASELINE_FACTOR, registry=REGISTRY):
+        if max_inflight < 1:
+            raise ValueError(f"DEGRADE_MAX_INFLIGHT must be at least 1, got {max_inflight}")
+        # None until measured
+        self.slo_ms = slo_ms or None
+        self.max_inflight = max_inflight
+        self.interval = interval_s
+        self.baseline_requests = baseline_requests
+        self.baseline_factor = baseline_factor
+        self._baseline = []
+        self.level_index = 0
+        self.inflight = 0
+        self.pressure = 0.0
+        self._latencies = []
+        self._over = 0
+        self._under = 0
+        self._task = None
+
+        registry.gauge("degradation_level", "Current degradation level (0 = normal)", fn=lambda: self.level_index)
+        registry.gauge("degradation_pressure", "Latency or load relative to the SLO", fn=lambda: self.pressure)
+        registry.gauge("pipeline_inflight", "Pipeline requests in progress", fn=lambda: self.inflight)
+        registry.gauge("degradation_latency_slo_ms", "Latency target, 0 while it is measured",
+                       fn=lambda: self.slo_ms or 0)
+        self.steps_down = registry.counter("degradation_steps_down_total", "Transitions to a more degraded level")
+        self.steps_up = registry.counter("degradation_steps_up_total", "Transitions to a less degraded level")
+        self.shed = registry.counter("degradation_shed_total", "Requests rejected while shedding load")
+        self.latency = registry.summary("pipeline_latency_ms", "Pipeline request latency")
+
+    @property
+    def level(self):
+        return LEVELS[self.level_index]
+
+    def admit(self):
+        """Count a request in, or return False if it should be shed."""
+        if self.level.shed and self.inflight >= self.max_inflight:
+            self.shed.inc()
+            return False
+        self.inflight += 1
+        return True
+
+    def finish(self, latency_ms):
+        """Count an admitted request out."""
+        self.inflight -= 1
+        self._latencies.append(latency_ms)
+        self.latency.observe(latency_ms)
+
+    def update(self):
+        """Recompute the pressure from the last interval and move the level."""
+        latencies, self._latencies = self._latencies, []
+        load_pressure = self.inflight / self.max_inflight
+        if self.slo_ms is None:
+            self._measure_baseline(latencies, load_pressure)
+
+        latency_pressure = 0.0
+        if latencies and self.slo_ms is not None:
+            latency_pressure = _p95(latencies) / self.slo_ms
+        self.pressure = max(latency_pressure, load_pressure)
+
+        if self.pressure > 1.0:
+            self._over += 1
+            self._under = 0
+        elif self.pressure < DEGRADE_RECOVER_RATIO:
+            self._under += 1
+            self._over = 0
+        else:
+            self._over = self._under = 0
+
+        if self._over >= DEGRADE_DOWN_INTERVALS and self.level_index < len(LEVELS) - 1:
+            self._set_level(self.level_index + 1)
+            self.steps_down.inc()
+        elif self._under >= DEGRADE_UP_INTERVALS and self.level_index > 0:
+            self._set_level(self.level_index - 1)
+            self.steps_up.inc()
+
+    def _measure_baseline(self, latencies, load_pressure):
+        """Collect latencies from lightly loaded intervals until the target can be set."""
+        if load_pressure >= DEGRADE_RECOVER_RATIO:
+            return
+        self._baseline.extend(latencies)
+        if self._baseline and len(self._baseline) >= self.baseline_requests:
+            self.slo_ms = self.baseline_factor * _p95(self._baseline)
+            self._baseline = []
+            logger.info("Degradation latency target %.0fms, from a baseline p95 of %.0fms",
+                        self.slo_ms, self.slo_ms / self.baseline_factor)
+
+    def _set_level(self, index):
+        logger.warning("Degradation level %s -> %s (pressure %.2f)",
+                       self.level.name, LEVELS[index].name, self.pressure,
+                       extra={"degradation_level": index})
+        self.level_index = index
+        self._over = self._under = 0
+
+    def start(self):
+        """Start re-evaluating every interval on the running event loop."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            self.update()
+
+
+class DegradationMiddleware:
+    """ASGI middleware that measures pipeline requests and sheds them when told to."""
+
+    def __init__(self, app, controller):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in PIPELINE_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        if not self.controller.admit():
+            await send({
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [(b"content-type", b"application/json"),
+                            (b"retry-after", str(max(1, round(self.controller.interval))).encode())],
+            })
+            await send({"type": "http.response.body", "body": b'{"detail": "Server overloaded, retry later"}'})
+            return
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.finish((time.perf_counter() - start) * 1000)
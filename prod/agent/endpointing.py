@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Adaptive end-of-turn detection for the Voice Agent
+
+An Endpointer follows one participant's audio frame by frame. It tracks the
+background noise floor with an exponential moving estimate that falls
+quickly and rises slowly, so it settles on the quiet between words rather
+than on speech. The speech-on and speech-off thresholds sit a fixed margin
+above that floor, with hysteresis between them, so soft speakers in a quiet
+room and normal speakers in a noisy one are both detected.
+
+The floor starts at ENDPOINT_MIN_LEVEL_DB, so speech at the very start of a
+track is detected at once rather than taken for the floor. Until the first
+quiet frame the floor follows the level at its normal rate even during
+speech; if the track instead started in steady noise, that first "turn"
+ends barely above the floor it converged to and is cancelled.
+
+The hangover (the silence that ends a turn) adapts to the signal-to-noise
+ratio. With clean separation between speech and background, a short pause
+is trusted and the turn ends quickly. In noise the endpointer waits longer
+before deciding.
+
+With adaptive=False the thresholds and hangover are fixed, which is the
+baseline bench_endpointing.py compares against.
+"""
+
+import os
+
+import numpy as np
+
+from audio_utils import FRAME_MS, SILENCE_THRESHOLD_DB
+
+ON_MARGIN_DB = float(os.getenv("ENDPOINT_ON_MARGIN_DB", 9))
+OFF_MARGIN_DB = float(os.getenv("ENDPOINT_OFF_MARGIN_DB", 5))
+MIN_LEVEL_DB = float(os.getenv("ENDPOINT_MIN_LEVEL_DB", -60))
+START_MS = int(os.getenv("ENDPOINT_START_MS", 60))
+MIN_SPEECH_MS = int(os.getenv("ENDPOINT_MIN_SPEECH_MS", 200))
+MIN_HANGOVER_MS = int(os.getenv("ENDPOINT_MIN_HANGOVER_MS", 300))
+MAX_HANGOVER_MS = int(os.getenv("ENDPOINT_MAX_HANGOVER_MS", 800))
+MAX_UTTERANCE_MS = int(float(os.getenv("ENDPOINT_MAX_UTTERANCE_S", 15)) * 1000)
+
+# Hangover used when adaptation is off
+FIXED_HANGOVER_MS = 500
+
+# SNR range over which the hangover goes from its maximum to its minimum
+LOW_SNR_DB = 10.0
+HIGH_SNR_DB = 30.0
+
+# Noise floor smoothing per 20ms frame: falls fast, rises slowly (~2s), and
+# more slowly still while someone is speaking (~7s), so it can follow a
+# noise level that jumps while speech is detected
+FLOOR_FALL = 0.3
+FLOOR_RISE = 0.01
+FLOOR_RISE_IN_SPEECH = 0.003
+SPEECH_LEVEL_SMOOTHING = 0.1
+
+# Events returned by Endpointer.feed()
+SPEECH_START = "start"
+SPEECH_END = "end"
+SPEECH_CANCEL = "cancel"
+
+
+def frame_level_db(samples):
+    """RMS level of 16-bit samples in dBFS."""
+    samples = np.frombuffer(samples, dtype=np.int16).astype(np.float32)
+    if not len(samples):
+        return -120.0
+    energy = float(np.dot(samples, samples)) / len(samples)
+    return 10 * np.log10(energy / (32768.0 ** 2) + 1e-12)
+
+
+class Endpointer:
+    """Per-participant speech start and end-of-turn detector."""
+
+    def __init__(self, adaptive=True, frame_ms=FRAME_MS):
+        self.adaptive = adaptive
+        self.frame_ms = frame_ms
+        # Assume a quiet room until the floor has been measured, so speech at
+        # the very start of the track is not taken for the floor
+        self.noise_floor_db = MIN_LEVEL_DB
+        self._floor_measured = False
+        self.speech_level_db = None
+        self.in_speech = False
+        self._onset_ms = 0
+        self._speech_ms = 0
+        self._silence_ms = 0
+        self._utterance_ms = 0
+
+    @property
+    def on_threshold_db(self):
+        if not self.adaptive:
+            return SILENCE_THRESHOLD_DB
+        return max(self.noise_floor_db + ON_MARGIN_DB, MIN_LEVEL_DB)
+
+    @property
+    def off_threshold_db(self):
+        if not self.adaptive:
+            return SILENCE_THRESHOLD_DB
+        # Keep the same hysteresis gap when the on threshold is clamped
+        return max(self.noise_floor_db + OFF_MARGIN_DB, MIN_LEVEL_DB - (ON_MARGIN_DB - OFF_MARGIN_DB))
+
+    @property
+    def hangover_ms(self):
+        """Silence that ends a turn: short at high SNR, long at low SNR."""
+        if not self.adaptive:
+            return FIXED_HANGOVER_MS
+        if self.speech_level_db is None:
+            return MAX_HANGOVER_MS
+        snr = self.speech_level_db - self.noise_floor_db
+        confidence = min(1.0, max(0.0, (snr - LOW_SNR_DB) / (HIGH_SNR_DB - LOW_SNR_DB)))
+        return MAX_HANGOVER_MS - confidence * (MAX_HANGOVER_MS - MIN_HANGOVER_MS)
+
+    def _track_floor(self, level, rise):
+        if level < self.noise_floor_db:
+            self.noise_floor_db += FLOOR_FALL * (level - self.noise_floor_db)
+        else:
+            self.noise_floor_db += rise * (level - self.noise_floor_db)
+
+    def feed(self, samples):
+        """
+        Process one frame of 16-bit samples.
+
+        Returns:
+            SPEECH_START when a turn begins, SPEECH_END when it is over,
+            SPEECH_CANCEL when what began was too short to be speech, or None
+        """
+        return self.feed_level(frame_level_db(samples))
+
+    def feed_level(self, level):
+        """Process one frame given its level in dBFS; see feed()."""
+        if not self.in_speech:
+            if level > self.on_threshold_db:
+                self._onset_ms += self.frame_ms
+                if self._onset_ms >= START_MS:
+                    self.in_speech = True
+                    self._speech_ms = self._utterance_ms = self._onset_ms
+                    self._silence_ms = 0
+                    self._onset_ms = 0
+                    return SPEECH_START
+            else:
+                self._onset_ms = 0
+                self._floor_measured = True
+                if self.adaptive:
+                    self._track_floor(level, FLOOR_RISE)
+            return None
+
+        self._utterance_ms += self.frame_ms
+        if level > self.off_threshold_db:
+            self._silence_ms = 0
+            self._speech_ms += self.frame_ms
+            if self.speech_level_db is None:
+                self.speech_level_db = level
+            else:
+                self.speech_level_db += SPEECH_LEVEL_SMOOTHING * (level - self.speech_level_db)
+            if self.adaptive:
+                # Until a quiet frame has been seen, the "speech" may be the room's noise
+                self._track_floor(level, FLOOR_RISE_IN_SPEECH if self._floor_measured else FLOOR_RISE)
+        else:
+            self._silence_ms += self.frame_ms
+            if self.adaptive:
+                self._track_floor(level, FLOOR_RISE)
+
+        if self._silence_ms >= self.hangover_ms or self._utterance_ms >= MAX_UTTERANCE_MS:
+            self.in_speech = False
+            if not self._floor_measured:
+                self._floor_measured = True
+                # Barely above the floor it converged to: that was the room, not a voice
+                if self.adaptive and self.speech_level_db - self.noise_floor_db < LOW_SNR_DB:
+                    self.speech_level_db = None
+                    return SPEECH_CANCEL
+            return SPEECH_END if self._speech_ms >= MIN_SPEECH_MS else SPEECH_CANCEL
+        return None
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+In-process stand-in for the parts of livekit.rtc the Voice Agent uses
+
+Provides Room, AudioStream, AudioSource, AudioFrame, LocalAudioTrack and
+TrackKind with the same call surface, so VoiceAgent can run without a
+LiveKit server:
+
+    import main, fake_room
+    main.rtc = fake_room
+    agent = main.VoiceAgent(...)
+    participant = agent.room.add_participant("user-1")
+    await participant.track.push(frame)
+
+Incoming tracks hold a bounded queue of frames like a network jitter
+buffer; frames arriving while it is full are dropped and counted. The
+outgoing AudioSource plays out in real time and makes capture_frame wait
+while more than queue_size_ms is queued, as the real one does.
+"""
+
+import os
+import asyncio
+import logging
+from types import SimpleNamespace
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Incoming frames buffered per track before new ones are dropped (1s)
+STREAM_CAPACITY = int(os.getenv("FAKE_STREAM_CAPACITY", 50))
+
+
+class TrackKind:
+    KIND_UNKNOWN = 0
+    KIND_AUDIO = 1
+    KIND_VIDEO = 2
+
+
+class AudioFrame:
+    """16-bit PCM frame; `data` is a memoryview of int16 samples."""
+
+    def __init__(self, data, sample_rate, num_channels, samples_per_channel):
+        self.data = memoryview(np.frombuffer(data, dtype=np.int16))
+        self.sample_rate = sample_rate
+        self.num_channels = num_channels
+        self.samples_per_channel = samples_per_channel
+
+    @property
+    def duration(self):
+        return self.samples_per_channel / self.sample_rate
+
+
+class RemoteAudioTrack:
+    """A participant's microphone track, fed by push()."""
+
+    kind = TrackKind.KIND_AUDIO
+
+    def __init__(self, sid, capacity=STREAM_CAPACITY):
+        self.sid = sid
+        self.frames_pushed = 0
+        self.frames_dropped = 0
+        self._queue = asyncio.Queue(maxsize=capacity)
+
+    async def push(self, frame):
+        """Deliver one frame; dropped if the subscriber has fallen behind."""
+        self.frames_pushed += 1
+        try:
+            self._queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            self.frames_dropped += 1
+
+    async def end(self):
+        """End the track; the AudioStream iterating it stops."""
+        await self._queue.put(None)
+
+
+class AudioStream:
+    """Async iterator over the frames of a RemoteAudioTrack."""
+
+    def __init__(self, track, **kwargs):
+        self._track = track
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        frame = await self._track._queue.get()
+        if frame is None:
+            raise StopAsyncIteration
+        return frame
+
+
+class AudioSource:
+    """Outgoing audio that plays out in real time behind a bounded queue."""
+
+    def __init__(self, sample_rate, num_channels, queue_size_ms=1000):
+        self.sample_rate = sample_rate
+        self.num_channels = num_channels
+        self.queue_size = queue_size_ms / 1000
+        self.frames_captured = 0
+        self.on_frame = None
+        self._playout_end = 0.0
+
+    @property
+    def queued_duration(self):
+        return max(0.0, self._playout_end - asyncio.get_running_loop().time())
+
+    async def capture_frame(self, frame):
+        now = asyncio.get_running_loop().time()
+        self._playout_end = max(self._playout_end, now) + frame.samples_per_channel / self.sample_rate
+        self.frames_captured += 1
+        if self.on_frame is not None:
+            self.on_frame(frame)
+
+        wait = self._playout_end - now - self.queue_size
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class LocalAudioTrack:
+    def __init__(self, name, source):
+        self.name = name
+        self.source = source
+
+    @classmethod
+    def create_audio_track(cls, name, source):
+        return cls(name, source)
+
+
+class LocalParticipant:
+    def __init__(self, identity):
+        self.identity = identity
+        self.tracks = []
+
+    async def publish_track(self, track, options=None):
+        self.tracks.append(track)
+        return SimpleNamespace(sid=f"TR_{track.name}", track=track)
+
+
+class RemoteParticipant:
+    def __init__(self, identity, track):
+        self.identity = identity
+        self.track = track
+
+
+class Room:
+    """Event emitter with the Room methods VoiceAgent calls."""
+
+    def __init__(self, loop=None):
+        self._handlers = {}
+        self.local_participant = LocalParticipant("agent")
+        self.remote_participants = {}
+        self.connected = False
+
+    def on(self, event, callback=None):
+        def register(callback):
+            self._handlers.setdefault(event, []).append(callback)
+            return callback
+        return register(callback) if callback is not None else register
+
+    def emit(self, event, *args):
+        for callback in self._handlers.get(event, ()):
+            callback(*args)
+
+    async def connect(self, url, token, options=None):
+        self.connected = True
+
+    async def disconnect(self):
+        self.connected = False
+
+    def add_participant(self, identity, capacity=STREAM_CAPACITY):
+        """Join a participant with one audio track and subscribe to it."""
+        track = RemoteAudioTrack(f"TR_{identity}", capacity)
+        participant = RemoteParticipant(identity, track)
+        self.remote_participants[identity] = participant
+        self.emit("participant_connected", participant)
+        self.emit("track_subscribed", track, SimpleNamespace(sid=track.sid), participant)
+        return participant
+
+    async def remove_participant(self, identity):
+        participant = self.remote_participants.pop(identity)
+        await participant.track.end()
+        self.emit("participant_disconnected", participant)
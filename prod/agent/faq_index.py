@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+FAQ answers without the language model
+
+Many questions are the same few dozen phrased differently. FAQ_PATH names
+a JSON file of canonical question and answer pairs:
+
+    [{"questions": ["What are your opening hours?", "When are you open?"],
+      "answer": "We are open from nine to five, Monday to Friday."}, ...]
+
+Every question is embedded once and kept as a row of one contiguous,
+L2-normalized float32 matrix, so a lookup is a single matrix-vector product
+(cosine similarity) and a partial sort for the top FAQ_TOP_K rows. When the
+best match scores at least FAQ_THRESHOLD, the stored answer is used and its
+pre-rendered audio is served; neither the LLM nor TTS is called.
+
+Embeddings and rendered answers are cached on disk by content hash, so
+workers and restarts reuse them. Each worker checks FAQ_PATH every
+FAQ_RELOAD_INTERVAL_S and, when it has changed, builds a new index in the
+background and swaps it in; lookups keep using the old one until then.
+
+Every lookup embeds the question upstream before the language model can be
+called, so it is skipped while the index is empty and the embedding call
+gives up after FAQ_LOOKUP_TIMEOUT_MS; the request then goes to the model.
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from metrics import REGISTRY
+from audio_formats import DEFAULT_FORMAT
+
+logger = logging.getLogger(__name__)
+
+FAQ_PATH = os.getenv("FAQ_PATH")
+FAQ_THRESHOLD = float(os.getenv("FAQ_THRESHOLD", 0.85))
+FAQ_TOP_K = int(os.getenv("FAQ_TOP_K", 3))
+FAQ_RELOAD_INTERVAL_S = float(os.getenv("FAQ_RELOAD_INTERVAL_S", 30))
+FAQ_LOOKUP_TIMEOUT_MS = float(os.getenv("FAQ_LOOKUP_TIMEOUT_MS", 300))
+
+
+def load_faq(path):
+    """Read FAQ entries: dicts with "questions" (or "question") and "answer"."""
+    with open(path) as f:
+        raw = json.load(f)
+    entries = []
+    for item in raw:
+        questions = item.get("questions") or [item["question"]]
+        entries.append({"questions": [q.strip() for q in questions if q.strip()], "answer": item["answer"].strip()})
+    return entries
+
+
+def _digest(*parts):
+    return hashlib.sha256("\0".join(parts).encode()).hexdigest()[:32]
+
+
+class FAQIndex:
+    """Question embeddings in one matrix, with the answer each row belongs to."""
+
+    def __init__(self, entries, vectors, rows):
+        """
+        Args:
+            entries: FAQ entries; each has an "audio" dict of format -> bytes,
+                replaced whole (under its "lock") when a format is added
+            vectors: One embedding per question, shape (questions, dims)
+            rows: Index into `entries` for each row of `vectors`
+        """
+        self.entries = entries
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if not len(rows):
+            # An empty FAQ file still gives a searchable (empty) index
+            matrix = matrix.reshape(0, 0)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        self.matrix = np.ascontiguousarray(matrix / np.maximum(norms, 1e-12))
+        self.rows = np.asarray(rows, dtype=np.intp)
+        self.built_at = time.time()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def search(self, vector, k=FAQ_TOP_K):
+        """
+        Return the top `k` (cosine score, entry index) pairs, best first.
+
+        Several phrasings of one question count once, with their best score.
+        """
+        if not len(self.matrix):
+            return []
+        query = np.asarray(vector, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        scores = self.matrix @ query
+
+        # Enough rows that k distinct entries survive duplicates
+        n = min(len(scores), k * 4)
+        top = np.argpartition(scores, -n)[-n:]
+        top = top[np.argsort(scores[top])[::-1]]
+        results, seen = [], set()
+        for row in top:
+            entry = int(self.rows[row])
+            if entry not in seen:
+                seen.add(entry)
+                results.append((float(scores[row]), entry))
+                if len(results) == k:
+                    break
+        return results
+
+
+def build_index(entries, upstream, cache_dir, fmt=DEFAULT_FORMAT):
+    """
+    Embed every question and render every answer, reusing cached results.
+
+    Blocking; calls the upstream for anything not cached in `cache_dir`.
+    """
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    model = upstream.embedding_model
+
+    questions, rows = [], []
+    for index, entry in enumerate(entries):
+        for question in entry["questions"]:
+            questions.append(question)
+            rows.append(index)
+
+    vectors = [None] * len(questions)
+    missing = []
+    for i, question in enumerate(questions):
+        path = cache_dir / f"{_digest(model, question)}.npy"
+        if path.exists():
+            vectors[i] = np.load(path)
+        else:
+            missing.append(i)
+    if missing:
+        for i, vector in zip(missing, upstream.embed([questions[i] for i in missing])):
+            vectors[i] = np.asarray(vector, dtype=np.float32)
+            _save(cache_dir / f"{_digest(model, questions[i])}.npy", vectors[i])
+
+    for entry in entries:
+        path = cache_dir / f"{_digest(entry['answer'])}.{fmt}"
+        if path.exists():
+            audio = path.read_bytes()
+        else:
+            audio = upstream.synthesize(entry["answer"], fmt)
+            _save(path, audio)
+        entry["audio"] = {fmt: audio}
+        entry["lock"] = threading.Lock()
+
+    return FAQIndex(entries, vectors, rows)
+
+
+def _save(path, data):
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    if isinstance(data, np.ndarray):
+        with open(tmp, "wb") as f:
+            np.save(f, data)
+    else:
+        tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+class FAQService:
+    """The current FAQ index for one worker, rebuilt when FAQ_PATH changes."""
+
+    def __init__(self, path, upstream, cache_dir, threshold=FAQ_THRESHOLD,
+                 reload_interval=FAQ_RELOAD_INTERVAL_S, lookup_timeout_ms=FAQ_LOOKUP_TIMEOUT_MS,
+                 registry=REGISTRY):
+        self.path = Path(path)
+        self.upstream = upstream
+        self.cache_dir = cache_dir
+        self.threshold = threshold
+        self.reload_interval = reload_interval
+        self.lookup_timeout = lookup_timeout_ms / 1000
+        self.index = None
+        self._mtime = None
+        self._build_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.hits = registry.counter("faq_hits_total", "Questions answered from the FAQ index")
+        self.misses = registry.counter("faq_misses_total", "Questions passed on to the language model")
+        self.lookup_ms = registry.summary("faq_lookup_ms", "FAQ lookup time, embedding included")
+        self.search_ms = registry.summary("faq_search_ms", "FAQ vector search time")
+        registry.gauge("faq_entries", "Answers in the FAQ index",
+                       fn=lambda: len(self.index) if self.index is not None else 0)
+
+    def start(self):
+        """Build the index and watch FAQ_PATH in a background thread."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="faq-index", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def rebuild(self):
+        """Build a new index from FAQ_PATH and swap it in. Blocking."""
+        with self._build_lock:
+            mtime = self.path.stat().st_mtime
+            start = time.perf_counter()
+            index = build_index(load_faq(self.path), self.upstream, self.cache_dir)
+            self.index = index
+            self._mtime = mtime
+        logger.info("FAQ index built: %d answers, %d questions in %.0fms",
+                    len(index), len(index.matrix), (time.perf_counter() - start) * 1000)
+        return index
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                if self.path.stat().st_mtime != self._mtime:
+                    self.rebuild()
+            except Exception as e:
+                logger.error("FAQ index build failed, keeping the previous one: %s", e)
+            self._stop.wait(self.reload_interval)
+
+    def lookup(self, text):
+        """
+        Return (entry, score) for a confident match of `text`, or None.
+
+        Blocking (embeds `text` through the upstream, for at most
+        FAQ_LOOKUP_TIMEOUT_MS before the upstream raises).
+        """
+        index = self.index
+        if index is None or not len(index) or not text or not text.strip():
+            return None
+        start = time.perf_counter()
+        vector = self.upstream.embed([text], timeout=self.lookup_timeout)[0]
+        search_start = time.perf_counter()
+        results = index.search(vector)
+        end = time.perf_counter()
+        self.search_ms.observe((end - search_start) * 1000)
+        self.lookup_ms.observe((end - start) * 1000)
+
+        if results and results[0][0] >= self.threshold:
+            self.hits.inc()
+            score, entry = results[0]
+            return index.entries[entry], score
+        self.misses.inc()
+        return None
+
+    def audio(self, entry, fmt):
+        """The entry's answer audio in `fmt`, rendering and keeping it if needed."""
+        audio = entry["audio"].get(fmt)
+        if audio is not None:
+            return audio
+        # One render per entry and format; readers keep using the old dict
+        with entry["lock"]:
+            audio = entry["audio"].get(fmt)
+            if audio is None:
+                audio = self.upstream.synthesize(entry["answer"], fmt)
+                entry["audio"] = {**entry["audio"], fmt: audio}
+        return audio
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Pre-rendered filler clips for the Voice Agent
+
+Short filler and acknowledgement phrases, plus the fixed error reply, are
+synthesized once at startup and kept in memory as decoded PCM. The agent can
+then play one the moment a turn runs long without calling TTS on the hot path.
+"""
+
+import os
+import logging
+
+from audio_utils import SAMPLE_RATE, TTS_PCM_RATE, StreamUpsampler
+
+logger = logging.getLogger(__name__)
+
+# Fixed reply used when the language model fails
+ERROR_REPLY = "I'm sorry, I couldn't process that request."
+
+# Phrases are separated by "|" in the environment variables
+DEFAULT_FILLER_PHRASES = "One moment...|Just a second..."
+DEFAULT_ACK_PHRASES = "Okay, let me check.|Sure, give me a moment."
+
+
+def _parse_phrases(value):
+    """Split a "|"-separated phrase list, dropping empty entries."""
+    return [phrase.strip() for phrase in value.split("|") if phrase.strip()]
+
+
+class FillerBank:
+    """In-memory bank of decoded clips, grouped by kind."""
+
+    def __init__(self, openai_client, filler_phrases=None, ack_phrases=None, error_text=ERROR_REPLY):
+        self.openai_client = openai_client
+        self.phrases = {
+            "filler": filler_phrases if filler_phrases is not None
+            else _parse_phrases(os.getenv("FILLER_PHRASES", DEFAULT_FILLER_PHRASES)),
+            "ack": ack_phrases if ack_phrases is not None
+            else _parse_phrases(os.getenv("ACK_PHRASES", DEFAULT_ACK_PHRASES)),
+            "error": [error_text] if error_text else [],
+        }
+        self.clips = {kind: [] for kind in self.phrases}
+        self._next = {kind: 0 for kind in self.phrases}
+
+    def prerender(self):
+        """Synthesize every configured phrase and keep the decoded PCM."""
+        total_bytes = 0
+        for kind, phrases in self.phrases.items():
+            for text in phrases:
+                try:
+                    pcm = self._render(text)
+                except Exception as e:
+                    logger.warning("Could not pre-render %s clip '%s': %s", kind, text, e)
+                    continue
+                self.clips[kind].append(pcm)
+                total_bytes += pcm.nbytes
+
+        count = sum(len(clips) for clips in self.clips.values())
+        logger.info("Pre-rendered %d clips (%.0f KiB of PCM)", count, total_bytes / 1024)
+
+    def _render(self, text):
+        """Synthesize one phrase as raw PCM and resample it for LiveKit."""
+        response = self.openai_client.audio.speech.create(
+            model="tts-1",
+            voice="alloy",
+            input=text,
+            response_format="pcm"
+        )
+        return StreamUpsampler(TTS_PCM_RATE, SAMPLE_RATE).feed(response.content)
+
+    def has(self, kind):
+        """Return True if at least one clip of `kind` is available."""
+        return bool(self.clips.get(kind))
+
+    def pick(self, kind):
+        """Return the next clip of `kind` in rotation, or None if there is none."""
+        clips = self.clips.get(kind)
+        if not clips:
+            return None
+        index = self._next[kind]
+        self._next[kind] = (index + 1) % len(clips)
+        return clips[index]
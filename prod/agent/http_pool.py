@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Shared HTTP connection pool for upstream (OpenAI) calls
+
+One httpx client per process carries every STT, LLM and TTS request. Its
+transport routes each request to a separate connection pool per stage, so
+long TTS downloads cannot use up the connections chat completions need. Each
+pool has its own limits, keep-alive expiry and optional HTTP/2
+multiplexing. prewarm() opens connections ahead of the first turn, so
+TCP and TLS setup happen before a user is waiting.
+
+Per stage, the metrics registry gets request, connection and TLS handshake
+counts, connection setup time, and the number of open and idle connections.
+
+Settings (HTTP_POOL_<STAGE>_<KEY> overrides HTTP_POOL_<KEY>, stage is
+STT, LLM, TTS or DEFAULT):
+    MAX_CONNECTIONS      connections per stage (default 10)
+    MAX_KEEPALIVE        idle connections kept open (default 10)
+    KEEPALIVE_EXPIRY_S   seconds an idle connection is kept (default 60)
+    HTTP2                multiplex over HTTP/2; needs the h2 package (default 0)
+    PREWARM              connections opened by prewarm() (default 1)
+"""
+
+import os
+import time
+import logging
+import threading
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+
+STAGES = ("stt", "llm", "tts", "default")
+
+# Request path suffixes and the stage whose pool serves them
+STAGE_PATHS = (
+    ("/audio/transcriptions", "stt"),
+    ("/chat/completions", "llm"),
+    ("/audio/speech", "tts"),
+)
+
+
+def _setting(stage, key, default):
+    return os.getenv(f"HTTP_POOL_{stage.upper()}_{key}", os.getenv(f"HTTP_POOL_{key}", default))
+
+
+def _flag(stage, key):
+    return str(_setting(stage, key, "0")).lower() in ("1", "true", "yes")
+
+
+class StagePool:
+    """Connection pool and metrics for one stage."""
+
+    def __init__(self, stage, registry=REGISTRY):
+        self.stage = stage
+        self.http2 = _flag(stage, "HTTP2")
+        if self.http2 and importlib.util.find_spec("h2") is None:
+            logger.warning("HTTP/2 requested for %s but the h2 package is not installed; using HTTP/1.1", stage)
+            self.http2 = False
+        self.prewarm_count = int(_setting(stage, "PREWARM", 1))
+
+        limits = httpx.Limits(
+            max_connections=int(_setting(stage, "MAX_CONNECTIONS", 10)),
+            max_keepalive_connections=int(_setting(stage, "MAX_KEEPALIVE", 10)),
+            keepalive_expiry=float(_setting(stage, "KEEPALIVE_EXPIRY_S", 60)),
+        )
+        self.transport = httpx.HTTPTransport(limits=limits, http2=self.http2)
+
+        prefix = f"http_pool_{stage}"
+        self.requests = registry.counter(f"{prefix}_requests_total", f"Upstream {stage} requests")
+        self.connects = registry.counter(f"{prefix}_connects_total", f"New TCP connections for {stage}")
+        self.handshakes = registry.counter(f"{prefix}_tls_handshakes_total", f"TLS handshakes for {stage}")
+        self.setup_ms = registry.summary(f"{prefix}_connect_ms", f"TCP plus TLS setup time for {stage}")
+        registry.gauge(f"{prefix}_connections", f"Open connections for {stage}",
+                       fn=lambda: len(self._connections()))
+        registry.gauge(f"{prefix}_idle_connections", f"Idle connections for {stage}",
+                       fn=lambda: sum(1 for c in self._connections() if c.is_idle()))
+
+    def _connections(self):
+        pool = getattr(self.transport, "_pool", None)
+        return list(getattr(pool, "connections", ()))
+
+    def tracer(self):
+        """Return an httpcore trace callback that counts connection setup."""
+        started = None
+
+        def trace(event, info):
+            nonlocal started
+            if event == "connection.connect_tcp.started":
+                started = time.perf_counter()
+                self.connects.inc()
+            elif event == "connection.start_tls.complete":
+                self.handshakes.inc()
+            elif event in ("http11.send_request_headers.started", "http2.send_request_headers.started"):
+                if started is not None:
+                    self.setup_ms.observe((time.perf_counter() - started) * 1000)
+                    started = None
+
+        return trace
+
+
+class StageRoutingTransport(httpx.BaseTransport):
+    """Sends each request through the pool of the stage it belongs to."""
+
+    def __init__(self, registry=REGISTRY):
+        self.pools = {stage: StagePool(stage, registry) for stage in STAGES}
+
+    def stage_for(self, request):
+        stage = request.extensions.get("stage")
+        if stage in self.pools:
+            return stage
+        path = request.url.path
+        for suffix, stage in STAGE_PATHS:
+            if path.endswith(suffix):
+                return stage
+        return "default"
+
+    def handle_request(self, request):
+        pool = self.pools[self.stage_for(request)]
+        pool.requests.inc()
+        request.extensions["trace"] = pool.tracer()
+        return pool.transport.handle_request(request)
+
+    def close(self):
+        for pool in self.pools.values():
+            pool.transport.close()
+
+
+class HTTPPool:
+    """The process-wide client and its per-stage pools."""
+
+    def __init__(self, base_url=OPENAI_BASE_URL, registry=REGISTRY):
+        self.base_url = base_url.rstrip("/")
+        self.transport = StageRoutingTransport(registry)
+        self.client = httpx.Client(transport=self.transport)
+
+    def openai_client(self, api_key):
+        """Build an OpenAI client that sends its requests through this pool."""
+        import openai
+
+        return openai.OpenAI(api_key=api_key, base_url=self.base_url, http_client=self.client)
+
+    def prewarm(self, api_key, stages=("stt", "llm", "tts")):
+        """
+        Open PREWARM connections per stage with a cheap authenticated request.
+
+        Blocking; failures are logged and otherwise ignored.
+        """
+        jobs = [stage for stage in stages for _ in range(self.transport.pools[stage].prewarm_count)]
+        if not jobs:
+            return
+
+        def open_one(stage):
+            # Concurrent requests each need their own connection
+            self.client.get(
+                f"{self.base_url}/models",
+                headers={"Authorization": f"Bearer {api_key}"},
+                extensions={"stage": stage},
+            )
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(jobs)) as executor:
+            futures = [executor.submit(open_one, stage) for stage in jobs]
+            errors = [f.exception() for f in futures if f.exception() is not None]
+        if errors:
+            logger.warning("Prewarming %d of %d upstream connections failed: %s", len(errors), len(jobs), errors[0])
+        logger.info("Prewarmed %d upstream connections in %.0fms",
+                    len(jobs) - len(errors), (time.perf_counter() - start) * 1000)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the process-wide HTTPPool, creating it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = HTTPPool()
+        return _pool
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Jitter buffer between streaming TTS and the agent's outgoing track
+
+The TTS download pushes decoded PCM in as chunks arrive; the playout loop
+reads fixed-size frames. Playout starts once a small target is buffered and
+pauses to refill to that target if the network falls behind, so short gaps
+in the download do not turn into choppy audio.
+"""
+
+import asyncio
+from collections import deque
+
+import numpy as np
+
+
+class JitterBuffer:
+    """Async FIFO of 16-bit PCM with a refill target."""
+
+    def __init__(self, target_samples):
+        self.target_samples = target_samples
+        self.underruns = 0
+        self.error = None
+        # Task filling the buffer, kept so it is not garbage collected
+        self.producer = None
+        self._chunks = deque()
+        self._offset = 0
+        self._available = 0
+        self._closed = False
+        self._started = False
+        self._changed = asyncio.Event()
+
+    @property
+    def exhausted(self):
+        """True once the producer is done and every sample has been read."""
+        return self._closed and self._available == 0
+
+    def push(self, pcm):
+        """Append samples. Must be called on the event loop thread."""
+        if len(pcm):
+            self._chunks.append(pcm)
+            self._available += len(pcm)
+            self._changed.set()
+
+    def close(self, error=None):
+        """Mark the end of the stream. Must be called on the event loop thread."""
+        self._closed = True
+        self.error = error
+        self._changed.set()
+
+    async def wait_ready(self):
+        """Wait until the target is buffered or the stream has ended."""
+        while self._available < self.target_samples and not self._closed:
+            self._changed.clear()
+            await self._changed.wait()
+
+    async def read(self, num_samples):
+        """
+        Read exactly `num_samples`, refilling to the target on underrun.
+
+        Returns:
+            The samples, zero-padded at the end of the stream, or None once
+            the stream is exhausted
+        """
+        if self._available < num_samples and not self._closed:
+            if self._started:
+                self.underruns += 1
+            await self.wait_ready()
+        self._started = True
+
+        if self.exhausted:
+            return None
+
+        out = np.zeros(num_samples, dtype=np.int16)
+        filled = 0
+        while filled < num_samples and self._chunks:
+            chunk = self._chunks[0]
+            take = min(num_samples - filled, len(chunk) - self._offset)
+            out[filled:filled + take] = chunk[self._offset:self._offset + take]
+            filled += take
+            self._offset += take
+            if self._offset == len(chunk):
+                self._chunks.popleft()
+                self._offset = 0
+        self._available -= filled
+        return out
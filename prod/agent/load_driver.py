@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Load test the Voice Agent with simulated participants.
+
+Runs VoiceAgent in-process against fake_room (in place of livekit.rtc) and
+LocalOpenAI (in place of the OpenAI API, with fixed per-stage latencies).
+For each participant count, N participants stream audio at real-time pace
+for --duration seconds, each to its own agent and room, as N sessions served
+by one process would. Reported per step:
+
+    turns        utterances handed to the pipeline
+    first audio  time from handing off an utterance to its first output
+                 frame, a filler clip included
+    first reply  time to the first frame of the reply itself
+    dropped      incoming frames dropped because the agent fell behind
+    cpu          process CPU time per participant, as % of one core
+    loop p99     99th percentile event loop lag
+
+The audio is a synthetic talk/pause pattern, a WAV file or the first stream
+of a session recording (--audio).
+"""
+
+import time
+import wave
+import asyncio
+import argparse
+import logging
+
+import numpy as np
+
+import main
+import fake_room
+from audio_utils import SAMPLE_RATE, NUM_CHANNELS, SAMPLES_PER_FRAME, FRAME_MS, resample
+from filler_clips import FillerBank
+from local_upstream import LocalOpenAI
+from loop_monitor import LoopMonitor
+from metrics import Registry
+from session_recorder import FRAME, read_session
+
+logger = logging.getLogger(__name__)
+
+
+class LoadTestAgent(main.VoiceAgent):
+    """VoiceAgent that records when each turn starts and first plays audio."""
+
+    def __init__(self, openai_client, filler_bank=None):
+        super().__init__("", "", "", "load-test", "load-test-agent", openai_client=openai_client)
+        if filler_bank is not None:
+            self.filler_bank = filler_bank
+        self.turns = []
+
+    async def _ensure_output_track(self):
+        await super()._ensure_output_track()
+        self.audio_source.on_frame = self._on_output_frame
+
+    async def _handle_speech(self, utterance, participant):
+        turn = {"start": time.perf_counter(), "first_audio": None, "first_reply": None, "replying": False}
+        self.turns.append(turn)
+        await super()._handle_speech(utterance, participant)
+        turn["end"] = time.perf_counter()
+
+    async def _publish_audio_response(self, reply, lead_in=None):
+        # Any filler has stopped by now; the frames that follow are the reply
+        if self.turns:
+            self.turns[-1]["replying"] = True
+        await super()._publish_audio_response(reply, lead_in)
+
+    def _on_output_frame(self, frame):
+        turn = self.turns[-1] if self.turns else None
+        if turn is None or "end" in turn:
+            return
+        now = time.perf_counter()
+        if turn["first_audio"] is None:
+            turn["first_audio"] = now
+        if turn["replying"] and turn["first_reply"] is None:
+            turn["first_reply"] = now
+
+
+def synthetic_audio(talk_s=1.5, pause_s=1.5, seed=0):
+    """A tone burst followed by background noise, as 48kHz int16."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(talk_s * SAMPLE_RATE)) / SAMPLE_RATE
+    talk = np.sin(2 * np.pi * 220 * t) * 4000 + rng.normal(0, 30, len(t))
+    pause = rng.normal(0, 30, int(pause_s * SAMPLE_RATE))
+    return np.concatenate([talk, pause]).astype(np.int16)
+
+
+def load_audio(path):
+    """Read 16-bit mono audio from a WAV file or a session recording at 48kHz."""
+    if path.endswith(".vrec"):
+        _, records = read_session(path)
+        first = next(identity for kind, identity, _, _ in records if kind == FRAME)
+        frames = [payload for kind, identity, _, payload in records if kind == FRAME and identity == first]
+        return np.frombuffer(b"".join(frames), dtype=np.int16)
+
+    with wave.open(path, "rb") as f:
+        if f.getsampwidth() != 2:
+            raise ValueError(f"{path}: only 16-bit WAV files are supported")
+        pcm = np.frombuffer(f.readframes(f.getnframes()), dtype=np.int16)
+        if f.getnchannels() > 1:
+            pcm = pcm.reshape(-1, f.getnchannels()).mean(axis=1).astype(np.int16)
+        return resample(pcm, f.getframerate(), SAMPLE_RATE)
+
+
+def make_frames(pcm):
+    usable = len(pcm) - len(pcm) % SAMPLES_PER_FRAME
+    return [
+        fake_room.AudioFrame(pcm[i:i + SAMPLES_PER_FRAME].tobytes(), SAMPLE_RATE, NUM_CHANNELS, SAMPLES_PER_FRAME)
+        for i in range(0, usable, SAMPLES_PER_FRAME)
+    ]
+
+
+async def stream_participant(participant, frames, offset, duration, start):
+    """Push frames at real-time pace, starting `offset` frames into the audio."""
+    loop = asyncio.get_running_loop()
+    for i in range(int(duration * 1000 / FRAME_MS)):
+        delay = start + i * FRAME_MS / 1000 - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        await participant.track.push(frames[(offset + i) % len(frames)])
+    await participant.track.end()
+
+
+def _latency_percentiles(turns, field):
+    values = [(t[field] - t["start"]) * 1000 for t in turns if t[field] is not None]
+    if not values:
+        return float("nan"), float("nan")
+    return tuple(np.percentile(values, [50, 95]))
+
+
+async def run_step(count, frames, duration, latency_ms):
+    # One agent per participant: an agent answers one speaker at a time.
+    # The filler clips are rendered once and shared.
+    client = LocalOpenAI(latency_ms=latency_ms)
+    filler_bank = FillerBank(client)
+    await asyncio.to_thread(filler_bank.prerender)
+    agents = [LoadTestAgent(client, filler_bank) for _ in range(count)]
+
+    registry = Registry()
+    monitor = LoopMonitor(registry=registry)
+    monitor.start()
+
+    # Stagger participants so they are not all speaking in lockstep
+    participants = [agent.room.add_participant(f"user-{i}") for i, agent in enumerate(agents)]
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    await asyncio.gather(*(
+        stream_participant(p, frames, i * len(frames) // count, duration, start)
+        for i, p in enumerate(participants)
+    ))
+    while any(agent.is_processing for agent in agents):
+        await asyncio.sleep(0.01)
+    cpu_s = time.process_time() - cpu_start
+    wall_s = time.perf_counter() - wall_start
+    await monitor.stop()
+
+    turns = [turn for agent in agents for turn in agent.turns]
+    first_audio = _latency_percentiles(turns, "first_audio")
+    first_reply = _latency_percentiles(turns, "first_reply")
+    pushed = sum(p.track.frames_pushed for p in participants)
+    dropped = sum(p.track.frames_dropped for p in participants)
+    lag = monitor.lag.percentiles()
+    return {
+        "participants": count,
+        "turns": len(turns),
+        "first_audio_p50": first_audio[0],
+        "first_audio_p95": first_audio[1],
+        "first_reply_p50": first_reply[0],
+        "first_reply_p95": first_reply[1],
+        "dropped": dropped,
+        "dropped_pct": 100 * dropped / pushed if pushed else 0.0,
+        "cpu_pct": 100 * cpu_s / wall_s / count,
+        "loop_p99": lag.get(0.99, float("nan")),
+    }
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Load test VoiceAgent with simulated participants")
+    parser.add_argument("--participants", type=int, nargs="+", default=[1, 2, 4, 8, 16],
+                        help="Participant counts to run, one step each")
+    parser.add_argument("--duration", type=float, default=20,
+                        help="Seconds each participant streams per step")
+    parser.add_argument("--audio", help="WAV file or session recording to stream")
+    parser.add_argument("--stt-ms", type=float, default=400, help="Simulated STT latency")
+    parser.add_argument("--llm-ms", type=float, default=600, help="Simulated LLM latency")
+    parser.add_argument("--tts-ms", type=float, default=900, help="Simulated TTS latency")
+    parser.add_argument("--log-level", default="WARNING", help="Log level for the agent")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(args.log_level.upper())
+
+    # Swap the LiveKit SDK for the in-process room
+    main.rtc = fake_room
+
+    frames = make_frames(load_audio(args.audio) if args.audio else synthetic_audio())
+    latency_ms = {"stt": args.stt_ms, "llm": args.llm_ms, "tts": args.tts_ms}
+
+    print(f"{'N':>4} {'turns':>6} {'first p50':>10} {'first p95':>10} {'reply p50':>10} {'reply p95':>10} "
+          f"{'dropped':>12} {'cpu/part':>9} {'loop p99':>9}")
+    for count in args.participants:
+        r = asyncio.run(run_step(count, frames, args.duration, latency_ms))
+        print(f"{r['participants']:>4} {r['turns']:>6} {r['first_audio_p50']:>8.0f}ms {r['first_audio_p95']:>8.0f}ms "
+              f"{r['first_reply_p50']:>8.0f}ms {r['first_reply_p95']:>8.0f}ms "
+              f"{r['dropped']:>6} ({r['dropped_pct']:>3.0f}%) {r['cpu_pct']:>8.1f}% {r['loop_p99']:>7.1f}ms")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the OpenAI client used by the Voice Agent
+
+LocalOpenAI answers the transcription, chat and speech calls VoiceAgent
+makes without touching the network. Each call sleeps for a latency and
+returns a canned result. Given the calls from a session recording, it
+replays their recorded latencies and results in order, so a session can be
+run offline with its original upstream timing.
+"""
+
+import time
+from collections import deque
+from types import SimpleNamespace
+
+import numpy as np
+
+from audio_utils import TTS_PCM_RATE
+
+# Used once the recorded calls for a stage run out, or without a recording
+DEFAULT_TRANSCRIPT = "This is a simulated user message."
+DEFAULT_REPLY = "This is a simulated response from the virtual assistant."
+DEFAULT_LATENCY_MS = {"stt": 400, "llm": 600, "tts": 900}
+DEFAULT_TTS_FIRST_CHUNK_MS = 250
+
+# Roughly how much 24kHz PCM one character of text turns into
+TTS_BYTES_PER_CHAR = TTS_PCM_RATE * 2 // 15
+
+# Streamed speech is a quiet 200Hz tone, one second long so it loops cleanly
+_TONE = (1000 * np.sin(2 * np.pi * 200 * np.arange(TTS_PCM_RATE) / TTS_PCM_RATE)).astype(np.int16).tobytes()
+
+
+class LocalOpenAI:
+    """Serves audio.transcriptions, chat.completions and audio.speech locally."""
+
+    def __init__(self, calls=None, speed=1.0, latency_ms=None, tts_ms_per_char=0):
+        """
+        Args:
+            calls: Recorded call dicts (stage, latency_ms, result or error)
+            speed: Divides every latency; 2.0 replays twice as fast
+            latency_ms: Per-stage latency when no recorded call is left
+            tts_ms_per_char: Added to the default TTS latency per character
+                of input, for synthesis time that grows with the text
+        """
+        self.speed = speed
+        self.latency_ms = {**DEFAULT_LATENCY_MS, **(latency_ms or {})}
+        self.tts_ms_per_char = tts_ms_per_char
+        self._calls = {"stt": deque(), "llm": deque(), "tts": deque()}
+        for call in calls or ():
+            if call.get("stage") in self._calls:
+                self._calls[call["stage"]].append(call)
+        self.served = {"recorded": 0, "default": 0}
+
+        self.audio = SimpleNamespace(
+            transcriptions=SimpleNamespace(create=self._transcribe),
+            speech=SimpleNamespace(
+                create=self._speech,
+                with_streaming_response=SimpleNamespace(create=self._speech_stream),
+            ),
+        )
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._complete))
+
+    def _next(self, stage):
+        """Return the next recorded call for `stage`, or a default one."""
+        if self._calls[stage]:
+            self.served["recorded"] += 1
+            return self._calls[stage].popleft()
+        self.served["default"] += 1
+        return {"stage": stage, "latency_ms": self.latency_ms[stage]}
+
+    def _sleep(self, ms):
+        if ms:
+            time.sleep(ms / 1000 / self.speed)
+
+    def _transcribe(self, model, file, **kwargs):
+        call = self._next("stt")
+        self._sleep(call["latency_ms"])
+        if "error" in call:
+            raise RuntimeError(call["error"])
+        return SimpleNamespace(text=call.get("result", DEFAULT_TRANSCRIPT))
+
+    def _complete(self, model, messages, **kwargs):
+        call = self._next("llm")
+        self._sleep(call["latency_ms"])
+        if "error" in call:
+            raise RuntimeError(call["error"])
+        message = SimpleNamespace(content=call.get("result", DEFAULT_REPLY))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+    def _speech(self, model, voice, input, response_format="mp3", **kwargs):
+        """Unrecorded, immediate synthesis; used to pre-render clips."""
+        return SimpleNamespace(content=bytes(len(input) * TTS_BYTES_PER_CHAR))
+
+    def _speech_stream(self, model, voice, input, response_format="pcm", **kwargs):
+        call = self._next("tts")
+        if "bytes" not in call:
+            call = {**call, "bytes": len(input) * TTS_BYTES_PER_CHAR,
+                    "latency_ms": call["latency_ms"] + self.tts_ms_per_char * len(input)}
+        return _StreamingSpeech(call, self._sleep)
+
+
+class _StreamingSpeech:
+    """Context manager that paces tone PCM chunks like a TTS download."""
+
+    def __init__(self, call, sleep):
+        self._call = call
+        self._sleep = sleep
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def iter_bytes(self, chunk_size=4096):
+        call = self._call
+        total = call["latency_ms"]
+        first = call.get("first_chunk_ms")
+        if first is None:
+            first = min(DEFAULT_TTS_FIRST_CHUNK_MS, total)
+        remaining = call["bytes"]
+
+        self._sleep(first)
+        chunks = max(1, -(-remaining // chunk_size))
+        gap_ms = max(0.0, total - first) / chunks
+        offset = 0
+        while remaining > 0:
+            n = min(chunk_size, remaining)
+            yield (_TONE + _TONE)[offset:offset + n] if offset + n > len(_TONE) else _TONE[offset:offset + n]
+            offset = (offset + n) % len(_TONE)
+            remaining -= n
+            if remaining:
+                self._sleep(gap_ms)
+
+        if "error" in call:
+            raise RuntimeError(call["error"])
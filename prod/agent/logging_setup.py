@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Queue-based logging for the Voice Agent and the API server
+
+configure_logging() puts a single handler on the root logger that only
+appends the record to a bounded queue; no formatting or I/O happens on the
+calling thread. A background listener formats records as one JSON object
+per line (or as plain text with LOG_FORMAT=text) and writes them to stderr.
+Fields passed with `extra=` become keys of the JSON object.
+
+When the queue is full the record is dropped and counted in
+log_records_dropped_total; the listener reports how many were lost once it
+catches up. Loggers below LOG_LEVEL are filtered by the logging module's
+cached level check before a record is even created, so debug calls with
+%-style arguments cost almost nothing on hot paths.
+
+The listener thread is restarted in forked children (serve.py forks its
+workers after building the app).
+"""
+
+import os
+import sys
+import json
+import queue
+import atexit
+import logging
+import logging.handlers
+
+from metrics import REGISTRY
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Attributes every LogRecord has; anything else was passed with `extra`
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, including any `extra` fields."""
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Hands records to the listener as-is, dropping them when the queue is full."""
+
+    def __init__(self, log_queue, registry=REGISTRY):
+        super().__init__(log_queue)
+        self.dropped = registry.counter("log_records_dropped_total", "Log records dropped because the queue was full")
+        self.reported = 0
+        registry.gauge("log_queue_depth", "Log records waiting to be written", fn=log_queue.qsize)
+
+    def prepare(self, record):
+        # Formatting is left to the listener thread
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped.inc()
+
+
+class _ReportingHandler(logging.Handler):
+    """Listener-side handler that writes records and reports earlier drops."""
+
+    def __init__(self, target, queue_handler):
+        super().__init__()
+        self.target = target
+        self.queue_handler = queue_handler
+
+    def handle(self, record):
+        dropped = self.queue_handler.dropped.value - self.queue_handler.reported
+        if dropped:
+            self.queue_handler.reported += dropped
+            self.target.handle(logging.makeLogRecord({
+                "name": __name__, "levelno": logging.WARNING, "levelname": "WARNING",
+                "msg": "Dropped %d log records while the queue was full", "args": (dropped,),
+            }))
+        self.target.handle(record)
+
+
+_listener = None
+
+
+def configure_logging(level=None, fmt=None, queue_size=None):
+    """
+    Route all logging through the queue. Safe to call more than once.
+
+    Defaults come from LOG_LEVEL (INFO), LOG_FORMAT (json or text) and
+    LOG_QUEUE_SIZE (10000), read here so a .env file loaded first applies.
+    """
+    global _listener
+    if _listener is not None:
+        return
+    level = (level or os.getenv("LOG_LEVEL", "INFO")).upper()
+    fmt = fmt or os.getenv("LOG_FORMAT", "json")
+    queue_size = queue_size or int(os.getenv("LOG_QUEUE_SIZE", 10000))
+
+    stream = logging.StreamHandler(sys.stderr)
+    stream.setFormatter(JsonFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT))
+
+    log_queue = queue.Queue(maxsize=queue_size)
+    queue_handler = DroppingQueueHandler(log_queue)
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, _ReportingHandler(stream, queue_handler))
+    _listener.start()
+    atexit.register(_stop_listener)
+    os.register_at_fork(after_in_child=_restart_listener)
+
+
+def _stop_listener():
+    """Write out everything still queued."""
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
+
+
+def _restart_listener():
+    # Threads do not survive fork; the child needs its own listener
+    if _listener is not None:
+        _listener._thread = None
+        _listener.start()
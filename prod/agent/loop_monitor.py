@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Event loop lag monitor and blocking-call detector
+
+A ticker task sleeps for LOOP_MONITOR_INTERVAL_MS and records how late it
+wakes up as event_loop_lag_ms. A watchdog thread checks that the ticker
+keeps running; when the loop has not come back for LOOP_BLOCK_THRESHOLD_MS
+it logs the loop thread's current stack, which points at the blocking call.
+Stack logs are limited to one per LOOP_BLOCK_LOG_INTERVAL_S; the number of
+stalls skipped in between is reported with the next one.
+
+Enabled unless LOOP_MONITOR is set to 0.
+"""
+
+import os
+import sys
+import time
+import asyncio
+import logging
+import threading
+import traceback
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+LOOP_MONITOR = os.getenv("LOOP_MONITOR", "1").lower() not in ("0", "false", "no")
+LOOP_MONITOR_INTERVAL_MS = float(os.getenv("LOOP_MONITOR_INTERVAL_MS", 50))
+LOOP_BLOCK_THRESHOLD_MS = float(os.getenv("LOOP_BLOCK_THRESHOLD_MS", 100))
+LOOP_BLOCK_LOG_INTERVAL_S = float(os.getenv("LOOP_BLOCK_LOG_INTERVAL_S", 10))
+
+
+class LoopMonitor:
+    """Measures lag on the running event loop and reports blocking calls."""
+
+    def __init__(self, interval_ms=LOOP_MONITOR_INTERVAL_MS, threshold_ms=LOOP_BLOCK_THRESHOLD_MS,
+                 log_interval=LOOP_BLOCK_LOG_INTERVAL_S, registry=REGISTRY):
+        self.interval = interval_ms / 1000
+        self.threshold = threshold_ms / 1000
+        self.log_interval = log_interval
+        self.lag = registry.summary("event_loop_lag_ms", "How late the event loop ran a timer")
+        self.blocked = registry.counter("event_loop_blocked_total",
+                                        f"Times the event loop was blocked for over {threshold_ms:.0f}ms")
+        self._heartbeat = 0.0
+        self._thread_id = None
+        self._task = None
+        self._watchdog = None
+        self._stop_event = threading.Event()
+
+    def start(self):
+        """Start monitoring the running loop. Call from the loop thread."""
+        if self._task is not None:
+            return
+        self._thread_id = threading.get_ident()
+        self._heartbeat = time.perf_counter()
+        self._stop_event.clear()
+        self._task = asyncio.get_running_loop().create_task(self._tick())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self):
+        """Stop the ticker and the watchdog."""
+        if self._task is None:
+            return
+        self._stop_event.set()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        await asyncio.to_thread(self._watchdog.join)
+        self._task = None
+
+    async def _tick(self):
+        while True:
+            start = time.perf_counter()
+            self._heartbeat = start
+            await asyncio.sleep(self.interval)
+            lag = time.perf_counter() - start - self.interval
+            self.lag.observe(max(0.0, lag) * 1000)
+
+    def _watch(self):
+        """Watchdog thread: report the loop's stack when the ticker stalls."""
+        reported = None
+        last_log = 0.0
+        suppressed = 0
+        while not self._stop_event.wait(self.threshold / 2):
+            heartbeat = self._heartbeat
+            stalled = time.perf_counter() - heartbeat - self.interval
+            if stalled < self.threshold or heartbeat == reported:
+                continue
+
+            # One report per stall, however long it lasts
+            reported = heartbeat
+            self.blocked.inc()
+            now = time.monotonic()
+            if now - last_log < self.log_interval:
+                suppressed += 1
+                continue
+
+            frame = sys._current_frames().get(self._thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else "  <no stack>\n"
+            note = f" ({suppressed} more since the last report)" if suppressed else ""
+            logger.warning("Event loop blocked for over %.0fms%s; loop thread at:\n%s", stalled * 1000, note, stack)
+            last_log = now
+            suppressed = 0
+
+
+def start_loop_monitor():
+    """Start a LoopMonitor on the running loop if enabled; returns it or None."""
+    if not LOOP_MONITOR:
+        return None
+    monitor = LoopMonitor()
+    monitor.start()
+    return monitor
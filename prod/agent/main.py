@@ -11,20 +11,37 @@ import sys
 import asyncio
 import logging
 import argparse
+from collections import deque
 from dotenv import load_dotenv
 import numpy as np
-import openai
 from livekit import rtc, api
-from pydub import AudioSegment
-import io
+import time
+
+from audio_utils import (
+    SAMPLE_RATE, NUM_CHANNELS, FRAME_MS, SAMPLES_PER_FRAME, STT_SAMPLE_RATE, TTS_PCM_RATE,
+    crossfade, iter_frames, StreamUpsampler
+)
+from audio_pool import configure_io_threads, get_audio_pool, preprocess
+from pcm_buffer import PCMBuffer
+from jitter_buffer import JitterBuffer
+from filler_clips import FillerBank, ERROR_REPLY
+from session_recorder import SessionRecorder
+from loop_monitor import start_loop_monitor
+from metrics import REGISTRY
+from http_pool import get_pool
+from endpointing import Endpointer, SPEECH_START, SPEECH_END, SPEECH_CANCEL
+from conversation_log import ConversationLog
+from logging_setup import configure_logging
+from sentence_tts import split_sentences, stream_in_order, open_speech, SeamJoiner
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 # Load environment variables
 load_dotenv()
 
+# Configure logging
+configure_logging()
+
 # Default configuration
 DEFAULT_LIVEKIT_URL = os.getenv("LIVEKIT_URL", "ws://localhost:7880")
 DEFAULT_API_KEY = os.getenv("LIVEKIT_API_KEY", "devkey")
@@ -32,17 +49,42 @@ DEFAULT_API_SECRET = os.getenv("LIVEKIT_API_SECRET", "secret")
 DEFAULT_ROOM_NAME = os.getenv("LIVEKIT_ROOM", "agent-room")
 DEFAULT_IDENTITY = os.getenv("LIVEKIT_IDENTITY", "agent")
 
+# Filler playback: play a pre-rendered clip once a turn runs past the threshold
+FILLER_THRESHOLD = float(os.getenv("FILLER_THRESHOLD_MS", 1200)) / 1000
+CROSSFADE_SAMPLES = int(os.getenv("FILLER_CROSSFADE_MS", 120)) * SAMPLE_RATE // 1000
+OUTPUT_QUEUE_MS = int(os.getenv("OUTPUT_QUEUE_MS", 200))
+
+# Streaming TTS: audio buffered before playout starts, and after an underrun
+TTS_JITTER_SAMPLES = int(os.getenv("TTS_JITTER_MS", 150)) * SAMPLE_RATE // 1000
+
+# Audio kept from before a detected speech onset, so first words are not clipped
+PREROLL_FRAMES = int(os.getenv("ENDPOINT_PREROLL_MS", 200)) // FRAME_MS
+
+# Opt-in session recording for offline replay (see replay_session.py)
+SESSION_RECORD_DIR = os.getenv("SESSION_RECORD_DIR")
+
+# SQLite database for transcripts and replies; empty to disable
+CONVERSATION_DB = os.getenv("CONVERSATION_DB", "conversations.db")
+
+# How often the agent logs its metrics (event loop lag and blocking)
+METRICS_LOG_INTERVAL = float(os.getenv("METRICS_LOG_INTERVAL_S", 60))
+
 class VoiceAgent:
-    def __init__(self, livekit_url, api_key, api_secret, room_name, identity):
+    def __init__(self, livekit_url, api_key, api_secret, room_name, identity,
+                 recorder=None, openai_client=None, conversation_log=None):
         self.livekit_url = livekit_url
         self.api_key = api_key
         self.api_secret = api_secret
         self.room_name = room_name
         self.identity = identity
         self.room = rtc.Room()
-        self.audio_buffer = []
         self.is_processing = False
-        self.openai_client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.openai_client = openai_client or get_pool().openai_client(os.getenv("OPENAI_API_KEY"))
+        self.filler_bank = FillerBank(self.openai_client)
+        self.audio_source = None
+        self.recorder = recorder
+        self.conversation_log = conversation_log
+        self._audio_tasks = set()
         
         # Set up event handlers
         self._setup_event_handlers()
@@ -52,103 +94,211 @@ class VoiceAgent:
         
         @self.room.on("participant_connected")
         def on_participant_connected(participant):
-            logger.info(f"Participant connected: {participant.identity}")
+            logger.info("Participant connected: %s", participant.identity)
         
         @self.room.on("participant_disconnected")
         def on_participant_disconnected(participant):
-            logger.info(f"Participant disconnected: {participant.identity}")
+            logger.info("Participant disconnected: %s", participant.identity)
         
         @self.room.on("track_subscribed")
         def on_track_subscribed(track, publication, participant):
-            logger.info(f"Track subscribed: {track.kind} from {participant.identity}")
+            logger.info("Track subscribed: %s from %s", track.kind, participant.identity)
             if track.kind == rtc.TrackKind.KIND_AUDIO:
                 audio_stream = rtc.AudioStream(track)
-                asyncio.ensure_future(self._process_audio(audio_stream, participant))
+                task = asyncio.ensure_future(self._process_audio(audio_stream, participant))
+                self._audio_tasks.add(task)
+                task.add_done_callback(self._audio_tasks.discard)
     
     async def _process_audio(self, audio_stream, participant):
-        """Process incoming audio from a participant."""
+        """
+        Process incoming audio from a participant.
+        
+        Each participant gets an Endpointer that decides where utterances
+        start and end. A finished utterance is handed to _handle_speech as
+        soon as the agent is free; speech that starts while it is still
+        waiting is added to it.
+        """
+        endpointer = Endpointer()
+        preroll = deque(maxlen=PREROLL_FRAMES)
+        utterance = None
+        pending = None
+        
         async for frame in audio_stream:
-            # Add audio frame to buffer
-            self.audio_buffer.append(frame.data)
+            if self.recorder is not None:
+                self.recorder.frame(participant.identity, frame.data)
+            
+            event = endpointer.feed(frame.data)
+            if event == SPEECH_START:
+                if pending is not None:
+                    utterance, pending = pending, None
+                else:
+                    utterance = PCMBuffer(STT_SAMPLE_RATE, input_rate=SAMPLE_RATE)
+                for earlier in preroll:
+                    utterance.append(earlier)
+                preroll.clear()
+            
+            if utterance is not None:
+                # Downsample the frame straight into the utterance buffer
+                utterance.append(frame.data)
+            else:
+                preroll.append(frame.data)
+            
+            if event == SPEECH_END:
+                pending, utterance = utterance, None
+            elif event == SPEECH_CANCEL:
+                utterance = None
             
-            # Process audio if we have enough data and not already processing
-            if len(self.audio_buffer) >= 50 and not self.is_processing:  # ~1 second of audio
+            if pending is not None and not self.is_processing:
                 self.is_processing = True
-                audio_data = self._combine_audio_frames(self.audio_buffer)
-                self.audio_buffer = []
                 
                 # Process in a separate task to not block audio reception
-                asyncio.create_task(self._handle_speech(audio_data, participant))
+                asyncio.create_task(self._handle_speech(pending, participant))
+                pending = None
     
-    def _combine_audio_frames(self, frames):
-        """Combine multiple audio frames into a single numpy array."""
-        return np.concatenate(frames)
-    
-    async def _handle_speech(self, audio_data, participant):
+    async def _handle_speech(self, utterance, participant):
         """Process speech and generate a response."""
         try:
-            # Convert numpy array to wav file in memory
-            audio_segment = self._numpy_to_audio_segment(audio_data)
+            turn = {"stage": "stt"}
+            pipeline = asyncio.create_task(self._run_turn(utterance, participant, turn))
             
-            # Save audio to a temporary file-like object
-            audio_file = io.BytesIO()
-            audio_segment.export(audio_file, format="wav")
-            audio_file.seek(0)
+            # Cover long turns with a pre-rendered clip instead of silence
+            done, _ = await asyncio.wait({pipeline}, timeout=FILLER_THRESHOLD)
+            filler_clip = None
+            filler_task = None
+            stop_filler = asyncio.Event()
+            if not done:
+                # Acknowledge once we have heard the user, otherwise just hold
+                filler_clip = self.filler_bank.pick("filler" if turn["stage"] == "stt" else "ack")
+                if filler_clip is not None:
+                    logger.info("Turn running long during %s, playing filler", turn['stage'])
+                    filler_task = asyncio.create_task(self._play_pcm(filler_clip, stop_filler))
             
-            # Use OpenAI Whisper for speech-to-text
-            transcript = await asyncio.to_thread(
-                self._transcribe_audio, 
-                audio_file
-            )
+            try:
+                reply = await pipeline
+            except Exception as e:
+                logger.error("Error processing speech: %s", e)
+                reply = self.filler_bank.pick("error")
             
-            if transcript:
-                logger.info(f"Transcribed from {participant.identity}: {transcript}")
-                
-                # Generate response using OpenAI
-                response_text = await asyncio.to_thread(
-                    self._generate_response,
-                    transcript
-                )
-                
-                logger.info(f"Response to {participant.identity}: {response_text}")
-                
-                # Convert text to speech
-                speech_audio = await asyncio.to_thread(
-                    self._text_to_speech,
-                    response_text
-                )
-                
-                # Publish the audio response
-                await self._publish_audio_response(speech_audio)
+            # Stop the filler and hand its unplayed remainder over for the cross-fade
+            lead_in = None
+            if filler_task is not None:
+                stop_filler.set()
+                played = await filler_task
+                lead_in = filler_clip[played:]
+            
+            if reply is not None or lead_in is not None:
+                await self._publish_audio_response(reply, lead_in)
         except Exception as e:
-            logger.error(f"Error processing speech: {e}")
+            logger.error("Error processing speech: %s", e)
         finally:
             self.is_processing = False
     
-    def _numpy_to_audio_segment(self, audio_data):
-        """Convert numpy array to AudioSegment."""
-        # Assuming 16-bit PCM audio at 48kHz (LiveKit default)
-        return AudioSegment(
-            audio_data.tobytes(),
-            frame_rate=48000,
-            sample_width=2,
-            channels=1
+    async def _run_turn(self, utterance, participant, turn):
+        """
+        Run STT, LLM and TTS for one utterance.
+        
+        Returns:
+            A JitterBuffer that the TTS download is still filling, a
+            pre-rendered clip as PCM, or None when there is nothing to say
+        """
+        # Trim silence and normalize level in a worker process; the result is
+        # copied back into the utterance buffer
+        speech = utterance.samples()
+        written, prep_stats = await get_audio_pool().run(preprocess, speech, STT_SAMPLE_RATE, out=speech)
+        speech = speech[:written // speech.itemsize]
+        if not len(speech):
+            logger.debug("No speech in %sms from %s", prep_stats['input_ms'], participant.identity)
+            return None
+        
+        # The WAV header is written in front of the samples; no re-encoding
+        utterance.truncate(len(speech))
+        audio_file = utterance.as_wav_file()
+        
+        # Use OpenAI Whisper for speech-to-text
+        stt_start = time.perf_counter()
+        transcript = await asyncio.to_thread(
+            self._transcribe_audio, 
+            audio_file
         )
+        stt_ms = (time.perf_counter() - stt_start) * 1000
+        
+        logger.info(
+            "STT for %s: %sms -> %sms of audio, %s bytes saved, gain %sdB, STT %.0fms",
+            participant.identity, prep_stats['input_ms'], prep_stats['output_ms'],
+            utterance.input_bytes - audio_file.getbuffer().nbytes, prep_stats['gain_db'], stt_ms
+        )
+        
+        if not transcript:
+            return None
+        
+        logger.info("Transcribed from %s: %s", participant.identity, transcript,
+                    extra={"participant": participant.identity})
+        turn["stage"] = "llm"
+        
+        # Generate response using OpenAI
+        llm_start = time.perf_counter()
+        response_text = await asyncio.to_thread(
+            self._generate_response,
+            transcript
+        )
+        llm_ms = (time.perf_counter() - llm_start) * 1000
+        
+        logger.info("Response to %s: %s", participant.identity, response_text,
+                    extra={"participant": participant.identity})
+        
+        # The fixed error reply is already rendered
+        if response_text == ERROR_REPLY and self.filler_bank.has("error"):
+            self._log_turn(participant, transcript, response_text, stt_ms, llm_ms)
+            return self.filler_bank.pick("error")
+        
+        turn["stage"] = "tts"
+        
+        # Stream text to speech; the reply is ready as soon as the first audio is
+        tts_start = time.perf_counter()
+        jitter = JitterBuffer(TTS_JITTER_SAMPLES)
+        jitter.producer = asyncio.create_task(asyncio.to_thread(
+            self._stream_text_to_speech,
+            response_text,
+            jitter,
+            asyncio.get_running_loop()
+        ))
+        await jitter.wait_ready()
+        tts_ms = (time.perf_counter() - tts_start) * 1000
+        
+        if jitter.exhausted:
+            self._log_turn(participant, transcript, response_text, stt_ms, llm_ms)
+            return self.filler_bank.pick("error")
+        logger.info("TTS first audio after %.0fms", tts_ms, extra={"tts_ms": round(tts_ms)})
+        self._log_turn(participant, transcript, response_text, stt_ms, llm_ms, tts_ms)
+        return jitter
+    
+    def _log_turn(self, participant, transcript, response_text, stt_ms, llm_ms, tts_ms=None):
+        """Queue the turn for the conversation log, if there is one."""
+        if self.conversation_log is not None:
+            self.conversation_log.log_turn(
+                self.room_name, transcript, response_text,
+                participant=participant.identity, source="agent",
+                stt_ms=stt_ms, llm_ms=llm_ms, tts_ms=tts_ms
+            )
     
     def _transcribe_audio(self, audio_file):
         """Transcribe audio using OpenAI Whisper."""
+        start = time.perf_counter()
         try:
             result = self.openai_client.audio.transcriptions.create(
                 model="whisper-1",
                 file=audio_file
             )
+            self._record_call("stt", start, result=result.text)
             return result.text
         except Exception as e:
-            logger.error(f"Transcription error: {e}")
+            logger.error("Transcription error: %s", e)
+            self._record_call("stt", start, error=e)
             return None
     
     def _generate_response(self, text):
         """Generate a response using OpenAI."""
+        start = time.perf_counter()
         try:
             response = self.openai_client.chat.completions.create(
                 model=os.getenv("MODEL_NAME", "gpt-4o-mini"),
@@ -158,61 +308,144 @@ class VoiceAgent:
                 ],
                 max_tokens=os.getenv("MAX_TOKENS", 150)
             )
-            return response.choices[0].message.content
+            content = response.choices[0].message.content
+            self._record_call("llm", start, result=content)
+            return content
         except Exception as e:
-            logger.error(f"Response generation error: {e}")
-            return "I'm sorry, I couldn't process that request."
+            logger.error("Response generation error: %s", e)
+            self._record_call("llm", start, error=e)
+            return ERROR_REPLY
     
-    def _text_to_speech(self, text):
-        """Convert text to speech using OpenAI TTS."""
+    def _stream_text_to_speech(self, text, jitter, loop):
+        """
+        Convert text to speech using OpenAI TTS, feeding audio as it downloads.
+        
+        Runs in a worker thread. The reply is synthesized sentence by
+        sentence, several at a time. Raw PCM chunks are joined in sentence
+        order, upsampled to SAMPLE_RATE and handed to the jitter buffer on
+        the event loop as they arrive.
+        """
+        upsampler = StreamUpsampler(TTS_PCM_RATE, SAMPLE_RATE)
+        joiner = SeamJoiner(SAMPLE_RATE)
+        current = None
+        error = None
         try:
-            response = self.openai_client.audio.speech.create(
-                model="tts-1",
-                voice="alloy",
-                input=text
-            )
-            
-            # Get the audio content as bytes
-            audio_data = io.BytesIO()
-            for chunk in response.iter_bytes(chunk_size=4096):
-                audio_data.write(chunk)
-            audio_data.seek(0)
-            
-            # Convert to the format needed for LiveKit
-            audio_segment = AudioSegment.from_file(audio_data, format="mp3")
-            return audio_segment
+            for index, chunk in stream_in_order(self._speech_stream, split_sentences(text or "")):
+                if index != current:
+                    current = index
+                    joiner.start_sentence()
+                samples = joiner.feed(upsampler.feed(chunk))
+                if len(samples):
+                    loop.call_soon_threadsafe(jitter.push, samples)
         except Exception as e:
-            logger.error(f"Text-to-speech error: {e}")
-            return None
+            logger.error("Text-to-speech error: %s", e)
+            error = e
+        finally:
+            loop.call_soon_threadsafe(jitter.close, error)
     
-    async def _publish_audio_response(self, audio_segment):
-        """Publish audio response to the room."""
-        if not audio_segment:
+    def _speech_stream(self, sentence):
+        """Yield the PCM for one sentence as it downloads, recording the call."""
+        start = time.perf_counter()
+        first_chunk_ms = None
+        received = 0
+        error = None
+        try:
+            for chunk in open_speech(self.openai_client, sentence):
+                if first_chunk_ms is None:
+                    first_chunk_ms = (time.perf_counter() - start) * 1000
+                received += len(chunk)
+                yield chunk
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self._record_call("tts", start, error=error, first_chunk_ms=first_chunk_ms, bytes=received)
+    
+    def _record_call(self, stage, start, result=None, error=None, **extra):
+        """Record an upstream call's latency and outcome, if recording."""
+        if self.recorder is not None:
+            latency_ms = (time.perf_counter() - start) * 1000
+            self.recorder.call(stage, latency_ms, result=result, error=error, **extra)
+    
+    async def _ensure_output_track(self):
+        """Create and publish the agent's outgoing audio track once."""
+        if self.audio_source is not None:
             return
         
-        try:
-            # Convert audio to the format needed by LiveKit
-            # This is a simplified version - actual implementation would need to match
-            # LiveKit's audio format requirements
-            audio_data = np.array(audio_segment.get_array_of_samples())
-            
-            # Create a local audio track
-            source = rtc.AudioSource()
-            track = source.create_track()
-            
-            # Publish the track
-            await self.room.local_participant.publish_track(track)
-            
-            # Send the audio data
-            source.capture_frame(audio_data)
+        self.audio_source = rtc.AudioSource(SAMPLE_RATE, NUM_CHANNELS, queue_size_ms=OUTPUT_QUEUE_MS)
+        track = rtc.LocalAudioTrack.create_audio_track("agent-voice", self.audio_source)
+        await self.room.local_participant.publish_track(track)
+    
+    async def _play_pcm(self, pcm, stop_event=None):
+        """
+        Push PCM to the outgoing track frame by frame.
+        
+        Args:
+            pcm: Mono 16-bit samples at SAMPLE_RATE
+            stop_event: Optional event that ends playback early
             
-            # Wait a bit for the audio to be sent
-            await asyncio.sleep(audio_segment.duration_seconds)
+        Returns:
+            Number of samples handed to the track
+        """
+        await self._ensure_output_track()
+        
+        played = 0
+        for samples in iter_frames(pcm):
+            if stop_event is not None and stop_event.is_set():
+                break
+            frame = rtc.AudioFrame(samples.tobytes(), SAMPLE_RATE, NUM_CHANNELS, SAMPLES_PER_FRAME)
+            await self.audio_source.capture_frame(frame)
+            played += SAMPLES_PER_FRAME
+        return min(played, len(pcm))
+    
+    async def _play_stream(self, jitter, lead_in=None):
+        """
+        Play a streaming reply frame by frame as it is downloaded.
+        
+        Args:
+            jitter: JitterBuffer filled by the TTS download
+            lead_in: Unplayed remainder of a filler clip to cross-fade from
+        """
+        # The cross-fade needs the head of the reply in one piece
+        if lead_in is not None and len(lead_in):
+            head_frames = -(-CROSSFADE_SAMPLES // SAMPLES_PER_FRAME)
+            head = await jitter.read(head_frames * SAMPLES_PER_FRAME)
+            if head is None:
+                head = np.zeros(0, dtype=np.int16)
+            await self._play_pcm(crossfade(lead_in, head, CROSSFADE_SAMPLES))
+        
+        while True:
+            samples = await jitter.read(SAMPLES_PER_FRAME)
+            if samples is None:
+                break
+            await self._play_pcm(samples)
+        
+        if jitter.underruns:
+            logger.info("TTS playback refilled the jitter buffer %s times", jitter.underruns)
+    
+    async def _publish_audio_response(self, reply, lead_in=None):
+        """
+        Publish audio response to the room.
+        
+        Args:
+            reply: A JitterBuffer for streamed speech, reply samples, or None
+                when there is nothing to say
+            lead_in: Unplayed remainder of a filler clip to cross-fade from
+        """
+        try:
+            if isinstance(reply, JitterBuffer):
+                await self._play_stream(reply, lead_in)
+                return
             
-            # Unpublish the track
-            await self.room.local_participant.unpublish_track(track)
+            pcm = reply
+            if pcm is None:
+                pcm = np.zeros(0, dtype=np.int16)
+            if lead_in is not None:
+                pcm = crossfade(lead_in, pcm, CROSSFADE_SAMPLES)
+            if len(pcm):
+                await self._play_pcm(pcm)
         except Exception as e:
-            logger.error(f"Error publishing audio: {e}")
+            logger.error("Error publishing audio: %s", e)
     
     async def connect(self):
         """Connect to the LiveKit room."""
@@ -227,16 +460,35 @@ class VoiceAgent:
                 )
             )
             
+            # Open upstream connections, render filler clips and start the
+            # audio worker processes before taking any turns
+            await asyncio.gather(
+                asyncio.to_thread(get_pool().prewarm, os.getenv("OPENAI_API_KEY")),
+                asyncio.to_thread(self.filler_bank.prerender),
+                asyncio.to_thread(get_audio_pool().start)
+            )
+            
+            # Watch for blocking calls on the event loop
+            start_loop_monitor()
+            
             # Connect to the room
             await self.room.connect(self.livekit_url, token.to_jwt())
-            logger.info(f"Connected to room: {self.room_name}")
+            logger.info("Connected to room: %s", self.room_name)
             
             # Stay connected indefinitely
             while True:
-                await asyncio.sleep(1)
+                await asyncio.sleep(METRICS_LOG_INTERVAL)
+                logger.info("Metrics: %s", REGISTRY.snapshot())
         except Exception as e:
-            logger.error(f"Connection error: {e}")
+            logger.error("Connection error: %s", e)
             raise
+    
+    async def close(self):
+        """Stop reading incoming audio; nothing is recorded after this returns."""
+        tasks = list(self._audio_tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
 
 async def main():
     parser = argparse.ArgumentParser(description="LiveKit Voice Agent")
@@ -250,8 +502,20 @@ async def main():
                         help="LiveKit room name")
     parser.add_argument("--identity", default=os.getenv("LIVEKIT_IDENTITY", DEFAULT_IDENTITY),
                         help="Agent identity")
+    parser.add_argument("--record-dir", default=SESSION_RECORD_DIR,
+                        help="Record sessions for offline replay into this directory")
     
     args = parser.parse_args()
+    configure_io_threads()
+    
+    recorder = None
+    if args.record_dir:
+        recorder = SessionRecorder.create(args.record_dir, args.room, SAMPLE_RATE)
+    
+    conversation_log = None
+    if CONVERSATION_DB:
+        conversation_log = ConversationLog(CONVERSATION_DB)
+        conversation_log.start()
     
     # Create and connect the agent
     agent = VoiceAgent(
@@ -259,10 +523,19 @@ async def main():
         args.api_key,
         args.api_secret,
         args.room,
-        args.identity
+        args.identity,
+        recorder=recorder,
+        conversation_log=conversation_log
     )
     
-    await agent.connect()
+    try:
+        await agent.connect()
+    finally:
+        await agent.close()
+        if recorder is not None:
+            recorder.close()
+        if conversation_log is not None:
+            conversation_log.close()
 
 if __name__ == "__main__":
     try:
@@ -270,5 +543,5 @@ if __name__ == "__main__":
     except KeyboardInterrupt:
         logger.info("Agent stopped by user")
     except Exception as e:
-        logger.error(f"Agent error: {e}")
+        logger.error("Agent error: %s", e)
         sys.exit(1)
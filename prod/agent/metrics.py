@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+In-process metrics for the Voice Agent
+
+A small registry of counters, gauges and summaries shared by the API server
+and the agent. Summaries keep a window of recent observations and report
+percentiles over it. The registry renders as Prometheus text for /metrics or
+as a plain dict for logs and benchmark output.
+
+Each process has its own registry; with pre-forked workers, every worker
+reports its own numbers.
+"""
+
+import threading
+from collections import deque
+
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+class Counter:
+    """Monotonically increasing value."""
+
+    kind = "counter"
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def snapshot(self):
+        return self.value
+
+
+class Gauge:
+    """Value that can go up and down, set directly or read from `fn`."""
+
+    kind = "gauge"
+
+    def __init__(self, name, help, fn=None):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self._value = 0
+
+    @property
+    def value(self):
+        return self.fn() if self.fn is not None else self._value
+
+    def set(self, value):
+        self._value = value
+
+    def snapshot(self):
+        return self.value
+
+
+class Summary:
+    """Count, sum and percentiles over the most recent `window` observations."""
+
+    kind = "summary"
+
+    def __init__(self, name, help, window=2048):
+        self.name = name
+        self.help = help
+        self.count = 0
+        self.sum = 0.0
+        self._values = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self.count += 1
+            self.sum += value
+            self._values.append(value)
+
+    def percentiles(self, quantiles=QUANTILES):
+        """Return {quantile: value} over the window, or {} with no data."""
+        with self._lock:
+            values = sorted(self._values)
+        if not values:
+            return {}
+        return {q: values[min(len(values) - 1, int(q * len(values)))] for q in quantiles}
+
+    def snapshot(self):
+        result = {"count": self.count, "sum": round(self.sum, 3)}
+        for q, value in self.percentiles().items():
+            result[f"p{int(q * 100)}"] = round(value, 3)
+        return result
+
+
+class Registry:
+    """Named metrics; asking for an existing name returns the same metric."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, help, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} is already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name, help=""):
+        return self._get(Counter, name, help)
+
+    def gauge(self, name, help="", fn=None):
+        return self._get(Gauge, name, help, fn=fn)
+
+    def summary(self, name, help="", window=2048):
+        return self._get(Summary, name, help, window=window)
+
+    def snapshot(self):
+        """Return {name: value or summary dict} for every metric."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: metric.snapshot() for metric in metrics}
+
+    def render_prometheus(self):
+        """Render every metric in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+
+        lines = []
+        for metric in metrics:
+            if metric.help:
+                lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            if isinstance(metric, Summary):
+                for q, value in metric.percentiles().items():
+                    lines.append(f'{metric.name}{{quantile="{q}"}} {value}')
+                lines.append(f"{metric.name}_sum {metric.sum}")
+                lines.append(f"{metric.name}_count {metric.count}")
+            else:
+                lines.append(f"{metric.name} {metric.value}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Growable PCM buffer with an in-place WAV header
+
+Incoming frames are written once into a buffer the agent owns, downsampled
+to the STT rate on the way in. Space for a 44-byte WAV header is reserved in
+front of the samples, so the finished utterance can be handed to the STT
+upload as a memoryview of that same buffer instead of being concatenated,
+converted to bytes and re-encoded.
+"""
+
+import io
+import struct
+
+import numpy as np
+
+from audio_utils import resample, resampled_length
+
+WAV_HEADER_SIZE = 44
+SAMPLE_WIDTH = 2
+
+
+class PCMBuffer:
+    """Mono 16-bit PCM for one utterance, stored after a reserved WAV header."""
+
+    def __init__(self, sample_rate, input_rate=None, capacity=None):
+        """
+        Args:
+            sample_rate: Sample rate of the audio stored in the buffer
+            input_rate: Sample rate of appended frames, if it differs
+            capacity: Initial capacity in samples (default 10 seconds)
+        """
+        self.sample_rate = sample_rate
+        self.input_rate = input_rate or sample_rate
+        self.frames = 0
+        self.input_bytes = 0
+        self.bytes_copied = 0
+        if capacity is None:
+            capacity = 10 * sample_rate
+        self._buf = bytearray(WAV_HEADER_SIZE + capacity * SAMPLE_WIDTH)
+        self._size = 0
+
+    def __len__(self):
+        """Number of samples in the buffer."""
+        return self._size // SAMPLE_WIDTH
+
+    def _ensure_capacity(self, nbytes):
+        """Grow the buffer geometrically so appends stay amortized O(1)."""
+        needed = WAV_HEADER_SIZE + nbytes
+        if needed <= len(self._buf):
+            return
+
+        # Views handed out earlier keep the old buffer alive, so allocate anew
+        new_buf = bytearray(max(needed, 2 * len(self._buf)))
+        new_buf[WAV_HEADER_SIZE:WAV_HEADER_SIZE + self._size] = \
+            memoryview(self._buf)[WAV_HEADER_SIZE:WAV_HEADER_SIZE + self._size]
+        self.bytes_copied += self._size
+        self._buf = new_buf
+
+    def append(self, data):
+        """
+        Add one frame of 16-bit samples (any buffer-protocol object).
+
+        Frames at the buffer's own rate are copied as-is; otherwise they are
+        resampled directly into the free space at the end of the buffer.
+        """
+        view = memoryview(data).cast("B")
+        self.input_bytes += view.nbytes
+        self.frames += 1
+
+        if self.input_rate == self.sample_rate:
+            start = WAV_HEADER_SIZE + self._size
+            self._ensure_capacity(self._size + view.nbytes)
+            self._buf[start:start + view.nbytes] = view
+            self._size += view.nbytes
+            self.bytes_copied += view.nbytes
+            return
+
+        samples = np.frombuffer(view, dtype=np.int16)
+        count = resampled_length(len(samples), self.input_rate, self.sample_rate)
+        offset = WAV_HEADER_SIZE + self._size
+        self._ensure_capacity(self._size + count * SAMPLE_WIDTH)
+        out = np.frombuffer(self._buf, dtype=np.int16, count=count, offset=offset)
+        resample(samples, self.input_rate, self.sample_rate, out=out)
+        self._size += count * SAMPLE_WIDTH
+        self.bytes_copied += count * SAMPLE_WIDTH
+
+    def samples(self):
+        """Return the samples as an int16 array that shares the buffer's memory."""
+        return np.frombuffer(self._buf, dtype=np.int16, count=len(self), offset=WAV_HEADER_SIZE)
+
+    def reserve(self, num_samples):
+        """
+        Resize the buffer to `num_samples` and return them as a writable array.
+
+        Used to let a processing step write its output straight into the
+        buffer. Existing contents up to `num_samples` are kept.
+        """
+        self._ensure_capacity(num_samples * SAMPLE_WIDTH)
+        self._size = num_samples * SAMPLE_WIDTH
+        return self.samples()
+
+    def truncate(self, num_samples):
+        """Drop everything after the first `num_samples` samples."""
+        self._size = min(self._size, num_samples * SAMPLE_WIDTH)
+
+    def wav_view(self):
+        """Write the WAV header in place and return a memoryview of the whole file."""
+        struct.pack_into(
+            "<4sI4s4sIHHIIHH4sI", self._buf, 0,
+            b"RIFF", 36 + self._size, b"WAVE",
+            b"fmt ", 16, 1, 1, self.sample_rate,
+            self.sample_rate * SAMPLE_WIDTH, SAMPLE_WIDTH, SAMPLE_WIDTH * 8,
+            b"data", self._size
+        )
+        return memoryview(self._buf)[:WAV_HEADER_SIZE + self._size]
+
+    def as_wav_file(self, name="speech.wav"):
+        """Return a read-only file object over the WAV view, for uploads."""
+        return MemoryViewReader(self.wav_view(), name)
+
+
+class MemoryViewReader(io.RawIOBase):
+    """Minimal file object over a memoryview; reads copy straight from it."""
+
+    def __init__(self, view, name):
+        self._view = view
+        self._pos = 0
+        self.name = name
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        n = min(len(buffer), len(self._view) - self._pos)
+        buffer[:n] = self._view[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def read(self, size=-1):
+        end = len(self._view) if size is None or size < 0 else min(len(self._view), self._pos + size)
+        data = self._view[self._pos:end].tobytes()
+        self._pos = end
+        return data
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        self._pos = max(0, min(offset, len(self._view)))
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+    def getbuffer(self):
+        """Return the underlying view, like io.BytesIO.getbuffer()."""
+        return self._view
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Per-request sampling profiler for the Voice Agent API server.
+
+Off by default. When enabled (PROFILE_ENABLED), a request is profiled if it
+carries the X-Profile header or is picked at PROFILE_SAMPLE_RATE. While it
+runs, a background thread samples the event loop thread's stack every
+PROFILE_INTERVAL_MS. Samples are aggregated into collapsed stacks and saved
+in PROFILE_DIR, which keeps the newest PROFILE_MAX_FILES profiles.
+
+Profiles are listed at /debug/profiles and downloaded from
+/debug/profiles/{id}, as folded stacks (flamegraph.pl, speedscope) or JSON.
+The sampler sees the whole loop thread, so requests that overlap a profiled
+one show up in its samples too.
+
+When profiling is disabled the middleware and the debug routes are not
+installed at all.
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import asyncio
+import logging
+import threading
+from collections import Counter
+from pathlib import Path
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "x-profile"
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", 5))
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", 50))
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")
+
+debug_router = APIRouter(prefix="/debug/profiles")
+
+
+class StackSampler(threading.Thread):
+    """Samples one thread's Python stack at a fixed interval until stopped."""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                break
+            self.stacks[_collapse(frame)] += 1
+            self.samples += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def _collapse(frame):
+    """Format a stack as "outer;...;inner" with one entry per function."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class ProfileStore:
+    """Directory of JSON profiles, trimmed to the newest `max_files`."""
+
+    def __init__(self, directory, max_files=PROFILE_MAX_FILES):
+        self.directory = Path(directory)
+        self.max_files = max_files
+
+    def save(self, profile):
+        """Write one profile and drop the oldest beyond the limit. Blocking."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f"{profile['id']}.json"
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "w") as f:
+            json.dump(profile, f)
+        os.replace(tmp, path)
+
+        files = sorted(self.directory.glob("*.json"))
+        for old in files[:max(0, len(files) - self.max_files)]:
+            old.unlink(missing_ok=True)
+
+    def list(self):
+        """Return profile metadata, newest first."""
+        profiles = []
+        for path in sorted(self.directory.glob("*.json"), reverse=True):
+            try:
+                with open(path) as f:
+                    profile = json.load(f)
+            except (OSError, ValueError):
+                continue
+            profile.pop("stacks", None)
+            profiles.append(profile)
+        return profiles
+
+    def load(self, profile_id):
+        """Return one profile, or None if it does not exist (or was rotated out)."""
+        if not profile_id.replace("-", "").isalnum():
+            return None
+        try:
+            with open(self.directory / f"{profile_id}.json") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+
+class ProfilerMiddleware:
+    """ASGI middleware that profiles selected HTTP requests."""
+
+    def __init__(self, app, store, sample_rate=PROFILE_SAMPLE_RATE, interval_ms=PROFILE_INTERVAL_MS,
+                 token=PROFILE_TOKEN):
+        self.app = app
+        self.store = store
+        self.sample_rate = sample_rate
+        self.interval = interval_ms / 1000
+        self.token = token
+
+    def _selected(self, scope):
+        if scope["type"] != "http" or scope["path"].startswith(debug_router.prefix):
+            return False
+        for name, value in scope["headers"]:
+            if name == PROFILE_HEADER.encode():
+                return self.token is None or value.decode() == self.token
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if not self._selected(scope):
+            await self.app(scope, receive, send)
+            return
+
+        # Time-ordered IDs so the store can rotate by name
+        profile_id = f"{time.time_ns():x}-{uuid.uuid4().hex[:8]}"
+        status = None
+
+        async def send_with_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message.setdefault("headers", [])
+                message["headers"] = [*message["headers"], (b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        sampler = StackSampler(threading.get_ident(), self.interval)
+        start = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            sampler.stop()
+            profile = {
+                "id": profile_id,
+                "created_at": time.time(),
+                "pid": os.getpid(),
+                "method": scope["method"],
+                "path": scope["path"],
+                "status": status,
+                "duration_ms": round((time.perf_counter() - start) * 1000, 1),
+                "interval_ms": self.interval * 1000,
+                "samples": sampler.samples,
+                "stacks": dict(sampler.stacks),
+            }
+            try:
+                await asyncio.to_thread(self.store.save, profile)
+            except OSError as e:
+                logger.warning("Could not save profile %s: %s", profile_id, e)
+
+
+def install_profiler(app, directory):
+    """Add the profiling middleware and the /debug/profiles routes to `app`."""
+    app.state.profile_store = ProfileStore(directory)
+    app.add_middleware(ProfilerMiddleware, store=app.state.profile_store)
+    app.include_router(debug_router)
+    logger.info("Request profiling enabled (sample rate %s, header X-Profile)", PROFILE_SAMPLE_RATE)
+
+
+def _check_token(request):
+    if PROFILE_TOKEN is not None and request.headers.get("x-profile-token") != PROFILE_TOKEN:
+        raise HTTPException(status_code=403, detail="Invalid profile token")
+
+
+@debug_router.get("")
+async def list_profiles(request: Request):
+    """List stored profiles, newest first, without their stacks."""
+    _check_token(request)
+    profiles = await asyncio.to_thread(request.app.state.profile_store.list)
+    return {"profiles": profiles}
+
+
+@debug_router.get("/{profile_id}")
+async def get_profile(request: Request, profile_id: str, format: str = "folded"):
+    """
+    Download one profile.
+
+    Args:
+        profile_id: ID from the list or the X-Profile-Id response header
+        format: "folded" for collapsed stacks, "json" for the full profile
+
+    Returns:
+        Collapsed stacks as text, or the profile as JSON
+    """
+    _check_token(request)
+    profile = await asyncio.to_thread(request.app.state.profile_store.load, profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+
+    if format == "json":
+        return profile
+    folded = "".join(f"{stack} {count}\n" for stack, count in profile["stacks"].items())
+    return PlainTextResponse(folded)
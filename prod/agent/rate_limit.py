@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Per-client rate limiting for the API server
+
+Each client gets a token bucket: RATE_LIMIT_BURST requests at once, refilled
+at RATE_LIMIT_RPS per second. A request with no token left gets a 429 with
+Retry-After. Clients are told apart by the first of RATE_LIMIT_KEY (default
+"ip") that the request carries:
+
+    ip        the peer address, or the first X-Forwarded-For hop when
+              RATE_LIMIT_TRUST_PROXY is set
+    token     the Authorization header
+    identity  the RATE_LIMIT_IDENTITY_HEADER header
+
+The API does not check tokens or identities itself, so a client could send
+a new one with every request and get a new bucket each time. token and
+identity are therefore only used with RATE_LIMIT_TRUST_PROXY set, meaning a
+proxy in front of the server authenticates them (and sets X-Forwarded-For);
+otherwise they are skipped.
+
+A bucket is stored as a single float, the time at which it will be full
+again (the "theoretical arrival time" of the generic cell rate algorithm,
+which admits exactly what a token bucket does). The table maps the hash of
+the client key to that float, about 100 bytes per client, and a request
+costs a dict lookup or two.
+
+The table has two generations. Clients are looked up in the current one and
+moved over from the previous one when seen. Every RATE_LIMIT_SWEEP_S (at
+least the time to refill a bucket) the previous generation is dropped and
+the current one takes its place: the clients dropped have been idle long
+enough for their buckets to be full, which is what a new bucket is.
+Sweeping is a swap. A large dropped generation is emptied by a background
+thread a piece at a time, since freeing a million entries at once would
+hold the event loop for tens of milliseconds.
+
+With RATE_LIMIT_WORKER_RPS set, that budget is shared fairly: at each sweep
+the refill rate becomes the budget divided by the clients seen in the last
+period, capped at RATE_LIMIT_RPS. A client sending ten times as much as the
+others gets the same share, not ten times as much.
+
+Paths outside /api/ and GET requests (fetching audio) are not limited.
+
+The limiter is opt-in (RATE_LIMIT=1). Behind a load balancer or reverse
+proxy every request comes from the proxy's address, so keying on the peer
+IP would put all users in one bucket; set RATE_LIMIT_TRUST_PROXY there, and
+make sure the proxy sets X-Forwarded-For (and clients cannot reach the
+server around it).
+"""
+
+import os
+import math
+import time
+import threading
+
+from metrics import REGISTRY
+
+RATE_LIMIT = os.getenv("RATE_LIMIT", "0").lower() in ("1", "true", "yes")
+RATE_LIMIT_RPS = float(os.getenv("RATE_LIMIT_RPS", 1))
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", 10))
+RATE_LIMIT_WORKER_RPS = float(os.getenv("RATE_LIMIT_WORKER_RPS", 0))
+RATE_LIMIT_SWEEP_S = float(os.getenv("RATE_LIMIT_SWEEP_S", 60))
+RATE_LIMIT_KEY = [source.strip() for source in os.getenv("RATE_LIMIT_KEY", "ip").split(",")]
+RATE_LIMIT_IDENTITY_HEADER = os.getenv("RATE_LIMIT_IDENTITY_HEADER", "x-client-id").lower()
+RATE_LIMIT_TRUST_PROXY = os.getenv("RATE_LIMIT_TRUST_PROXY", "").lower() in ("1", "true", "yes")
+
+# Request headers a client key can come from
+_KEY_HEADERS = {b"authorization", RATE_LIMIT_IDENTITY_HEADER.encode(), b"x-forwarded-for"}
+
+# Dropped generations at least this large are freed in the background
+DISCARD_IN_BACKGROUND = 10_000
+
+
+def _discard(table):
+    """Empty `table` a few entries at a time, letting other threads run in between."""
+    popitem = table.popitem
+    try:
+        while True:
+            for _ in range(1000):
+                popitem()
+            # Gives up the GIL now instead of at the next switch interval (5 ms)
+            time.sleep(0)
+    except KeyError:
+        pass
+
+
+class RateLimiter:
+    """
+    Token buckets per client key.
+
+    Not thread-safe: the middleware calls it from the event loop only.
+    """
+
+    def __init__(self, rate=RATE_LIMIT_RPS, burst=RATE_LIMIT_BURST, worker_rate=RATE_LIMIT_WORKER_RPS,
+                 sweep_s=RATE_LIMIT_SWEEP_S, registry=REGISTRY, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.worker_rate = worker_rate
+        self.sweep_s = sweep_s
+        self.clock = clock
+        # Seconds between requests a client is allowed: 1 / refill rate
+        self.interval = 1 / rate
+        self._current = {}
+        self._previous = {}
+        self._next_sweep = clock() + self._sweep_period()
+
+        # Allowed requests are not counted: a locked counter would cost more
+        # than the rest of acquire() together
+        self.limited = registry.counter("rate_limit_limited_total", "Requests rejected with 429")
+        self.sweeps = registry.counter("rate_limit_sweeps_total", "Rate limit table generations dropped")
+        registry.gauge("rate_limit_clients", "Clients in the rate limit table", fn=lambda: len(self))
+        registry.gauge("rate_limit_client_rps", "Current refill rate per client", fn=lambda: 1 / self.interval)
+
+    def __len__(self):
+        return len(self._current) + len(self._previous)
+
+    def _sweep_period(self):
+        # Long enough that a dropped bucket has refilled completely
+        return max(self.sweep_s, self.burst * self.interval)
+
+    def acquire(self, key):
+        """
+        Take a token for `key`.
+
+        Returns:
+            0.0 if the request is allowed, otherwise the seconds until it would be
+        """
+        now = self.clock()
+        if now >= self._next_sweep:
+            self.sweep(now)
+
+        slot = hash(key)
+        full_at = self._current.get(slot)
+        if full_at is None:
+            full_at = self._previous.pop(slot, now)
+        if full_at < now:
+            full_at = now
+
+        interval = self.interval
+        # Too far ahead once more than `burst` intervals are owed
+        wait = full_at + interval - now - self.burst * interval
+        if wait > 0:
+            self._current[slot] = full_at
+            self.limited.inc()
+            return wait
+        self._current[slot] = full_at + interval
+        return 0.0
+
+    def sweep(self, now=None):
+        """Drop clients idle for a whole period and recompute the fair share."""
+        now = self.clock() if now is None else now
+        active = len(self._current)
+        dropped = self._previous
+        self._previous = self._current
+        self._current = {}
+        if len(dropped) >= DISCARD_IN_BACKGROUND:
+            threading.Thread(target=_discard, args=(dropped,), name="rate-limit-sweep", daemon=True).start()
+        del dropped
+
+        interval = 1 / self.rate
+        if self.worker_rate > 0 and active:
+            interval = max(interval, active / self.worker_rate)
+        self.interval = interval
+        self._next_sweep = now + self._sweep_period()
+        self.sweeps.inc()
+
+
+def client_key(scope, sources=RATE_LIMIT_KEY, trust_proxy=RATE_LIMIT_TRUST_PROXY):
+    """
+    The key identifying the client of an ASGI request, or None.
+
+    Keys are prefixed by their source so a token cannot collide with an IP.
+    Client-supplied headers (token, identity, X-Forwarded-For) only count
+    when `trust_proxy` says a proxy has set or checked them.
+    """
+    headers = {}
+    for name, value in scope["headers"]:
+        if name in _KEY_HEADERS and name not in headers:
+            headers[name] = value
+
+    for source in sources:
+        if source == "token" and trust_proxy:
+            value = headers.get(b"authorization")
+        elif source == "identity" and trust_proxy:
+            value = headers.get(RATE_LIMIT_IDENTITY_HEADER.encode())
+        elif source == "ip":
+            value = None
+            if trust_proxy and b"x-forwarded-for" in headers:
+                value = headers[b"x-forwarded-for"].split(b",")[0].strip()
+            elif scope.get("client"):
+                value = scope["client"][0].encode()
+        else:
+            continue
+        if value:
+            return source.encode() + b":" + value
+    return None
+
+
+class RateLimitMiddleware:
+    """ASGI middleware that answers 429 to clients over their rate."""
+
+    def __init__(self, app, limiter):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "GET" or not scope["path"].startswith("/api/"):
+            await self.app(scope, receive, send)
+            return
+
+        key = client_key(scope)
+        wait = self.limiter.acquire(key) if key is not None else 0.0
+        if wait > 0:
+            await send({
+                "type": "http.response.start",
+                "status": 429,
+                "headers": [(b"content-type", b"application/json"),
+                            (b"retry-after", str(math.ceil(wait)).encode())],
+            })
+            await send({"type": "http.response.body", "body": b'{"detail": "Too many requests"}'})
+            return
+
+        await self.app(scope, receive, send)
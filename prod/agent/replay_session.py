@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Replay a recorded session through the Voice Agent offline.
+
+Feeds the frames of a session recorded with --record-dir (or
+SESSION_RECORD_DIR) into VoiceAgent at their original pace, or faster with
+--speed, while LocalOpenAI answers STT, LLM and TTS calls with the recorded
+latencies and results. Outgoing audio is consumed at playback pace and
+discarded. Reports the time from handing off each utterance to its first
+outgoing frame (a filler clip included) and to the first frame of the reply
+itself, and event loop lag during the replay, so runs of the same session
+can be compared across changes.
+
+Each participant is replayed through its own agent, so one participant's
+turn does not hold up the others'. With --shared-agent the participants
+share one agent and take turns, as they did in the live room. Either way
+the recorded calls are handed out in the order they are made.
+
+Latencies are reported in session time (wall time multiplied by --speed).
+Local processing is not sped up, so above 1x its share is overstated.
+"""
+
+import json
+import time
+import asyncio
+import argparse
+import logging
+from types import SimpleNamespace
+
+import numpy as np
+
+from main import VoiceAgent, SAMPLE_RATE
+from filler_clips import FillerBank
+from session_recorder import FRAME, CALL, read_session
+from local_upstream import LocalOpenAI
+from loop_monitor import LoopMonitor
+from metrics import Registry
+
+logger = logging.getLogger(__name__)
+
+
+class PacedSink:
+    """Stands in for rtc.AudioSource; consumes frames at playback pace."""
+
+    def __init__(self, agent, speed):
+        self.agent = agent
+        self.speed = speed
+
+    async def capture_frame(self, frame):
+        self.agent.on_output_frame(frame.samples_per_channel)
+        await asyncio.sleep(frame.samples_per_channel / SAMPLE_RATE / self.speed)
+
+
+class ReplayAgent(VoiceAgent):
+    """VoiceAgent without a LiveKit connection, timing each turn."""
+
+    def __init__(self, openai_client, speed, filler_bank=None):
+        super().__init__("", "", "", "replay", "replay-agent", openai_client=openai_client)
+        if filler_bank is not None:
+            self.filler_bank = filler_bank
+        self.speed = speed
+        self.turns = []
+
+    async def _ensure_output_track(self):
+        if self.audio_source is None:
+            self.audio_source = PacedSink(self, self.speed)
+
+    async def _handle_speech(self, utterance, participant):
+        turn = {"participant": participant.identity, "start": time.perf_counter(),
+                "first_audio": None, "first_reply": None, "replying": False, "output_samples": 0}
+        self.turns.append(turn)
+        await super()._handle_speech(utterance, participant)
+        turn["end"] = time.perf_counter()
+
+    async def _publish_audio_response(self, reply, lead_in=None):
+        # Any filler has stopped by now; the frames that follow are the reply
+        if self.turns:
+            self.turns[-1]["replying"] = True
+        await super()._publish_audio_response(reply, lead_in)
+
+    def on_output_frame(self, samples):
+        turn = self.turns[-1] if self.turns else None
+        if turn is None or "end" in turn:
+            return
+        now = time.perf_counter()
+        if turn["first_audio"] is None:
+            turn["first_audio"] = now
+        if turn["replying"] and turn["first_reply"] is None:
+            turn["first_reply"] = now
+        turn["output_samples"] += samples
+
+
+async def replay_stream(frames, start, speed):
+    """Yield recorded frames at their recorded offsets from `start`."""
+    for t, payload in frames:
+        delay = start + t / speed - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        yield SimpleNamespace(data=payload)
+
+
+async def replay(path, speed, shared_agent=False):
+    metadata, records = read_session(path)
+    calls = [payload for kind, _, _, payload in records if kind == CALL]
+    streams = {}
+    for kind, identity, t, payload in records:
+        if kind == FRAME:
+            streams.setdefault(identity, []).append((t, payload))
+
+    client = LocalOpenAI(calls, speed=speed)
+    filler_bank = FillerBank(client)
+    await asyncio.to_thread(filler_bank.prerender)
+    if shared_agent:
+        agent = ReplayAgent(client, speed, filler_bank)
+        agents = {identity: agent for identity in streams}
+    else:
+        agents = {identity: ReplayAgent(client, speed, filler_bank) for identity in streams}
+
+    registry = Registry()
+    monitor = LoopMonitor(registry=registry)
+    monitor.start()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        agents[identity]._process_audio(replay_stream(frames, start, speed), SimpleNamespace(identity=identity))
+        for identity, frames in streams.items()
+    ))
+    unique_agents = set(agents.values())
+    while any(agent.is_processing for agent in unique_agents):
+        await asyncio.sleep(0.01)
+    wall_s = time.perf_counter() - start
+    await monitor.stop()
+
+    turns = [turn for agent in unique_agents for turn in agent.turns]
+    first_audio = [
+        (turn["first_audio"] - turn["start"]) * 1000 * speed
+        for turn in turns if turn["first_audio"] is not None
+    ]
+    first_reply = [
+        (turn["first_reply"] - turn["start"]) * 1000 * speed
+        for turn in turns if turn["first_reply"] is not None
+    ]
+    recorded = {}
+    for call in calls:
+        recorded.setdefault(call["stage"], []).append(call["latency_ms"])
+
+    return {
+        "session": str(path),
+        "room": metadata.get("room"),
+        "speed": speed,
+        "participants": len(streams),
+        "frames": sum(len(frames) for frames in streams.values()),
+        "wall_s": round(wall_s, 2),
+        "turns": len(turns),
+        "turns_with_audio": len(first_audio),
+        "first_audio_ms": _percentiles(first_audio),
+        "first_reply_ms": _percentiles(first_reply),
+        "recorded_call_ms": {stage: _percentiles(values) for stage, values in recorded.items()},
+        "calls_served": client.served,
+        "loop_lag_ms": monitor.lag.snapshot(),
+        "loop_blocked": monitor.blocked.value,
+    }
+
+
+def _percentiles(values):
+    if not values:
+        return None
+    p50, p95 = np.percentile(values, [50, 95])
+    return {"p50": round(float(p50), 1), "p95": round(float(p95), 1), "max": round(float(max(values)), 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded Voice Agent sessions")
+    parser.add_argument("sessions", nargs="+", help="Session files (.vrec)")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="Replay speed; 1.0 is real time")
+    parser.add_argument("--shared-agent", action="store_true",
+                        help="Replay all participants through one agent, as in the live room")
+    parser.add_argument("--json", action="store_true",
+                        help="Print one JSON summary per session")
+    parser.add_argument("--log-level", default="WARNING",
+                        help="Log level for the agent")
+    args = parser.parse_args()
+    if args.speed <= 0:
+        parser.error("--speed must be positive")
+
+    logging.getLogger().setLevel(args.log_level.upper())
+
+    for path in args.sessions:
+        summary = asyncio.run(replay(path, args.speed, args.shared_agent))
+        if args.json:
+            print(json.dumps(summary))
+            continue
+
+        print(f"{summary['session']}: {summary['participants']} participants, "
+              f"{summary['frames']} frames, {summary['wall_s']}s wall at {args.speed}x")
+        print(f"  turns: {summary['turns']} ({summary['turns_with_audio']} with audio), "
+              f"calls served {summary['calls_served']}")
+        print(f"  first audio ms: {summary['first_audio_ms']}")
+        print(f"  first reply ms: {summary['first_reply_ms']}")
+        print(f"  event loop lag ms: {summary['loop_lag_ms']}, blocked {summary['loop_blocked']} times")
+        for stage, stats in summary["recorded_call_ms"].items():
+            print(f"  recorded {stage} ms: {stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,532 @@
+#!/usr/bin/env python3
+"""
+API routes for the Voice Agent server.
+
+Handlers reach the upstream client, the audio store and the storage
+directories through `request.app.state`, which is populated by
+app_factory.create_app().
+"""
+
+import os
+import json
+import time
+import uuid
+import asyncio
+import logging
+from typing import List, Optional
+
+from fastapi import APIRouter, File, Form, UploadFile, HTTPException, Request, Response
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+
+from metrics import REGISTRY
+from audio_store import valid_audio_id, audio_key
+from audio_formats import FORMATS, DEFAULT_FORMAT, accepted_formats, media_type, preferred_type
+from transcript_cache import read_upload
+from degradation import NORMAL
+
+logger = logging.getLogger(__name__)
+
+# Batch endpoints: upstream calls in flight per request, and items per request
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", 4))
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", 100))
+
+# /api/process-audio response modes, chosen with the Accept header. The
+# inline modes carry the reply audio in the response body instead of an ID.
+# REPLY_FRAME_TYPE is a 4-byte big-endian length, a UTF-8 JSON header of that
+# length, then the audio bytes to the end of the body.
+JSON_TYPE = "application/json"
+REPLY_FRAME_TYPE = "application/vnd.voice-agent.reply"
+MULTIPART_TYPE = "multipart/mixed"
+
+router = APIRouter()
+
+
+class ResponseModel(BaseModel):
+    user_text: str
+    response_text: str
+    # None when the server is too loaded to synthesize speech
+    audio_id: Optional[str] = None
+
+
+@router.get("/health")
+async def health_check():
+    """Health check endpoint."""
+    return {"status": "ok"}
+
+
+@router.get("/ready")
+async def readiness_check(request: Request, response: Response):
+    """
+    Readiness check: 503 until the startup warmup has finished.
+
+    Returns:
+        The warmup status and the time each step took
+    """
+    warmup = request.app.state.warmup
+    if not warmup.ready:
+        response.status_code = 503
+    return warmup.status()
+
+
+@router.get("/metrics")
+async def metrics(format: str = "prometheus"):
+    """
+    Metrics for this worker process.
+
+    Args:
+        format: "prometheus" for the text exposition format, "json" for a dict
+
+    Returns:
+        Every registered metric, including event loop lag percentiles
+    """
+    if format == "json":
+        return REGISTRY.snapshot()
+    return PlainTextResponse(REGISTRY.render_prometheus())
+
+
+@router.post("/api/transcribe")
+async def transcribe_audio(request: Request, audio: UploadFile = File(...)):
+    """
+    Transcribe audio using OpenAI Whisper.
+
+    Args:
+        audio: The audio file to transcribe
+
+    Returns:
+        JSON with transcribed text
+    """
+    try:
+        upstream = request.app.state.upstream
+        content, key = await read_upload(audio, upstream.stt_settings)
+        text = await asyncio.to_thread(_cached_transcribe, request.app, key, "speech.wav", content)
+        return {"text": text}
+
+    except Exception as e:
+        logger.error("Error transcribing audio: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/api/generate-response")
+async def generate_response(request: Request):
+    """
+    Generate a response using OpenAI GPT.
+
+    Args:
+        request: JSON with 'text' field containing the user's message
+
+    Returns:
+        JSON with generated response
+    """
+    try:
+        data = await request.json()
+        if not data or 'text' not in data:
+            raise HTTPException(status_code=400, detail="No text provided")
+
+        llm_start = time.perf_counter()
+        faq_match = await _faq_lookup(request.app, data['text'])
+        if faq_match is not None:
+            response_text = faq_match[0]["answer"]
+        else:
+            level = _degradation_level(request.app)
+            response_text = await asyncio.to_thread(
+                request.app.state.upstream.generate, data['text'], max_tokens=level.max_tokens, model=level.model
+            )
+        _log_turn(request, data['text'], response_text, "generate-response",
+                  llm_ms=(time.perf_counter() - llm_start) * 1000)
+
+        return {"text": response_text}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error generating response: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/api/text-to-speech")
+async def text_to_speech(request: Request):
+    """
+    Convert text to speech using OpenAI TTS.
+
+    Args:
+        request: JSON with 'text' field containing the text to convert, and
+            an optional 'format' field (see audio_formats.py); without it
+            the Accept header's preferred audio type, or mp3
+
+    Returns:
+        JSON with the audio ID and format
+    """
+    try:
+        data = await request.json()
+        if not data or 'text' not in data:
+            raise HTTPException(status_code=400, detail="No text provided")
+        fmt = _output_format(data.get('format'), request.headers.get("accept"))
+        if not _degradation_level(request.app).tts:
+            raise HTTPException(status_code=503, detail="Speech synthesis is paused while the server is overloaded",
+                                headers={"Retry-After": "10"})
+
+        audio_bytes = await asyncio.to_thread(request.app.state.upstream.synthesize, data['text'], fmt)
+        audio_id = await asyncio.to_thread(_save_audio, request.app, audio_bytes, fmt, data['text'])
+
+        return {"audio_id": audio_id, "format": fmt}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error converting text to speech: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/api/transcribe/batch")
+async def transcribe_batch(request: Request, audio: List[UploadFile] = File(...)):
+    """
+    Transcribe many audio files in one request.
+
+    Files are transcribed concurrently, at most BATCH_CONCURRENCY at a
+    time. Results are streamed as NDJSON in completion order, one line per
+    file: {"index", "filename", "text"} or {"index", "filename", "error"}.
+
+    Args:
+        audio: The audio files to transcribe
+
+    Returns:
+        Streaming NDJSON response
+    """
+    _check_batch_size(len(audio))
+
+    # Read uploads now; they are closed before the response body streams
+    app = request.app
+    items = [(upload.filename, *await read_upload(upload, app.state.upstream.stt_settings)) for upload in audio]
+
+    def transcribe_one(index, item):
+        filename, content, key = item
+        return {"filename": filename, "text": _cached_transcribe(app, key, filename or "speech.wav", content)}
+
+    return _ndjson_response(items, transcribe_one)
+
+
+@router.post("/api/text-to-speech/batch")
+async def text_to_speech_batch(request: Request):
+    """
+    Convert many texts to speech in one request.
+
+    Texts are synthesized concurrently, at most BATCH_CONCURRENCY at a
+    time. Results are streamed as NDJSON in completion order, one line per
+    text: {"index", "audio_id"} or {"index", "error"}.
+
+    Args:
+        request: JSON with 'texts' field containing a list of strings, and
+            an optional 'format' field for all of them (or the Accept
+            header's preferred audio type)
+
+    Returns:
+        Streaming NDJSON response
+    """
+    data = await request.json()
+    texts = data.get("texts") if isinstance(data, dict) else None
+    if not isinstance(texts, list) or not texts:
+        raise HTTPException(status_code=400, detail="No texts provided")
+    _check_batch_size(len(texts))
+    fmt = _output_format(data.get("format"), request.headers.get("accept"))
+    if not _degradation_level(request.app).tts:
+        raise HTTPException(status_code=503, detail="Speech synthesis is paused while the server is overloaded",
+                            headers={"Retry-After": "10"})
+
+    app = request.app
+
+    def synthesize_one(index, text):
+        if not isinstance(text, str) or not text.strip():
+            raise ValueError("Empty text")
+        return {"audio_id": _save_audio(app, app.state.upstream.synthesize(text, fmt), fmt, text)}
+
+    return _ndjson_response(texts, synthesize_one)
+
+
+@router.post("/api/process-audio")
+async def process_audio(request: Request, response: Response, audio: UploadFile = File(...),
+                        format: Optional[str] = Form(None)):
+    """
+    Process audio end-to-end:
+    1. Trim silence and normalize level
+    2. Transcribe audio
+    3. Generate response
+    4. Convert response to speech
+
+    Questions the FAQ index (faq_index.py) matches confidently skip steps
+    3 and 4 and get the stored answer with its pre-rendered audio.
+
+    The reply audio is saved to the audio store and returned as an ID,
+    unless the Accept header prefers an inline mode: REPLY_FRAME_TYPE or
+    MULTIPART_TYPE. Those return the texts and the audio bytes in one body
+    and do not save the audio.
+
+    Args:
+        response: Used to report preprocessing stats in response headers
+        audio: The audio file to process
+        format: Output audio format (see audio_formats.py); without it the
+            Accept header's preferred audio type, or mp3
+
+    Returns:
+        JSON with transcribed text, response text, and audio ID, or an
+        inline reply
+    """
+    from audio_utils import PREPROCESS_SETTINGS
+    from audio_pool import get_audio_pool, prepare_upload
+
+    upstream = request.app.state.upstream
+    cache = request.app.state.transcript_cache
+    fmt = _output_format(format, request.headers.get("accept"))
+    try:
+        content, key = await read_upload(audio, f"{upstream.stt_settings}|{PREPROCESS_SETTINGS}")
+
+        stt_start = time.perf_counter()
+        user_text = cache.get(key) if cache is not None else None
+        if user_text is not None:
+            # Seen this recording before: no preprocessing, nothing uploaded
+            bytes_saved = len(content)
+            stt_ms = (time.perf_counter() - stt_start) * 1000
+        else:
+            # Drop dead air before uploading to Whisper, in a worker process
+            payload, (filename, prep_stats) = await get_audio_pool().run(prepare_upload, content)
+            bytes_saved = prep_stats["bytes_in"] - prep_stats["bytes_out"]
+
+            stt_start = time.perf_counter()
+            user_text = await asyncio.to_thread(upstream.transcribe, filename, payload)
+            stt_ms = (time.perf_counter() - stt_start) * 1000
+            if cache is not None:
+                cache.put(key, user_text)
+
+            logger.info(
+                "STT upload %s -> %s bytes (%s -> %sms), STT %.0fms",
+                prep_stats['bytes_in'], prep_stats['bytes_out'],
+                prep_stats.get('input_ms', '?'), prep_stats.get('output_ms', '?'), stt_ms
+            )
+        response.headers["X-Audio-Bytes-Saved"] = str(bytes_saved)
+        response.headers["X-STT-Time-Ms"] = f"{stt_ms:.0f}"
+
+        mode = preferred_type(request.headers.get("accept"), (JSON_TYPE, REPLY_FRAME_TYPE, MULTIPART_TYPE))
+
+        llm_start = time.perf_counter()
+        faq_match = await _faq_lookup(request.app, user_text)
+        if faq_match is not None:
+            # A common question: stored answer and pre-rendered audio
+            response_text = faq_match[0]["answer"]
+            tts_start = time.perf_counter()
+            audio_bytes = await asyncio.to_thread(request.app.state.faq.audio, faq_match[0], fmt)
+        else:
+            level = _degradation_level(request.app)
+            response_text = await asyncio.to_thread(
+                upstream.generate, user_text, max_tokens=level.max_tokens, model=level.model
+            )
+            tts_start = time.perf_counter()
+            # Under heavy load the reply is text only
+            audio_bytes = await asyncio.to_thread(upstream.synthesize, response_text, fmt) if level.tts else None
+        if mode in (REPLY_FRAME_TYPE, MULTIPART_TYPE) or audio_bytes is None:
+            audio_id = None
+        else:
+            audio_id = await asyncio.to_thread(_save_audio, request.app, audio_bytes, fmt, response_text)
+        tts_ms = (time.perf_counter() - tts_start) * 1000
+
+        _log_turn(request, user_text, response_text, "process-audio",
+                  stt_ms=stt_ms, llm_ms=(tts_start - llm_start) * 1000, tts_ms=tts_ms)
+
+        if mode in (REPLY_FRAME_TYPE, MULTIPART_TYPE):
+            reply = {"user_text": user_text, "response_text": response_text}
+            return _inline_reply(mode, reply, audio_bytes or b"", media_type(fmt), dict(response.headers))
+
+        return ResponseModel(
+            user_text=user_text,
+            response_text=response_text,
+            audio_id=audio_id
+        )
+
+    except Exception as e:
+        logger.error("Error processing audio: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/api/audio/{audio_id}")
+async def get_audio(request: Request, audio_id: str, format: Optional[str] = None):
+    """
+    Retrieve audio file by ID.
+
+    The format is the `format` query parameter, or else the one the Accept
+    header prefers. The reply is served in the format it was synthesized in
+    when the client accepts that. Otherwise it is synthesized again in the
+    preferred format, which is then kept in the audio store as well.
+
+    The file may have been written by another replica; the audio store
+    fetches it into the local cache on first access.
+
+    Args:
+        audio_id: The ID of the audio file to retrieve
+        format: Output audio format (see audio_formats.py)
+
+    Returns:
+        Audio file
+    """
+    formats = accepted_formats(request.headers.get("accept"), format)
+    if not formats:
+        raise HTTPException(status_code=406, detail=f"Supported formats: {', '.join(FORMATS)}")
+    if not valid_audio_id(audio_id):
+        raise HTTPException(status_code=404, detail="Audio file not found")
+
+    fmt, audio_path = await asyncio.to_thread(_find_audio, request.app, audio_id, formats)
+    if audio_path is None:
+        raise HTTPException(status_code=404, detail="Audio file not found")
+
+    return FileResponse(
+        path=audio_path,
+        media_type=media_type(fmt),
+        filename=f"response.{fmt}",
+        headers={"Vary": "Accept"}
+    )
+
+
+def _find_audio(app, audio_id, formats):
+    """
+    Return (format, local path) of a reply in the best format available.
+
+    Blocking; runs in a worker thread.
+    """
+    store = app.state.audio_store
+    audio_path = store.local_path(audio_key(audio_id, formats[0]))
+    if audio_path is not None:
+        return formats[0], audio_path
+
+    meta = store.get(audio_key(audio_id, "json"))
+    if meta is None:
+        return None, None
+    meta = json.loads(meta)
+    if meta["format"] in formats:
+        return meta["format"], store.local_path(audio_key(audio_id, meta["format"]))
+
+    # Not yet in a format the client accepts: synthesize it once and keep it
+    fmt = formats[0]
+    store.put(audio_key(audio_id, fmt), app.state.upstream.synthesize(meta["text"], fmt))
+    return fmt, store.local_path(audio_key(audio_id, fmt))
+
+
+def _inline_reply(mode, reply, audio_bytes, audio_type, headers):
+    """Return the reply texts and audio in one body, as a reply frame or multipart."""
+    header = json.dumps({**reply, "audio_type": audio_type, "audio_bytes": len(audio_bytes)}).encode()
+    if mode == REPLY_FRAME_TYPE:
+        body = b"".join((len(header).to_bytes(4, "big"), header, audio_bytes))
+        return Response(body, media_type=REPLY_FRAME_TYPE, headers=headers)
+
+    boundary = uuid.uuid4().hex
+    body = b"".join((
+        f"--{boundary}\r\nContent-Type: {JSON_TYPE}\r\n\r\n".encode(), header,
+        f"\r\n--{boundary}\r\nContent-Type: {audio_type}\r\n\r\n".encode(), audio_bytes,
+        f"\r\n--{boundary}--\r\n".encode(),
+    ))
+    return Response(body, media_type=f"{MULTIPART_TYPE}; boundary={boundary}", headers=headers)
+
+
+def _degradation_level(app):
+    """The current degradation level (degradation.py); NORMAL when disabled."""
+    controller = app.state.degradation
+    return controller.level if controller is not None else NORMAL
+
+
+async def _faq_lookup(app, text):
+    """Return (entry, score) when the FAQ index answers `text` confidently, else None."""
+    faq = app.state.faq
+    if faq is None:
+        return None
+    try:
+        return await asyncio.to_thread(faq.lookup, text)
+    except Exception as e:
+        logger.warning("FAQ lookup failed, using the language model: %s", e)
+        return None
+
+
+def _cached_transcribe(app, key, filename, content):
+    """Transcribe `content`, or return the cached transcript of identical audio."""
+    cache = app.state.transcript_cache
+    text = cache.get(key) if cache is not None else None
+    if text is None:
+        text = app.state.upstream.transcribe(filename, content)
+        if cache is not None:
+            cache.put(key, text)
+    return text
+
+
+def _output_format(requested, accept=None):
+    """
+    Validate a requested output format.
+
+    Without one, the format is the audio type the Accept header prefers,
+    as for GET /api/audio/{id}. The header may also rank the response body
+    type (JSON or an inline reply), so naming no audio type is not an
+    error: it falls back to DEFAULT_FORMAT.
+    """
+    if not requested:
+        formats = accepted_formats(accept)
+        return formats[0] if formats else DEFAULT_FORMAT
+    fmt = str(requested).lower()
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown format {requested!r}; supported: {', '.join(FORMATS)}")
+    return fmt
+
+
+def _save_audio(app, audio_bytes, fmt, text):
+    """
+    Write synthesized audio to the audio store and return its ID.
+
+    The text is kept with it, so the reply can be synthesized again in
+    another format when a client asks for one.
+    """
+    audio_id = str(uuid.uuid4())
+    store = app.state.audio_store
+    store.put(audio_key(audio_id, "json"), json.dumps({"text": text, "format": fmt}).encode())
+    store.put(audio_key(audio_id, fmt), audio_bytes)
+    return audio_id
+
+
+def _log_turn(request, user_text, response_text, source, **timings):
+    """Queue a turn for the conversation log; the session is X-Session-Id or the client address."""
+    conversation_log = request.app.state.conversation_log
+    if conversation_log is None:
+        return
+    session = request.headers.get("x-session-id") or (request.client.host if request.client else "unknown")
+    conversation_log.log_turn(session, user_text, response_text, source=source, **timings)
+
+
+def _check_batch_size(count):
+    """Reject batches larger than BATCH_MAX_ITEMS."""
+    if count > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_ITEMS} items per batch")
+
+
+def _ndjson_response(items, work):
+    """
+    Run `work(index, item)` for every item with bounded concurrency.
+
+    Each call runs in a worker thread. Results are streamed as NDJSON lines
+    as soon as each item finishes; a failing item yields an error line and
+    does not affect the others. If the client disconnects, items that have
+    not started yet are cancelled.
+    """
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def run_one(index, item):
+        async with semaphore:
+            try:
+                result = await asyncio.to_thread(work, index, item)
+            except Exception as e:
+                logger.error("Batch item %s failed: %s", index, e)
+                return {"index": index, "error": str(e)}
+        return {"index": index, **result}
+
+    async def stream():
+        tasks = [asyncio.create_task(run_one(index, item)) for index, item in enumerate(items)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield json.dumps(await next_done) + "\n"
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 """
 Standalone FastAPI Server Runner for Voice Agent
+
+Development runner with auto-reload. Use serve.py for production.
 """
 
 import os
@@ -17,7 +19,8 @@ if __name__ == "__main__":
     # Run the FastAPI server
     print(f"Starting FastAPI server on port {port}...")
     uvicorn.run(
-        "fastapi_server_new:app", 
+        "app_factory:create_app", 
+        factory=True,
         host="0.0.0.0", 
         port=port,
         reload=True,  # Enable auto-reload for development
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Sentence-level speech synthesis
+
+TTS time grows with the length of the input, so a long reply sent as one
+request keeps the listener waiting for all of it. Here the reply is split
+into sentences, up to SENTENCE_TTS_CONCURRENCY sentences are synthesized at
+once, and their audio is joined back in order.
+
+stream_in_order() yields the audio as it arrives: the first sentence plays
+while it downloads, and later sentences are buffered until it is their
+turn. SeamJoiner trims each sentence's own leading and trailing silence and
+puts the same SENTENCE_GAP_MS pause between every pair, so the seams sound
+the same whatever padding each request came back with.
+"""
+
+import os
+import re
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from audio_utils import TTS_PCM_RATE
+
+SENTENCE_TTS_CONCURRENCY = int(os.getenv("SENTENCE_TTS_CONCURRENCY", 4))
+SENTENCE_MIN_CHARS = int(os.getenv("SENTENCE_MIN_CHARS", 20))
+SENTENCE_GAP_MS = int(os.getenv("SENTENCE_GAP_MS", 300))
+
+# Samples below this level at either end of a sentence count as padding.
+# Cutting there leaves a step too small to click.
+SEAM_THRESHOLD_DB = -50
+
+_SENTENCE_END = re.compile(r"(?<=[.!?…])[\"')\]]*\s+|\n+")
+
+_END = object()
+
+
+def _loud(samples, threshold):
+    return (samples > threshold) | (samples < -threshold)
+
+
+def split_sentences(text, min_chars=SENTENCE_MIN_CHARS):
+    """
+    Split `text` into sentences for synthesis.
+
+    Fragments shorter than `min_chars` (short sentences, or splits after
+    abbreviations such as "Dr.") are joined to the following one, so no
+    request is too short to be worth its round trip.
+    """
+    sentences = []
+    pending = ""
+    for part in _SENTENCE_END.split(text.strip()):
+        part = part.strip()
+        if not part:
+            continue
+        pending = f"{pending} {part}" if pending else part
+        if len(pending) >= min_chars:
+            sentences.append(pending)
+            pending = ""
+    if pending:
+        if sentences and len(pending) < min_chars:
+            sentences[-1] = f"{sentences[-1]} {pending}"
+        else:
+            sentences.append(pending)
+    return sentences
+
+
+def open_speech(client, text, response_format="pcm"):
+    """Yield the audio for `text` from one OpenAI TTS request as it downloads."""
+    with client.audio.speech.with_streaming_response.create(
+        model="tts-1",
+        voice="alloy",
+        input=text,
+        response_format=response_format
+    ) as response:
+        yield from response.iter_bytes(chunk_size=4096)
+
+
+def synthesize_pcm(client, text, concurrency=SENTENCE_TTS_CONCURRENCY):
+    """
+    Synthesize `text` sentence by sentence and return the joined audio.
+
+    Returns:
+        Mono 16-bit samples at TTS_PCM_RATE
+    """
+    sentences = split_sentences(text)
+    audio = [bytearray() for _ in sentences]
+    for index, chunk in stream_in_order(lambda sentence: open_speech(client, sentence), sentences, concurrency):
+        audio[index] += chunk
+    return SeamJoiner(TTS_PCM_RATE).join(
+        np.frombuffer(data, dtype=np.int16, count=len(data) // 2) for data in audio
+    )
+
+
+def stream_in_order(open_stream, items, concurrency=SENTENCE_TTS_CONCURRENCY):
+    """
+    Download several streams concurrently and yield their chunks in order.
+
+    Args:
+        open_stream: Called with one item in a worker thread; returns an
+            iterable of chunks
+        items: The items, in output order
+        concurrency: Most streams downloading at once
+
+    Yields:
+        (item index, chunk) for every chunk of item 0, then item 1, and so
+        on. Chunks of the current item are yielded as they arrive.
+
+    An exception from any stream is raised when its item is reached. Closing
+    the generator stops the downloads that are still running.
+    """
+    if not items:
+        return
+    queues = [queue.Queue() for _ in items]
+    stopped = threading.Event()
+
+    def download(index):
+        out = queues[index]
+        try:
+            for chunk in open_stream(items[index]):
+                if stopped.is_set():
+                    return
+                out.put(chunk)
+            out.put(_END)
+        except Exception as e:
+            out.put(e)
+
+    pool = ThreadPoolExecutor(max_workers=min(concurrency, len(items)), thread_name_prefix="sentence-tts")
+    try:
+        for index in range(len(items)):
+            pool.submit(download, index)
+        for index, chunks in enumerate(queues):
+            while True:
+                chunk = chunks.get()
+                if chunk is _END:
+                    break
+                if isinstance(chunk, Exception):
+                    raise chunk
+                yield index, chunk
+    finally:
+        stopped.set()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+class SeamJoiner:
+    """Joins per-sentence PCM with a uniform pause between sentences."""
+
+    def __init__(self, sample_rate, gap_ms=SENTENCE_GAP_MS, threshold_db=SEAM_THRESHOLD_DB):
+        self.gap = np.zeros(sample_rate * gap_ms // 1000, dtype=np.int16)
+        self.threshold = int(32768 * 10 ** (threshold_db / 20))
+        self._tail = np.zeros(0, dtype=np.int16)
+        self._leading = True
+        self._first = True
+
+    def start_sentence(self):
+        """Mark the start of the next sentence; its leading silence is dropped."""
+        self._leading = True
+        # Trailing silence of the previous sentence is replaced by the gap
+        self._tail = np.zeros(0, dtype=np.int16)
+
+    def feed(self, samples):
+        """Return the samples of the current sentence that are ready to play."""
+        lead = None
+        if self._leading:
+            loud = np.flatnonzero(_loud(samples, self.threshold))
+            if not len(loud):
+                return samples[:0]
+            samples = samples[loud[0]:]
+            self._leading = False
+            if not self._first:
+                lead = self.gap
+            self._first = False
+
+        # Hold back a quiet run at the end until we know whether it is the
+        # pause between two words or the padding after the last one
+        data = np.concatenate((self._tail, samples)) if len(self._tail) else samples
+        loud = np.flatnonzero(_loud(data, self.threshold))
+        cut = loud[-1] + 1 if len(loud) else 0
+        self._tail = data[cut:]
+        ready = data[:cut]
+        return np.concatenate((lead, ready)) if lead is not None else ready
+
+    def join(self, sentences):
+        """Join whole sentences of PCM (int16 arrays) into one array."""
+        parts = []
+        for pcm in sentences:
+            self.start_sentence()
+            parts.append(self.feed(pcm))
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=np.int16)
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Production launcher for the Voice Agent API
+
+The parent process builds the app once, binds the listening socket and then
+forks the workers, so every worker starts with the app already imported and
+shares those pages with the parent copy-on-write. Each worker runs uvicorn
+on the inherited socket. The parent restarts workers that exit unexpectedly
+and forwards SIGINT/SIGTERM to all of them on shutdown.
+
+By default the parent also imports openai/numpy/pydub before forking, so
+workers share those pages too and restarted workers come up without
+importing them again. --no-preload (or API_PRELOAD=0) leaves them to be
+imported in each worker on first use.
+"""
+
+import os
+import sys
+import time
+import signal
+import socket
+import logging
+import argparse
+
+import uvicorn
+
+from app_factory import create_app, preload_heavy_modules
+
+logger = logging.getLogger(__name__)
+
+
+def _bind_socket(host, port, backlog):
+    """Create the shared listening socket."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(app, sock, log_level):
+    """Serve `app` on the inherited socket until told to stop."""
+    # Let uvicorn install its own handlers for a graceful shutdown
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+    config = uvicorn.Config(app, log_level=log_level, access_log=False)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def _spawn(app, sock, log_level):
+    """Fork one worker and return its PID."""
+    pid = os.fork()
+    if pid == 0:
+        try:
+            _run_worker(app, sock, log_level)
+        finally:
+            os._exit(0)
+    return pid
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Voice Agent API production launcher")
+    parser.add_argument("--host", default=os.getenv("API_HOST", "0.0.0.0"),
+                        help="Address to bind")
+    parser.add_argument("--port", type=int, default=int(os.getenv("API_PORT", 5000)),
+                        help="Port to bind")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("API_WORKERS", os.cpu_count() or 1)),
+                        help="Number of worker processes")
+    parser.add_argument("--backlog", type=int, default=2048,
+                        help="Listen backlog of the shared socket")
+    parser.add_argument("--preload", action=argparse.BooleanOptionalAction,
+                        default=os.getenv("API_PRELOAD", "1") != "0",
+                        help="Import openai/numpy/pydub in the parent so workers share them (default on)")
+    parser.add_argument("--simulate", action="store_true",
+                        help="Answer with canned responses instead of calling OpenAI")
+    parser.add_argument("--log-level", default="info",
+                        help="uvicorn log level")
+    args = parser.parse_args()
+
+    # Sizes each worker's audio process pool (audio_pool.default_processes)
+    os.environ["API_WORKERS"] = str(args.workers)
+
+    app = create_app(simulate=args.simulate or None)
+    if args.preload:
+        preload_heavy_modules()
+
+    sock = _bind_socket(args.host, args.port, args.backlog)
+    logger.info("Listening on %s:%s with %d workers", args.host, args.port, args.workers)
+
+    workers = {_spawn(app, sock, args.log_level) for _ in range(args.workers)}
+    stopping = False
+
+    def _stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, _stop)
+    signal.signal(signal.SIGTERM, _stop)
+
+    # Supervise: restart crashed workers until asked to stop
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        workers.discard(pid)
+        if not stopping:
+            logger.warning("Worker %s exited with status %s, restarting", pid, status)
+            time.sleep(0.5)
+            workers.add(_spawn(app, sock, args.log_level))
+
+    sock.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Session recording for the Voice Agent
+
+An opt-in recorder that appends everything needed to replay a session
+offline: incoming audio frames with their arrival times, and the latency and
+result of every STT, LLM and TTS call. replay_session.py reads these files.
+
+File format (little-endian):
+    header:  b"VREC" | version u8 | metadata length u32 | metadata JSON
+    record:  kind u8 | stream u16 | time f64 | length u32 | payload
+
+Times are seconds since the session started. Kinds:
+    STREAM  payload is a participant identity; assigns the stream id
+    FRAME   payload is raw 16-bit PCM for that stream
+    CALL    payload is JSON: stage, latency_ms and result or error
+
+Recording calls only stamp the record and put it on a bounded queue; a
+background thread does the file writes, so a slow disk never stalls the
+event loop that is receiving audio. Records arriving while the queue is full
+are dropped and counted, like the conversation log.
+"""
+
+import os
+import json
+import time
+import queue
+import struct
+import logging
+import threading
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Records held in memory before new ones are dropped (about 5 minutes of
+# 10 ms frames from one participant)
+SESSION_RECORD_MAX_QUEUE = int(os.getenv("SESSION_RECORD_MAX_QUEUE", 30000))
+# Longest close() waits for queued records to be written
+SESSION_RECORD_CLOSE_S = float(os.getenv("SESSION_RECORD_CLOSE_S", 10))
+
+MAGIC = b"VREC"
+VERSION = 1
+RECORD = struct.Struct("<BHdI")
+
+STREAM = 1
+FRAME = 2
+CALL = 3
+
+_STOP = object()
+
+
+class SessionRecorder:
+    """Append-only writer for one session file. Safe to call from any thread."""
+
+    def __init__(self, path, metadata=None, max_queue=SESSION_RECORD_MAX_QUEUE):
+        self.path = Path(path)
+        self._file = open(self.path, "ab", buffering=1 << 16)
+        self._lock = threading.Lock()
+        self._start = time.monotonic()
+        self._streams = {}
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._closed = False
+        self.dropped = 0
+
+        meta = json.dumps({"started_at": time.time(), **(metadata or {})}).encode()
+        self._file.write(MAGIC + struct.pack("<BI", VERSION, len(meta)) + meta)
+        self._thread = threading.Thread(target=self._run, name="session-recorder", daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def create(cls, directory, room_name, sample_rate):
+        """Start a new session file in `directory`."""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"session-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.vrec"
+        logger.info("Recording session to %s", path)
+        return cls(path, {"room": room_name, "sample_rate": sample_rate})
+
+    def _write(self, kind, stream, payload):
+        """Queue one record, stamped now. Never blocks; drops the record once closed or full."""
+        if self._closed:
+            return
+        header = RECORD.pack(kind, stream, time.monotonic() - self._start, len(payload))
+        try:
+            self._queue.put_nowait(header + payload)
+        except queue.Full:
+            self.dropped += 1
+
+    def _stream_id(self, identity):
+        with self._lock:
+            stream = self._streams.get(identity)
+            if stream is None:
+                stream = self._streams[identity] = len(self._streams) + 1
+                # Queued under the lock so it is ahead of the stream's first frame
+                self._write(STREAM, stream, identity.encode())
+        return stream
+
+    def frame(self, identity, data):
+        """Record one incoming audio frame."""
+        self._write(FRAME, self._stream_id(identity), bytes(memoryview(data).cast("B")))
+
+    def call(self, stage, latency_ms, result=None, error=None, **extra):
+        """Record the outcome of one upstream call."""
+        record = {"stage": stage, "latency_ms": round(latency_ms, 1), **extra}
+        if error is not None:
+            record["error"] = str(error)
+        else:
+            record["result"] = result
+        self._write(CALL, 0, json.dumps(record).encode())
+
+    def close(self, timeout=SESSION_RECORD_CLOSE_S):
+        """Write everything still queued and close the file. Blocks for at most `timeout` seconds."""
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._queue.put_nowait(_STOP)
+        except queue.Full:
+            # The writer closes the file once it has drained the queue
+            pass
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger.warning("Session recorder still busy after %.0fs, up to %d queued records may be lost",
+                           timeout, self._queue.qsize())
+        if self.dropped:
+            logger.warning("Session recording %s is missing %d records dropped while the queue was full",
+                           self.path, self.dropped)
+
+    def _run(self):
+        try:
+            while True:
+                try:
+                    record = self._queue.get(timeout=0.5)
+                except queue.Empty:
+                    if self._closed:
+                        break
+                    continue
+                if record is _STOP:
+                    break
+                self._file.write(record)
+        except OSError as e:
+            logger.error("Session recording to %s stopped: %s", self.path, e)
+        finally:
+            self._file.close()
+
+
+def read_session(path):
+    """
+    Read a session file.
+
+    Returns:
+        Tuple of (metadata dict, list of records). Each record is a tuple
+        (kind, identity, time, payload); CALL payloads are decoded dicts.
+    """
+    records = []
+    identities = {}
+    with open(path, "rb") as f:
+        if f.read(4) != MAGIC:
+            raise ValueError(f"{path} is not a session recording")
+        version, meta_len = struct.unpack("<BI", f.read(5))
+        if version != VERSION:
+            raise ValueError(f"Unsupported session format version {version}")
+        metadata = json.loads(f.read(meta_len))
+
+        while True:
+            header = f.read(RECORD.size)
+            if len(header) < RECORD.size:
+                break
+            kind, stream, t, length = RECORD.unpack(header)
+            payload = f.read(length)
+            if len(payload) < length:
+                # Truncated tail from an interrupted session
+                break
+
+            if kind == STREAM:
+                identities[stream] = payload.decode()
+            elif kind == FRAME:
+                records.append((FRAME, identities.get(stream), t, payload))
+            elif kind == CALL:
+                records.append((CALL, None, t, json.loads(payload)))
+
+    return metadata, records
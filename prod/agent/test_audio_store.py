@@ -0,0 +1,132 @@
+"""Tests for the audio store backends in audio_store.py."""
+
+import os
+import time
+
+import pytest
+
+import audio_store
+from audio_store import (CachedStore, DirectoryStore, KeyValueStore, LocalKV, audio_key, create_audio_store,
+                         valid_audio_id)
+
+
+def test_audio_ids_and_keys():
+    assert valid_audio_id("3ef2d6ff-3bf9-4d82-bcb4-0037a809831a")
+    assert not valid_audio_id("../etc/passwd")
+    assert not valid_audio_id("")
+    assert audio_key("abc", "mp3") == "abc.mp3"
+
+
+def test_directory_store_round_trip(tmp_path):
+    store = DirectoryStore(tmp_path / "audio")
+    assert store.get("a.mp3") is None
+    assert store.local_path("a.mp3") is None
+    store.put("a.mp3", b"mp3 bytes")
+    assert store.get("a.mp3") == b"mp3 bytes"
+    assert store.local_path("a.mp3").read_bytes() == b"mp3 bytes"
+    # Overwrites replace the file whole
+    store.put("a.mp3", b"new")
+    assert store.get("a.mp3") == b"new"
+
+
+def test_directory_store_files_skip_temporary_files(tmp_path):
+    store = DirectoryStore(tmp_path)
+    store.put("a.wav", b"1")
+    (tmp_path / ".a.wav.1.2.tmp").write_bytes(b"partial")
+    assert [path.name for path in store.files()] == ["a.wav"]
+
+
+def test_directory_store_expires(tmp_path):
+    store = DirectoryStore(tmp_path, ttl=60, sweep_s=0)
+    store.put("old.mp3", b"1")
+    stamp = time.time() - 61
+    os.utime(tmp_path / "old.mp3", (stamp, stamp))
+    assert store.get("old.mp3") is None
+    assert store.local_path("old.mp3") is None
+    # The next write sweeps expired files
+    store.put("new.mp3", b"2")
+    assert [path.name for path in store.files()] == ["new.mp3"]
+    assert store.get("new.mp3") == b"2"
+
+
+def test_local_kv_expires(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(audio_store.time, "monotonic", lambda: now[0])
+    kv = LocalKV()
+    kv.set("k", b"v", ex=10)
+    kv.set("forever", bytearray(b"x"))
+    assert kv.get("k") == b"v"
+    now[0] = 111.0
+    assert kv.get("k") is None
+    assert kv.get("forever") == b"x"
+    assert kv.get("missing") is None
+
+
+def test_key_value_store_prefixes_keys():
+    kv = LocalKV()
+    store = KeyValueStore(kv, ttl=60)
+    store.put("a.mp3", b"data")
+    assert kv.get("audio:a.mp3") == b"data"
+    assert store.get("a.mp3") == b"data"
+    assert store.local_path("a.mp3") is None
+
+
+def test_cached_store_reads_through(tmp_path):
+    backend = KeyValueStore(LocalKV())
+    backend.put("a.mp3", b"written by another replica")
+    store = CachedStore(backend, tmp_path)
+    path = store.local_path("a.mp3")
+    assert path.read_bytes() == b"written by another replica"
+    assert store.get("a.mp3") == b"written by another replica"
+    assert (store.hits, store.misses) == (1, 1)
+    assert store.local_path("missing.mp3") is None
+
+
+def test_cached_store_writes_through(tmp_path):
+    backend = KeyValueStore(LocalKV())
+    store = CachedStore(backend, tmp_path)
+    store.put("a.mp3", b"reply")
+    assert backend.get("a.mp3") == b"reply"
+    assert (tmp_path / "a.mp3").read_bytes() == b"reply"
+
+
+def test_cached_store_evicts_least_recently_served(tmp_path):
+    store = CachedStore(KeyValueStore(LocalKV()), tmp_path, max_bytes=250)
+    for i, name in enumerate(("old.wav", "used.wav", "new.wav")):
+        store.put(name, b"x" * 100)
+        stamp = time.time() - 100 + i
+        os.utime(tmp_path / name, (stamp, stamp))
+    # Serving a file marks it as recently used
+    store.local_path("old.wav")
+    store.put("last.wav", b"x" * 100)
+    remaining = sorted(path.name for path in store.cache.files())
+    assert remaining == ["last.wav", "old.wav"]
+    # Evicted files are fetched again from the shared store
+    assert store.get("used.wav") == b"x" * 100
+
+
+def test_cached_store_keeps_recently_served_files(tmp_path):
+    store = CachedStore(KeyValueStore(LocalKV()), tmp_path, max_bytes=150, min_age_s=60)
+    store.put("a.wav", b"x" * 100)
+    path = store.local_path("a.wav")
+    # Over the limit, but a.wav may be about to be sent
+    store.put("b.wav", b"x" * 100)
+    assert path.exists() and (tmp_path / "b.wav").exists()
+
+
+def test_create_audio_store(tmp_path, monkeypatch):
+    monkeypatch.setattr(audio_store, "AUDIO_STORE", "dir")
+    monkeypatch.setattr(audio_store, "AUDIO_STORE_DIR", None)
+    store = create_audio_store(tmp_path)
+    assert isinstance(store, DirectoryStore) and store.ttl == audio_store.AUDIO_TTL_S
+
+    monkeypatch.setattr(audio_store, "AUDIO_STORE_DIR", str(tmp_path / "shared"))
+    store = create_audio_store(tmp_path / "local")
+    assert isinstance(store, CachedStore) and isinstance(store.backend, DirectoryStore)
+
+    monkeypatch.setattr(audio_store, "AUDIO_STORE", "memory")
+    assert isinstance(create_audio_store(tmp_path).backend, KeyValueStore)
+
+    monkeypatch.setattr(audio_store, "AUDIO_STORE", "s3")
+    with pytest.raises(ValueError):
+        create_audio_store(tmp_path)
@@ -0,0 +1,43 @@
+"""Tests for the resampler in audio_utils.py."""
+
+import numpy as np
+
+from audio_utils import resample, resampled_length
+from pcm_buffer import PCMBuffer
+
+
+def test_downsample_near_full_scale_does_not_wrap():
+    pcm = np.array([32767, 32767, 32767, -32768, -32768, -32768, 20000, 20114, 20228], dtype=np.int16)
+    expected = [32767, -32768, 20114]
+    assert resample(pcm, 48000, 16000).tolist() == expected
+    out = np.zeros(3, dtype=np.int16)
+    assert resample(pcm, 48000, 16000, out=out).tolist() == expected
+    assert out.tolist() == expected
+
+
+def test_downsample_averages_each_group():
+    pcm = np.arange(12, dtype=np.int16) * 100
+    assert resample(pcm, 48000, 16000).tolist() == [100, 400, 700, 1000]
+
+
+def test_same_rate_and_empty_input():
+    pcm = np.array([1, -2, 3], dtype=np.int16)
+    assert resample(pcm, 16000, 16000) is pcm
+    assert len(resample(pcm[:0], 48000, 16000)) == 0
+
+
+def test_non_integer_ratio_interpolates():
+    pcm = np.full(441, 30000, dtype=np.int16)
+    out = resample(pcm, 44100, 16000)
+    assert len(out) == resampled_length(441, 44100, 16000)
+    assert (out == 30000).all()
+
+
+def test_pcm_buffer_keeps_loud_frames():
+    buffer = PCMBuffer(16000, input_rate=48000)
+    frame = np.full(480, 32000, dtype=np.int16)
+    buffer.append(frame)
+    buffer.append(-frame)
+    samples = buffer.samples()
+    assert len(samples) == 320
+    assert (samples[:160] == 32000).all() and (samples[160:] == -32000).all()
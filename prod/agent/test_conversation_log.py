@@ -0,0 +1,64 @@
+"""Tests for the batched conversation log in conversation_log.py."""
+
+import sqlite3
+import threading
+import time
+
+from conversation_log import ConversationLog
+from metrics import Registry
+
+
+def make_log(path, **kwargs):
+    kwargs.setdefault("flush_ms", 20)
+    return ConversationLog(path, registry=Registry(), **kwargs)
+
+
+def count_rows(path):
+    with sqlite3.connect(path) as db:
+        return db.execute("SELECT COUNT(*) FROM turns").fetchone()[0]
+
+
+def test_close_writes_queued_turns(tmp_path):
+    log = make_log(tmp_path / "log.db")
+    log.start()
+    for i in range(50):
+        log.log_turn("room", f"question {i}", "answer", participant="user", source="test", stt_ms=1.0)
+    log.close()
+    assert count_rows(tmp_path / "log.db") == 50
+    assert log.rows.value == 50
+
+
+def test_full_queue_drops_and_close_does_not_block(tmp_path):
+    log = make_log(tmp_path / "log.db", max_queue=5)
+    stalled = threading.Event()
+    release = threading.Event()
+    write = log._write
+
+    def slow_write(db, batch):
+        stalled.set()
+        release.wait()
+        write(db, batch)
+
+    log._write = slow_write
+    log.start()
+    log.log_turn("room", "first", "answer")
+    assert stalled.wait(1)
+    for i in range(10):
+        log.log_turn("room", f"question {i}", "answer")
+    assert log.dropped.value == 5
+
+    # The queue is full and the writer is stuck: close() gives up instead of hanging
+    start = time.monotonic()
+    log.close(timeout=0.2)
+    assert time.monotonic() - start < 1
+    release.set()
+
+
+def test_close_after_writer_failed_to_open(tmp_path):
+    log = make_log(tmp_path / "missing" / "log.db", max_queue=1)
+    log.start()
+    log.log_turn("room", "a", "b")
+    log.log_turn("room", "c", "d")
+    start = time.monotonic()
+    log.close(timeout=5)
+    assert time.monotonic() - start < 1
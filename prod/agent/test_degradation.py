@@ -0,0 +1,114 @@
+"""Tests for the degradation controller in degradation.py."""
+
+import asyncio
+
+import pytest
+
+from degradation import (DEGRADE_DOWN_INTERVALS, DEGRADE_UP_INTERVALS, LEVELS, DegradationController,
+                         DegradationMiddleware)
+from metrics import Registry
+
+
+def make_controller(**kwargs):
+    kwargs.setdefault("slo_ms", 1000)
+    kwargs.setdefault("max_inflight", 4)
+    return DegradationController(registry=Registry(), **kwargs)
+
+
+def run_intervals(controller, count, latency_ms):
+    for _ in range(count):
+        controller.admit()
+        controller.finish(latency_ms)
+        controller.update()
+
+
+def test_steps_down_one_level_at_a_time():
+    controller = make_controller()
+    run_intervals(controller, DEGRADE_DOWN_INTERVALS - 1, 2000)
+    assert controller.level_index == 0
+    run_intervals(controller, 1, 2000)
+    assert controller.level.name == "short_replies"
+    run_intervals(controller, DEGRADE_DOWN_INTERVALS * 10, 2000)
+    assert controller.level is LEVELS[-1]
+
+
+def test_steps_up_after_recovering():
+    controller = make_controller()
+    run_intervals(controller, DEGRADE_DOWN_INTERVALS, 2000)
+    # Between the recovery ratio and the target: stays put
+    run_intervals(controller, DEGRADE_UP_INTERVALS * 2, 800)
+    assert controller.level_index == 1
+    run_intervals(controller, DEGRADE_UP_INTERVALS, 100)
+    assert controller.level_index == 0
+
+
+def test_inflight_counts_as_pressure():
+    controller = make_controller()
+    for _ in range(8):
+        controller.admit()
+    controller.update()
+    assert controller.pressure == 2.0
+
+
+def test_sheds_only_at_the_last_level():
+    controller = make_controller(max_inflight=1)
+    assert controller.admit() and controller.admit()
+    controller.level_index = len(LEVELS) - 1
+    assert not controller.admit()
+    assert controller.shed.value == 1
+
+
+def test_latency_target_from_baseline():
+    controller = make_controller(slo_ms=0, baseline_requests=10, baseline_factor=2)
+    assert controller.slo_ms is None
+    run_intervals(controller, 9, 500)
+    assert controller.slo_ms is None and controller.level_index == 0
+    run_intervals(controller, 1, 500)
+    assert controller.slo_ms == 1000
+    run_intervals(controller, DEGRADE_DOWN_INTERVALS, 1500)
+    assert controller.level_index == 1
+
+
+def test_baseline_skips_loaded_intervals():
+    controller = make_controller(slo_ms=0, baseline_requests=2)
+    for _ in range(4):
+        controller.admit()
+    controller.finish(5000)
+    controller.update()
+    assert controller.slo_ms is None
+
+
+def call(app, path):
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(app({"type": "http", "method": "POST", "path": path, "headers": []}, receive, send))
+    return sent[0]["status"]
+
+
+async def ok(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+def test_max_inflight_must_be_positive():
+    with pytest.raises(ValueError):
+        make_controller(max_inflight=0)
+
+
+def test_middleware_measures_and_sheds():
+    controller = make_controller(max_inflight=1)
+    app = DegradationMiddleware(ok, controller)
+    assert call(app, "/api/process-audio") == 200
+    assert controller.inflight == 0 and controller.latency.count == 1
+    controller.level_index = len(LEVELS) - 1
+    # As if another request were still running
+    controller.inflight = 1
+    assert call(app, "/api/process-audio") == 503
+    # Other paths are not measured or shed
+    assert call(app, "/api/text-to-speech/batch") == 200
@@ -0,0 +1,72 @@
+"""Tests for the adaptive endpointer in endpointing.py."""
+
+import numpy as np
+
+from endpointing import (FIXED_HANGOVER_MS, MAX_HANGOVER_MS, START_MS, SPEECH_CANCEL, SPEECH_END, SPEECH_START,
+                         Endpointer, frame_level_db)
+from audio_utils import FRAME_MS, SAMPLE_RATE, SAMPLES_PER_FRAME
+
+
+def feed_levels(endpointer, levels):
+    """Feed frame levels; return (event, time in ms) for each event."""
+    events = []
+    for i, level in enumerate(levels):
+        event = endpointer.feed_level(level)
+        if event is not None:
+            events.append((event, i * FRAME_MS))
+    return events
+
+
+def frames(db, ms):
+    return [db] * (ms // FRAME_MS)
+
+
+def test_frame_level_db():
+    t = np.arange(SAMPLES_PER_FRAME) / SAMPLE_RATE
+    full_scale = (32767 * np.sin(2 * np.pi * 1000 * t)).astype(np.int16)
+    assert abs(frame_level_db(full_scale.tobytes()) + 3.0) < 0.1
+    assert frame_level_db(np.zeros(SAMPLES_PER_FRAME, dtype=np.int16).tobytes()) < -100
+    assert frame_level_db(b"") == -120.0
+
+
+def test_turn_in_a_quiet_room():
+    levels = frames(-70, 1000) + frames(-25, 1000) + frames(-70, 1500)
+    events = feed_levels(Endpointer(), levels)
+    assert [event for event, _ in events] == [SPEECH_START, SPEECH_END]
+    assert events[0][1] == 1000 + START_MS - FRAME_MS
+    # Clean separation: the hangover is short
+    assert events[1][1] - 2000 < MAX_HANGOVER_MS
+
+
+def test_speech_at_the_start_of_the_track():
+    # Was taken for the noise floor and only detected after the first pause
+    events = feed_levels(Endpointer(), frames(-25, 1500) + frames(-70, 1500))
+    assert events[0] == (SPEECH_START, START_MS - FRAME_MS)
+    assert events[1][0] == SPEECH_END
+
+
+def test_steady_noise_at_the_start_is_not_a_turn():
+    for noise_db in (-50, -42, -35):
+        events = feed_levels(Endpointer(), frames(noise_db, 8000))
+        assert SPEECH_END not in [event for event, _ in events]
+
+
+def test_speech_after_noise_at_the_start():
+    levels = frames(-42, 5000) + frames(-20, 1000) + frames(-42, 1500)
+    events = feed_levels(Endpointer(), levels)
+    assert (SPEECH_START, 5000 + START_MS - FRAME_MS) in events
+    assert events[-1][0] == SPEECH_END
+
+
+def test_short_blip_is_cancelled():
+    levels = frames(-70, 1000) + frames(-25, 100) + frames(-70, 1500)
+    events = feed_levels(Endpointer(), levels)
+    assert [event for event, _ in events] == [SPEECH_START, SPEECH_CANCEL]
+
+
+def test_fixed_thresholds():
+    endpointer = Endpointer(adaptive=False)
+    levels = frames(-70, 500) + frames(-25, 1000) + frames(-70, 1000)
+    events = feed_levels(endpointer, levels)
+    assert [event for event, _ in events] == [SPEECH_START, SPEECH_END]
+    assert endpointer.hangover_ms == FIXED_HANGOVER_MS
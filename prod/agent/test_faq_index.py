@@ -0,0 +1,64 @@
+"""Tests for the FAQ index in faq_index.py."""
+
+import json
+import threading
+import time
+
+from faq_index import FAQService
+from metrics import Registry
+from upstream import SimulatedUpstream
+
+
+class CountingUpstream(SimulatedUpstream):
+    def __init__(self):
+        self.embeds = []
+        self.renders = 0
+
+    def embed(self, texts, timeout=None):
+        self.embeds.append(timeout)
+        return super().embed(texts)
+
+    def synthesize(self, text, fmt="mp3"):
+        self.renders += 1
+        time.sleep(0.01)
+        return fmt.encode()
+
+
+def make_service(tmp_path, entries, upstream):
+    path = tmp_path / "faq.json"
+    path.write_text(json.dumps(entries))
+    service = FAQService(path, upstream, tmp_path / "cache", lookup_timeout_ms=250, registry=Registry())
+    service.rebuild()
+    return service
+
+
+def test_lookup_matches_with_a_timeout(tmp_path):
+    upstream = CountingUpstream()
+    service = make_service(tmp_path, [{"questions": ["when are you open"], "answer": "Nine to five."}], upstream)
+    entry, score = service.lookup("When are you open?")
+    assert entry["answer"] == "Nine to five." and score > 0.99
+    assert upstream.embeds[-1] == 0.25
+    assert service.lookup("something else entirely") is None
+
+
+def test_empty_index_skips_the_embedding_call(tmp_path):
+    upstream = CountingUpstream()
+    service = make_service(tmp_path, [], upstream)
+    assert service.lookup("when are you open") is None
+    assert upstream.embeds == []
+
+
+def test_concurrent_audio_renders_each_format_once(tmp_path):
+    upstream = CountingUpstream()
+    service = make_service(tmp_path, [{"question": "hours", "answer": "Nine to five."}], upstream)
+    entry = service.index.entries[0]
+    renders = upstream.renders
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(service.audio(entry, "wav"))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [b"wav"] * 8
+    assert upstream.renders == renders + 1
+    assert set(entry["audio"]) == {"mp3", "wav"}
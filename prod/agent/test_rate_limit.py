@@ -0,0 +1,128 @@
+"""Tests for the per-client rate limiter in rate_limit.py."""
+
+import asyncio
+import threading
+
+import rate_limit
+from metrics import Registry
+from rate_limit import RateLimiter, RateLimitMiddleware, client_key
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_limiter(clock, **kwargs):
+    kwargs.setdefault("rate", 1)
+    kwargs.setdefault("burst", 3)
+    kwargs.setdefault("sweep_s", 60)
+    return RateLimiter(registry=Registry(), clock=clock, **kwargs)
+
+
+def scope(headers=(), client="10.0.0.1", method="POST", path="/api/generate-response"):
+    return {"type": "http", "method": method, "path": path, "headers": list(headers), "client": (client, 50000)}
+
+
+def test_burst_then_refill():
+    clock = FakeClock()
+    limiter = make_limiter(clock)
+    assert [limiter.acquire(b"ip:a") for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert limiter.acquire(b"ip:a") == 1.0
+    # Other clients have their own buckets
+    assert limiter.acquire(b"ip:b") == 0.0
+    clock.now = 1.0
+    assert limiter.acquire(b"ip:a") == 0.0
+    assert limiter.acquire(b"ip:a") > 0
+
+
+def test_sweep_drops_idle_clients():
+    clock = FakeClock()
+    limiter = make_limiter(clock, sweep_s=10)
+    limiter.acquire(b"ip:a")
+    clock.now = 10.0
+    limiter.acquire(b"ip:b")
+    assert len(limiter) == 2
+    clock.now = 20.0
+    limiter.acquire(b"ip:b")
+    # a was idle for a whole period
+    assert len(limiter) == 1
+
+
+def test_sweep_frees_large_generations_in_background(monkeypatch):
+    monkeypatch.setattr(rate_limit, "DISCARD_IN_BACKGROUND", 100)
+    limiter = make_limiter(FakeClock(), rate=1e9)
+    for i in range(1000):
+        limiter.acquire(b"ip:%d" % i)
+    limiter.sweep()
+    dropped = limiter._previous
+    limiter.sweep()
+    for thread in threading.enumerate():
+        if thread.name == "rate-limit-sweep":
+            thread.join()
+    assert dropped == {}
+    assert len(limiter) == 0
+
+
+def test_fair_share_follows_active_clients():
+    clock = FakeClock()
+    limiter = make_limiter(clock, rate=10, worker_rate=20, sweep_s=5)
+    for i in range(4):
+        limiter.acquire(b"ip:%d" % i)
+    clock.now = 5.0
+    limiter.acquire(b"ip:0")
+    # 4 clients in the last period share 20 req/s
+    assert limiter.interval == 4 / 20
+
+
+def test_client_key_defaults_to_peer_address():
+    headers = [(b"authorization", b"Bearer abc"), (b"x-client-id", b"me"), (b"x-forwarded-for", b"1.2.3.4")]
+    assert client_key(scope(headers), ["ip"], trust_proxy=False) == b"ip:10.0.0.1"
+    # Unverified headers cannot buy a new bucket
+    assert client_key(scope(headers), ["token", "identity", "ip"], trust_proxy=False) == b"ip:10.0.0.1"
+
+
+def test_client_key_behind_trusted_proxy():
+    headers = [(b"authorization", b"Bearer abc"), (b"x-forwarded-for", b"1.2.3.4, 10.0.0.9")]
+    assert client_key(scope(headers), ["token", "ip"], trust_proxy=True) == b"token:Bearer abc"
+    assert client_key(scope(headers), ["identity", "ip"], trust_proxy=True) == b"ip:1.2.3.4"
+
+
+def call(app, request_scope):
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(app(request_scope, receive, send))
+    return sent
+
+
+async def ok(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+def test_middleware_answers_429_with_retry_after():
+    clock = FakeClock()
+    app = RateLimitMiddleware(ok, make_limiter(clock, burst=1))
+    assert call(app, scope())[0]["status"] == 200
+    start = call(app, scope())[0]
+    assert start["status"] == 429
+    assert dict(start["headers"])[b"retry-after"] == b"1"
+    # GETs and paths outside /api/ are not limited
+    assert call(app, scope(method="GET", path="/api/audio/x"))[0]["status"] == 200
+    assert call(app, scope(path="/health"))[0]["status"] == 200
+
+
+def test_middleware_ignores_spoofed_headers():
+    app = RateLimitMiddleware(ok, make_limiter(FakeClock(), burst=1))
+    statuses = [call(app, scope([(b"authorization", b"t%d" % i), (b"x-client-id", b"c%d" % i)]))[0]["status"]
+                for i in range(3)]
+    assert statuses == [200, 429, 429]
@@ -0,0 +1,66 @@
+"""Tests for the session recorder in session_recorder.py."""
+
+import threading
+
+from session_recorder import CALL, FRAME, SessionRecorder, read_session
+
+
+def test_round_trip_from_several_threads(tmp_path):
+    recorder = SessionRecorder(tmp_path / "s.vrec", {"room": "r"})
+
+    def calls():
+        for _ in range(100):
+            recorder.call("llm", 12.34, result="ok")
+
+    thread = threading.Thread(target=calls)
+    thread.start()
+    for _ in range(500):
+        recorder.frame("alice", b"\x01\x00" * 160)
+    thread.join()
+    recorder.close()
+
+    metadata, records = read_session(tmp_path / "s.vrec")
+    assert metadata["room"] == "r"
+    frames = [record for record in records if record[0] == FRAME]
+    calls = [record for record in records if record[0] == CALL]
+    assert len(frames) == 500 and len(calls) == 100
+    assert {identity for _, identity, _, _ in frames} == {"alice"}
+    assert calls[0][3] == {"stage": "llm", "latency_ms": 12.3, "result": "ok"}
+
+
+def test_records_after_close_are_ignored(tmp_path):
+    recorder = SessionRecorder(tmp_path / "s.vrec")
+    recorder.frame("alice", b"\x00\x00")
+    recorder.close()
+    # Late frames and calls from work still finishing must not raise
+    recorder.frame("alice", b"\x00\x00")
+    recorder.call("tts", 1.0, error="late")
+    recorder.close()
+    assert len(read_session(tmp_path / "s.vrec")[1]) == 1
+
+
+def test_full_queue_drops_records(tmp_path):
+    recorder = SessionRecorder(tmp_path / "s.vrec", max_queue=5)
+    stalled = threading.Event()
+    release = threading.Event()
+    real_file = recorder._file
+
+    class SlowFile:
+        def write(self, data):
+            stalled.set()
+            release.wait()
+            return real_file.write(data)
+
+        def close(self):
+            real_file.close()
+
+    recorder._file = SlowFile()
+    recorder.frame("alice", b"\x00\x00")
+    assert stalled.wait(1)
+    for _ in range(10):
+        recorder.frame("alice", b"\x00\x00")
+    # The writer is stuck on the stream record; the first frame and four more fit in the queue
+    assert recorder.dropped == 6
+    release.set()
+    recorder.close()
+    assert len(read_session(tmp_path / "s.vrec")[1]) == 5
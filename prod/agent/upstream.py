@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Upstream speech and language calls for the API server.
+
+The OpenAI SDK is imported the first time a client is needed, so importing
+this module (and building the app) stays cheap. Requests go through the
+process-wide connection pool in http_pool.py.
+"""
+
+import os
+import re
+import zlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+SYSTEM_PROMPT = "You are a helpful voice assistant. Keep responses concise and natural."
+STT_MODEL = "whisper-1"
+EMBEDDING_MODEL = os.getenv("FAQ_EMBEDDING_MODEL", "text-embedding-3-small")
+
+
+class OpenAIUpstream:
+    """Whisper, chat completion and TTS calls through the OpenAI SDK."""
+
+    # Part of the transcript cache key: uploads give the same text only
+    # under the same STT settings
+    stt_settings = f"openai:{STT_MODEL}"
+    embedding_model = EMBEDDING_MODEL
+
+    def __init__(self, api_key=None):
+        self.api_key = api_key
+        self._client = None
+
+    def _api_key(self):
+        api_key = self.api_key or os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            logger.warning("OPENAI_API_KEY not found in environment variables. Using empty string.")
+            api_key = ""
+        return api_key
+
+    @property
+    def client(self):
+        """The OpenAI client, created on first use."""
+        if self._client is None:
+            from http_pool import get_pool
+
+            self._client = get_pool().openai_client(self._api_key())
+        return self._client
+
+    def prewarm(self):
+        """Open upstream connections before the first request. Blocking."""
+        from http_pool import get_pool
+
+        get_pool().prewarm(self._api_key())
+
+    def transcribe(self, filename, payload):
+        """
+        Transcribe audio using OpenAI Whisper.
+
+        Args:
+            filename: Name sent with the upload, used for format detection
+            payload: Audio file bytes
+
+        Returns:
+            Transcribed text
+        """
+        transcript = self.client.audio.transcriptions.create(
+            model=STT_MODEL,
+            file=(filename, payload)
+        )
+        return transcript.text
+
+    def generate(self, text, max_tokens=None, model=None):
+        """
+        Generate a reply to `text` using OpenAI GPT.
+
+        Args:
+            max_tokens: Overrides MAX_TOKENS, e.g. when degraded
+            model: Overrides MODEL_NAME, e.g. when degraded
+        """
+        response = self.client.chat.completions.create(
+            model=model or os.getenv("MODEL_NAME", "gpt-4o-mini"),
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": text}
+            ],
+            max_tokens=max_tokens or int(os.getenv("MAX_TOKENS", 150))
+        )
+        return response.choices[0].message.content
+
+    def embed(self, texts, timeout=None):
+        """
+        Return one embedding vector (a list of floats) per text.
+
+        With `timeout` (seconds) the call is made once, without retries, and
+        raises if it takes longer.
+        """
+        client = self.client
+        if timeout is not None:
+            client = client.with_options(timeout=timeout, max_retries=0)
+        response = client.embeddings.create(model=EMBEDDING_MODEL, input=texts)
+        return [item.embedding for item in response.data]
+
+    def synthesize(self, text, fmt="mp3"):
+        """
+        Convert `text` to speech using OpenAI TTS and return the bytes.
+
+        Replies of more than one sentence are synthesized sentence by
+        sentence in parallel, joined as PCM and encoded once (when ffmpeg is
+        available to encode with, or no encoding is needed).
+
+        Args:
+            text: The text to speak
+            fmt: Output format, a key of audio_formats.FORMATS
+        """
+        from sentence_tts import split_sentences, synthesize_pcm
+        from audio_utils import TTS_PCM_RATE, can_encode
+        from audio_pool import ENCODE_HEADROOM, encode, get_audio_pool
+
+        if len(split_sentences(text)) > 1 and (fmt == "pcm" or can_encode()):
+            pcm = synthesize_pcm(self.client, text)
+            if fmt == "pcm":
+                return pcm.tobytes()
+            encoded, _ = get_audio_pool().call(encode, pcm, TTS_PCM_RATE, fmt,
+                                                capacity=pcm.nbytes + ENCODE_HEADROOM)
+            return encoded
+
+        response = self.client.audio.speech.create(
+            model="tts-1",
+            voice="alloy",
+            input=text,
+            response_format=fmt
+        )
+        return b"".join(response.iter_bytes(chunk_size=4096))
+
+
+class SimulatedUpstream:
+    """Canned responses for running the server without OpenAI access."""
+
+    stt_settings = "simulated"
+    embedding_model = "simulated-words"
+
+    def prewarm(self):
+        pass
+
+    def transcribe(self, filename, payload):
+        return "This is a simulated user message. In a real implementation, this would be transcribed from the audio."
+
+    def generate(self, text, max_tokens=None, model=None):
+        return "This is a simulated response from the virtual assistant. The server is now working correctly!"
+
+    def embed(self, texts, timeout=None):
+        # Hashed bag of words: texts sharing words score high
+        vectors = []
+        for text in texts:
+            vector = [0.0] * 256
+            for word in re.findall(r"\w+", text.lower()):
+                vector[zlib.crc32(word.encode()) % 256] += 1.0
+            vectors.append(vector)
+        return vectors
+
+    def synthesize(self, text, fmt="mp3"):
+        return b""
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Startup warmup and readiness for the API server
+
+A fresh worker is slow at first: its upstream connections still need a TLS
+handshake, and numpy and pydub code runs for the first time on the first
+upload. Each worker therefore warms up when it starts, in a background
+thread, before it reports ready:
+
+    connections  open the pooled upstream connections (http_pool.prewarm)
+    audio        start the audio worker processes (audio_pool.py), then
+                 decode, resample, preprocess and re-encode a synthetic
+                 recording the way uploads are, and encode synthetic
+                 reply audio in DEFAULT_FORMAT
+    faq          build the FAQ index, when FAQ_PATH is set
+
+GET /ready answers 503 until every step has run, then 200, so a load
+balancer only sends traffic to warm workers; GET /health stays a liveness
+check. A failing step is logged and reported by /ready but does not keep the
+worker out of rotation: the same failure would only come back on the first
+request. WARMUP=0 skips the steps and reports ready at once.
+"""
+
+import io
+import os
+import time
+import wave
+import logging
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+WARMUP = os.getenv("WARMUP", "1").lower() in ("1", "true", "yes")
+
+
+def synthetic_pcm(seconds, sample_rate):
+    """
+    A pitch sweep with a pause in the middle, as 16-bit samples.
+
+    Loud enough to pass the silence threshold, with a gap for the pause
+    trimming to act on.
+    """
+    import numpy as np
+
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    pcm = 8000 * np.sin(2 * np.pi * (150 + 100 * t) * t)
+    pcm[len(pcm) * 2 // 5:len(pcm) * 3 // 5] = 0
+    return pcm.astype(np.int16)
+
+
+def synthetic_recording(seconds=1.0, sample_rate=48000):
+    """synthetic_pcm() as a WAV file, like a browser upload."""
+    encoded = io.BytesIO()
+    with wave.open(encoded, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(synthetic_pcm(seconds, sample_rate).tobytes())
+    return encoded.getvalue()
+
+
+class Warmup:
+    """Runs the warmup steps for one app and tracks whether it is ready."""
+
+    def __init__(self, app, enabled=WARMUP, registry=REGISTRY):
+        self.app = app
+        self.enabled = enabled
+        self.ready = not enabled
+        self.steps = {}
+        self.duration_ms = None
+        registry.gauge("warmup_ready", "1 once warmup has finished", fn=lambda: int(self.ready))
+        registry.gauge("warmup_ms", "Time the startup warmup took", fn=lambda: self.duration_ms or 0)
+
+    def run(self):
+        """Run every step, then mark the app ready. Blocking."""
+        if self.ready:
+            return
+        start = time.perf_counter()
+        for name, step in (("connections", self._connections), ("audio", self._audio), ("faq", self._faq)):
+            step_start = time.perf_counter()
+            try:
+                skipped = step() is False
+                self.steps[name] = {"status": "skipped" if skipped else "ok"}
+            except Exception as e:
+                logger.warning("Warmup step %s failed: %s", name, e)
+                self.steps[name] = {"status": "failed", "error": str(e)}
+            self.steps[name]["ms"] = round((time.perf_counter() - step_start) * 1000, 1)
+
+        self.duration_ms = round((time.perf_counter() - start) * 1000, 1)
+        self.ready = True
+        logger.info("Warmup finished in %.0fms", self.duration_ms, extra={"warmup": self.steps})
+
+    def status(self):
+        return {"status": "ready" if self.ready else "warming_up", "warmup_ms": self.duration_ms,
+                "steps": self.steps}
+
+    def _connections(self):
+        self.app.state.upstream.prewarm()
+
+    def _audio(self):
+        from audio_utils import TTS_PCM_RATE, can_encode
+        from audio_formats import DEFAULT_FORMAT
+        from audio_pool import ENCODE_HEADROOM, encode, get_audio_pool, prepare_upload
+
+        pool = get_audio_pool()
+        pool.start()
+        pool.call(prepare_upload, synthetic_recording())
+        # Multi-sentence replies are synthesized as PCM and encoded there
+        if can_encode() and DEFAULT_FORMAT != "pcm":
+            reply = synthetic_pcm(2.0, TTS_PCM_RATE)
+            pool.call(encode, reply, TTS_PCM_RATE, DEFAULT_FORMAT, capacity=reply.nbytes + ENCODE_HEADROOM)
+
+    def _faq(self):
+        faq = self.app.state.faq
+        if faq is None:
+            return False
+        if faq.index is None:
+            faq.rebuild()
@@ -14,6 +14,17 @@ const LIVEKIT_URL = 'ws://localhost:7880';
 const ROOM_NAME = 'voice-agent-room';
 const PARTICIPANT_NAME = 'user';
 
+// Ask for the reply audio inline: a 4-byte big-endian header length, a JSON
+// header, then the audio bytes. Saves the second request for the audio file.
+const REPLY_FRAME_TYPE = 'application/vnd.voice-agent.reply';
+
+const parseReplyFrame = (buffer) => {
+  const headerLength = new DataView(buffer).getUint32(0);
+  const header = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 4, headerLength)));
+  const audio = new Blob([buffer.slice(4 + headerLength)], { type: header.audio_type });
+  return { ...header, audio };
+};
+
 // Bank-specific configuration
 const BANK_NAME = 'Modhumoti Bank PLC';
 const ASSISTANT_NAME = 'Virtual Banking Assistant';
@@ -260,6 +271,7 @@ function SimpleApp() {
       // Send the audio to the backend for processing
       const response = await fetch(`${API_BASE_URL}/api/process-audio`, {
         method: 'POST',
+        headers: { Accept: `${REPLY_FRAME_TYPE}, application/json;q=0.5` },
         body: formData,
       });
       
@@ -276,7 +288,10 @@ function SimpleApp() {
         throw new Error(errorMessage);
       }
       
-      const data = await response.json();
+      const contentType = response.headers.get('Content-Type') || '';
+      const data = contentType.startsWith(REPLY_FRAME_TYPE)
+        ? parseReplyFrame(await response.arrayBuffer())
+        : await response.json();
       
       // Add user message with transcribed text
       addMessage('User', data.user_text);
@@ -285,8 +300,11 @@ function SimpleApp() {
       addMessage('Agent', data.response_text);
       
       // Play the audio response
-      if (data.audio_id) {
-        const audioUrl = `${API_BASE_URL}/audio/${data.audio_id}.mp3`;
+      if (data.audio && data.audio.size) {
+        const audioUrl = URL.createObjectURL(data.audio);
+        playAudioFromUrl(audioUrl, () => URL.revokeObjectURL(audioUrl));
+      } else if (data.audio_id) {
+        const audioUrl = `${API_BASE_URL}/api/audio/${data.audio_id}`;
         playAudioFromUrl(audioUrl);
       }
       
@@ -299,7 +317,7 @@ function SimpleApp() {
   };
   
   // Play audio from URL
-  const playAudioFromUrl = (url) => {
+  const playAudioFromUrl = (url, onDone) => {
     // Create an audio element to play the response
     const audio = new Audio(url);
     
@@ -310,6 +328,7 @@ function SimpleApp() {
     
     audio.addEventListener('ended', () => {
       addMessage('System', 'Audio response finished.');
+      if (onDone) onDone();
     });
     
     audio.addEventListener('error', (e) => {
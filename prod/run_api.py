@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 """
 Standalone script to run the FastAPI server
+
+Development runner with auto-reload. Use agent/serve.py for production.
 """
 
 import os
@@ -14,7 +16,9 @@ if __name__ == "__main__":
     
     # Run the FastAPI server with uvicorn
     uvicorn.run(
-        "agent.fastapi_server_new:app", 
+        "app_factory:create_app", 
+        factory=True,
+        app_dir="agent",
         host="0.0.0.0", 
         port=port,
         reload=True
@@ -4,123 +4,216 @@ Simple HTTP Server for Voice Agent
 
 This script provides a basic HTTP server to handle API requests from the frontend.
 It uses only Python standard library modules to avoid dependency issues.
+
+By default each connection gets its own thread, up to SERVER_MAX_CONNECTIONS
+at once, with HTTP/1.1 keep-alive, and audio files are sent with zero-copy
+sendfile(). An idle keep-alive connection only holds its own thread, so it
+never makes another client wait for a free worker.
+Set SERVER_MODE=single for the original one-connection-at-a-time server.
 """
 
 import os
 import json
 import uuid
+import mimetypes
 import http.server
+import threading
 import socketserver
 from http import HTTPStatus
 from pathlib import Path
-from urllib.parse import parse_qs, urlparse
+from urllib.parse import urlparse
 
-# Create directories for temporary files
+# Directories for temporary files
 TEMP_DIR = Path("./temp")
 AUDIO_DIR = TEMP_DIR / "audio"
-TEMP_DIR.mkdir(exist_ok=True)
-AUDIO_DIR.mkdir(exist_ok=True)
 
 # Set port (using 8080 to avoid conflicts)
 PORT = int(os.environ.get("API_PORT", 8080))
 
-class CORSHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
+# Concurrency settings
+SERVER_MODE = os.environ.get("SERVER_MODE", "threaded")
+SERVER_MAX_CONNECTIONS = int(os.environ.get("SERVER_MAX_CONNECTIONS", 256))
+KEEPALIVE_TIMEOUT = float(os.environ.get("KEEPALIVE_TIMEOUT", 15))
+
+class CORSHTTPRequestHandler(http.server.BaseHTTPRequestHandler):
     """Custom request handler with CORS support"""
-    
+
+    # HTTP/1.1 keeps connections open; every response must set Content-Length
+    protocol_version = "HTTP/1.1"
+
+    # Idle keep-alive connections are closed after this many seconds
+    timeout = KEEPALIVE_TIMEOUT
+
     def send_cors_headers(self):
         """Send CORS headers"""
         self.send_header("Access-Control-Allow-Origin", "*")
-        self.send_header("Access-Control-Allow-Methods", "GET, POST, OPTIONS")
+        self.send_header("Access-Control-Allow-Methods", "GET, HEAD, POST, OPTIONS")
         self.send_header("Access-Control-Allow-Headers", "Content-Type")
-    
+
+    def send_json(self, status, payload):
+        """Send a JSON response with an explicit Content-Length"""
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_cors_headers()
+        self.end_headers()
+        self.wfile.write(body)
+
+    def discard_body(self):
+        """Read and drop the request body so the connection can be reused"""
+        remaining = int(self.headers.get("Content-Length", 0))
+        while remaining > 0:
+            chunk = self.rfile.read(min(remaining, 65536))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+
+    def resolve_audio_path(self, request_path):
+        """Map /audio/<file> or /api/audio/<id> to a file inside AUDIO_DIR"""
+        if request_path.startswith("/audio/"):
+            file_name = request_path[len("/audio/"):]
+        elif request_path.startswith("/api/audio/"):
+            file_name = request_path[len("/api/audio/"):] + ".mp3"
+        else:
+            return None
+
+        file_path = (AUDIO_DIR / file_name).resolve()
+        if file_path.parent != AUDIO_DIR.resolve() or not file_path.is_file():
+            return None
+        return file_path
+
+    def send_audio_file(self, file_path, head_only=False):
+        """Send a file from AUDIO_DIR, using sendfile() for the body"""
+        content_type = mimetypes.guess_type(file_path.name)[0] or "audio/mpeg"
+        with open(file_path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            self.send_response(HTTPStatus.OK)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(size))
+            self.send_cors_headers()
+            self.end_headers()
+
+            if head_only or size == 0:
+                return
+
+            # socket.sendfile() uses os.sendfile() where available
+            self.wfile.flush()
+            self.connection.sendfile(f)
+
     def do_OPTIONS(self):
         """Handle OPTIONS requests for CORS preflight"""
         self.send_response(HTTPStatus.NO_CONTENT)
+        self.send_header("Content-Length", "0")
         self.send_cors_headers()
         self.end_headers()
-    
+
+    def do_HEAD(self):
+        """Handle HEAD requests for audio files"""
+        file_path = self.resolve_audio_path(urlparse(self.path).path)
+        if file_path is None:
+            self.send_response(HTTPStatus.NOT_FOUND)
+            self.send_header("Content-Length", "0")
+            self.send_cors_headers()
+            self.end_headers()
+            return
+        self.send_audio_file(file_path, head_only=True)
+
     def do_GET(self):
         """Handle GET requests"""
         parsed_path = urlparse(self.path)
-        
+
         # Health check endpoint
         if parsed_path.path == "/health":
-            self.send_response(HTTPStatus.OK)
-            self.send_header("Content-Type", "application/json")
-            self.send_cors_headers()
-            self.end_headers()
-            self.wfile.write(json.dumps({"status": "ok"}).encode())
+            self.send_json(HTTPStatus.OK, {"status": "ok"})
             return
-        
-        # Serve static files
-        if parsed_path.path.startswith("/audio/"):
-            file_name = parsed_path.path.split("/")[-1]
-            file_path = AUDIO_DIR / file_name
-            
-            if file_path.exists():
-                self.send_response(HTTPStatus.OK)
-                self.send_header("Content-Type", "audio/mpeg")
-                self.send_cors_headers()
-                self.end_headers()
-                
-                # Send empty audio file for now
-                self.wfile.write(b"")
-                return
-        
+
+        # Serve audio files
+        file_path = self.resolve_audio_path(parsed_path.path)
+        if file_path is not None:
+            self.send_audio_file(file_path)
+            return
+
         # Default to 404 for unknown paths
-        self.send_response(HTTPStatus.NOT_FOUND)
-        self.send_header("Content-Type", "application/json")
-        self.send_cors_headers()
-        self.end_headers()
-        self.wfile.write(json.dumps({"error": "Not found"}).encode())
-    
+        self.send_json(HTTPStatus.NOT_FOUND, {"error": "Not found"})
+
     def do_POST(self):
         """Handle POST requests"""
         parsed_path = urlparse(self.path)
-        
+
+        # The upload is not used, but it has to be read off the connection
+        self.discard_body()
+
         # Process audio endpoint
         if parsed_path.path == "/api/process-audio":
-            content_length = int(self.headers.get("Content-Length", 0))
-            
             # Generate a unique ID for the audio file
             audio_id = str(uuid.uuid4())
-            
+
             # Create a mock audio file
             audio_path = AUDIO_DIR / f"{audio_id}.mp3"
             with open(audio_path, "wb") as f:
                 # In a real implementation, this would be the TTS audio
                 f.write(b"")
-            
+
             # Prepare the response
             response = {
                 "user_text": "This is a simulated user message. In a real implementation, this would be transcribed from the audio.",
                 "response_text": "This is a simulated response from the virtual assistant. The server is now working correctly!",
                 "audio_id": audio_id
             }
-            
-            self.send_response(HTTPStatus.OK)
-            self.send_header("Content-Type", "application/json")
-            self.send_cors_headers()
-            self.end_headers()
-            self.wfile.write(json.dumps(response).encode())
+
+            self.send_json(HTTPStatus.OK, response)
             return
-        
+
         # Default to 404 for unknown paths
-        self.send_response(HTTPStatus.NOT_FOUND)
-        self.send_header("Content-Type", "application/json")
-        self.send_cors_headers()
-        self.end_headers()
-        self.wfile.write(json.dumps({"error": "Not found"}).encode())
+        self.send_json(HTTPStatus.NOT_FOUND, {"error": "Not found"})
+
+class BoundedThreadingHTTPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """TCP server with a thread per connection, up to max_connections at once"""
+
+    allow_reuse_address = True
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, server_address, handler, max_connections):
+        super().__init__(server_address, handler)
+        self.slots = threading.BoundedSemaphore(max_connections)
+
+    def process_request(self, request, client_address):
+        # At the cap, stop accepting; new connections wait in the listen backlog
+        self.slots.acquire()
+        try:
+            super().process_request(request, client_address)
+        except BaseException:
+            self.slots.release()
+            raise
+
+    def process_request_thread(self, request, client_address):
+        try:
+            super().process_request_thread(request, client_address)
+        finally:
+            self.slots.release()
 
 def run_server():
     """Run the HTTP server"""
+    TEMP_DIR.mkdir(exist_ok=True)
+    AUDIO_DIR.mkdir(exist_ok=True)
+
     handler = CORSHTTPRequestHandler
-    
-    # Allow the server to reuse the address
-    socketserver.TCPServer.allow_reuse_address = True
-    
-    with socketserver.TCPServer(("", PORT), handler) as httpd:
-        print(f"Serving at port {PORT}")
+
+    if SERVER_MODE == "single":
+        # One connection at a time, so do not hold it open between requests
+        handler.protocol_version = "HTTP/1.0"
+
+        # Allow the server to reuse the address
+        socketserver.TCPServer.allow_reuse_address = True
+        httpd = socketserver.TCPServer(("", PORT), handler)
+        print(f"Serving at port {PORT} (single connection)")
+    else:
+        httpd = BoundedThreadingHTTPServer(("", PORT), handler, SERVER_MAX_CONNECTIONS)
+        print(f"Serving at port {PORT}, up to {SERVER_MAX_CONNECTIONS} connections")
+
+    with httpd:
         httpd.serve_forever()
 
 if __name__ == "__main__":